@@ -1,2 +1,8 @@
 pip install -r requirements.txt
-python -m streamlit run Home.py
\ No newline at end of file
+python -m streamlit run Home.py
+# Sin Firebase (datos sintéticos, ver fake_firebase.py)
+DATA_BACKEND=fake FAKE_LATENCY_MS=80 python -m streamlit run Home.py
+# Benchmarks (comparar con benchmark_baseline.json; --save-baseline para crearla)
+python benchmarks.py --scales small medium large
+# Prueba de carga (sesiones concurrentes con AppTest y latencia simulada)
+python loadtest.py --users 20 --iterations 3 --out loadtest.json
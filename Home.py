@@ -1,4 +1,9 @@
+import time
 import streamlit as st
+from metrics_utils import set_current_page, record_rerun
+from profiler_utils import finish_page_profile, show_profile
+from warmup_utils import record_course_use
+from save_queue import show_save_status
 
 # Set page config
 # st.set_page_config(
@@ -24,7 +29,8 @@ else:
                 st.Page("pages/2_Asistencia_admin.py", title="📅 Asistencia"),
                 st.Page("pages/0_Semanas_Descanso.py", title="🌴 Vacaciones"),
                 st.Page("pages/4_Modulos_admin.py", title="📚 Módulos"),
-                st.Page("pages/7_Configuration.py", title="⚙️ Configuración")
+                st.Page("pages/7_Configuration.py", title="⚙️ Configuración"),
+                st.Page("pages/6_Admin.py", title="📈 Diagnóstico")
             ],
             "Reportes": [
                 st.Page("pages/6_Buscar_estudiantes_Admin.py", title="🔍 Buscar"),
@@ -48,7 +54,24 @@ else:
         }
 
 pg = st.navigation(pages)
-pg.run()
+page_name = pg.url_path or "login"
+set_current_page(page_name) # Page of origin for Firebase/cache metrics
+if st.session_state.get("logged_in", False):
+    show_save_status() # Toasts for saves finished since the last run, polling while some are pending
+run_started = time.perf_counter()
+try:
+    pg.run()
+finally:
+    # Also runs when the page calls st.stop() or st.rerun()
+    record_rerun(page_name, time.perf_counter() - run_started)
+    profile_report = finish_page_profile()
+
+# Admin pages share the "course_selector" key; remember the course for the next login's warm-up
+if st.session_state.get("admin", False):
+    record_course_use(st.session_state.get("email"), st.session_state.get("course_selector"))
+
+if profile_report and st.session_state.get("admin", False):
+    show_profile(profile_report)
 
 
 
@@ -2,6 +2,8 @@ import streamlit as st
 import pyrebase
 from config import auth, db
 from datetime import datetime, timedelta
+from warmup_utils import start_login_warmup, recent_courses
+from auth_utils import start_auth_session, stop_auth_session
 
 
 
@@ -28,12 +30,15 @@ def login_user(email, password):
         login_time = datetime.now()
         token_lifetime = timedelta(seconds=int(user['expiresIn']))
         st.session_state.token_expires_at = login_time + token_lifetime
+        # Keeps the ID token fresh in the background (see auth_utils.current_token)
+        start_auth_session(user)
 
         if 'admin' in email.lower():
             st.session_state.admin = True
         else:
             st.session_state.admin = False
-        st.cache_data.clear()
+        # Load the user's courses while the first page renders
+        start_login_warmup(st.session_state.admin, st.session_state.email, recent_courses(st.session_state.email))
         st.rerun()
     except Exception as e: # Catch generic Firebase errors or others
         st.error(f"Error de inicio de sesión: Usuario o contraseña incorrectos.")
@@ -49,6 +54,7 @@ def logout_user():
         'user',
         'user_token',
         'token_expires_at',
+        'auth_manager',
         'admin',
         'attendance_data',             # From Asistencia.py
         'students_df_by_course',       # From Asistencia.py
@@ -57,6 +63,8 @@ def logout_user():
         # Add any other keys that store user data here
     ]
 
+    stop_auth_session()
+
     # 2. Loop through the list and delete each key if it exists.
     for key in user_session_keys:
         if key in st.session_state:
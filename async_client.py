@@ -0,0 +1,144 @@
+# async_client.py
+
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from config import db
+from auth_utils import current_token
+from log_utils import get_logger
+from prefetch_utils import session_thread_initializer
+
+logger = get_logger(__name__)
+
+# Reads in flight at once. pyrebase is blocking, so each read holds one
+# executor thread while it waits on the network.
+MAX_CONCURRENCY = 8
+
+
+def list_courses(table: str) -> list:
+    """
+    Course keys under `table`, read with a shallow query (keys only, no subtrees).
+
+    Args:
+        table (str): 'students', 'attendance' or 'modules'.
+
+    Returns:
+        list: Sorted course keys (e.g. "cba1@iti,edu").
+    """
+    keys = db.child(table).shallow().get(token=current_token()).val()
+    return sorted(keys) if keys else []
+
+
+def course_ref(table: str, course_key: str, child: str = None, start_at: str = None,
+               end_at: str = None, shallow: bool = False):
+    """
+    Reference to one course's subtree, optionally limited to a key range.
+
+    Args:
+        table (str): Top-level node ('students', 'attendance', 'modules').
+        course_key (str): Course key under `table`.
+        child (str, optional): Path below the course (e.g. 'data').
+        start_at (str, optional): First key to read (e.g. '2025-06-01' for attendance days).
+        end_at (str, optional): Last key to read.
+        shallow (bool): Read keys only.
+
+    Returns:
+        InstrumentedDatabase: The reference; nothing is read yet.
+    """
+    ref = db.child(table).child(course_key)
+    if child:
+        ref = ref.child(child)
+    if shallow:
+        return ref.shallow()
+    if start_at is not None or end_at is not None:
+        ref = ref.order_by_key()
+        if start_at is not None:
+            ref = ref.start_at(start_at)
+        if end_at is not None:
+            ref = ref.end_at(end_at)
+    return ref
+
+
+async def iter_reads(refs: dict, token: str, limit: int = MAX_CONCURRENCY):
+    """
+    Read every reference concurrently and yield the results as they arrive.
+
+    Args:
+        refs (dict): {key: database reference}.
+        token (str): Firebase id token.
+        limit (int): Maximum number of reads in flight.
+
+    Yields:
+        tuple: (key, value) in completion order. A failed read raises here.
+    """
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(limit)
+
+    async def read(key, ref):
+        async with semaphore:
+            response = await loop.run_in_executor(None, functools.partial(ref.get, token=token))
+        return key, response.val()
+
+    for next_result in asyncio.as_completed([read(key, ref) for key, ref in refs.items()]):
+        yield await next_result
+
+
+def stream_reads(refs: dict, limit: int = MAX_CONCURRENCY):
+    """
+    Synchronous front end of `iter_reads` for page code.
+
+    Runs an event loop on the calling thread and hands each result over as soon
+    as it arrives, so callers can process (or display) one course while the
+    others are still downloading. Leaving the loop early cancels pending reads.
+
+    Args:
+        refs (dict): {key: database reference}.
+        limit (int): Maximum number of reads in flight.
+
+    Yields:
+        tuple: (key, value) in completion order.
+    """
+    if not refs:
+        return
+    token = current_token()
+    loop = asyncio.new_event_loop()
+    loop.set_default_executor(ThreadPoolExecutor(
+        max_workers=min(limit, len(refs)), thread_name_prefix="fan-out", initializer=session_thread_initializer()
+    ))
+    results = iter_reads(refs, token, limit)
+    try:
+        while True:
+            try:
+                yield loop.run_until_complete(results.__anext__())
+            except StopAsyncIteration:
+                break
+    finally:
+        pending = asyncio.all_tasks(loop)
+        if pending:
+            for task in pending:
+                task.cancel()
+            loop.run_until_complete(asyncio.wait(pending))
+        loop.run_until_complete(results.aclose())
+        loop.run_until_complete(loop.shutdown_default_executor())
+        loop.close()
+
+
+def stream_course_subtrees(table: str, courses: list = None, child: str = None, start_at: str = None,
+                           end_at: str = None, shallow: bool = False, limit: int = MAX_CONCURRENCY):
+    """
+    Read one subtree per course in parallel and yield each as it arrives.
+
+    Args:
+        table (str): Top-level node ('students', 'attendance', 'modules').
+        courses (list, optional): Course keys; all courses under `table` if None.
+        child, start_at, end_at, shallow: See `course_ref`.
+        limit (int): Maximum number of reads in flight.
+
+    Yields:
+        tuple: (course_key, value) in completion order.
+    """
+    if courses is None:
+        courses = list_courses(table)
+    refs = {course: course_ref(table, course, child, start_at, end_at, shallow) for course in courses}
+    logger.debug("Fan-out read of %s for %d courses", table, len(refs))
+    yield from stream_reads(refs, limit)
@@ -3,49 +3,199 @@
 import streamlit as st
 import datetime
 import functools
+import threading
+from streamlit.runtime import Runtime
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+from config import auth
+from log_utils import get_logger
+from metrics_utils import REGISTRY
+
+logger = get_logger(__name__)
+
+# Session state key of the session's AuthManager
+SESSION_KEY = "auth_manager"
+# Refresh this long before the ID token expires
+REFRESH_MARGIN = datetime.timedelta(minutes=5)
+# Firebase ID tokens last one hour; pyrebase's refresh() does not return expiresIn
+DEFAULT_TOKEN_LIFETIME = 3600
+# Wait between attempts when a refresh fails (network errors, Firebase hiccups)
+RETRY_SECONDS = 30
+
+# Token source of threads that work for a session without its ScriptRunContext
+_thread_state = threading.local()
+
+REGISTRY.describe('auth_refresh_total', 'Background ID token refreshes, by result (ok/error).')
+
+
+class AuthManager:
+    """
+    Holds one session's Firebase tokens and refreshes the ID token on a
+    background thread shortly before it expires, so no page run or data call
+    ever waits for a refresh. The thread ends on logout or when the session
+    is gone from the server.
+    """
+
+    def __init__(self, user: dict):
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self.failed = False
+        self._set_tokens(user)
+        ctx = get_script_run_ctx(suppress_warning=True)
+        self._session_id = ctx.session_id if ctx is not None else None
+        self._thread = threading.Thread(target=self._run, name="token-refresh", daemon=True)
+        self._thread.start()
+
+    def _set_tokens(self, user: dict):
+        lifetime = datetime.timedelta(seconds=int(user.get('expiresIn', DEFAULT_TOKEN_LIFETIME)))
+        with self._lock:
+            self._id_token = user['idToken']
+            self._refresh_token = user['refreshToken']
+            self._expires_at = datetime.datetime.now() + lifetime
+
+    @property
+    def token(self) -> str:
+        """The current ID token. Refreshes synchronously only if the background refresh fell behind."""
+        with self._lock:
+            expired = datetime.datetime.now() >= self._expires_at
+            token = self._id_token
+        if expired and not self.failed:
+            if self.refresh():
+                with self._lock:
+                    token = self._id_token
+        return token
+
+    @property
+    def expires_at(self) -> datetime.datetime:
+        with self._lock:
+            return self._expires_at
+
+    def refresh(self) -> bool:
+        """
+        Exchange the refresh token for a new ID token.
+
+        Returns:
+            bool: True if the token was refreshed (here or by a concurrent call).
+        """
+        previous = self.expires_at
+        with self._refresh_lock:
+            if self.expires_at != previous:
+                # Another thread refreshed while this one waited
+                return True
+            with self._lock:
+                refresh_token = self._refresh_token
+            try:
+                self._set_tokens(auth.refresh(refresh_token))
+            except Exception as e:
+                REGISTRY.inc('auth_refresh_total', result='error')
+                logger.warning("ID token refresh failed: %s", e)
+                if datetime.datetime.now() >= self.expires_at:
+                    self.failed = True
+                return False
+        self.failed = False
+        REGISTRY.inc('auth_refresh_total', result='ok')
+        logger.debug("ID token refreshed, expires at %s", self.expires_at)
+        return True
+
+    def _session_alive(self) -> bool:
+        if self._session_id is None or not Runtime.exists():
+            return True
+        return Runtime.instance().is_active_session(self._session_id)
+
+    def _run(self):
+        while True:
+            wait = (self.expires_at - REFRESH_MARGIN - datetime.datetime.now()).total_seconds()
+            if self._stop_event.wait(max(wait, 0)):
+                return
+            if not self._session_alive():
+                logger.debug("Session %s ended; stopping token refresh", self._session_id)
+                return
+            if not self.refresh() and self._stop_event.wait(RETRY_SECONDS):
+                return
+
+    def stop(self):
+        """Stop the background refresh (logout)."""
+        self._stop_event.set()
+
+
+def start_auth_session(user: dict):
+    """Create the session's AuthManager after sign-in, replacing any previous one."""
+    stop_auth_session()
+    st.session_state[SESSION_KEY] = AuthManager(user)
+
+
+def stop_auth_session():
+    """Stop the session's background refresh, if any."""
+    manager = st.session_state.get(SESSION_KEY)
+    if manager is not None:
+        manager.stop()
+
+
+def current_token() -> str:
+    """
+    The session's current Firebase ID token: the one accessor every database
+    call uses for its `token` argument.
+
+    On a thread given a token source (see use_token_source) that source is
+    used. Falls back to st.session_state.user_token for sessions without an
+    AuthManager (benchmarks, load tests and tests that set the token directly).
+    """
+    source = getattr(_thread_state, 'token_source', None)
+    if source is not None:
+        return source()
+    manager = st.session_state.get(SESSION_KEY)
+    if manager is None:
+        return st.session_state.get('user_token')
+    return manager.token
+
+
+def token_source():
+    """
+    A callable returning the session's current ID token, for work that runs
+    after the page run on a thread without the session's context (which must
+    not touch st.session_state while the session reruns).
+    """
+    manager = st.session_state.get(SESSION_KEY)
+    if manager is None:
+        token = st.session_state.get('user_token')
+        return lambda: token
+    return lambda: manager.token
+
+
+def use_token_source(source):
+    """
+    Make current_token() on the calling thread return `source()`, for work done
+    for a session on a thread without its context (a token_source() taken on
+    the script thread). None removes it.
+    """
+    _thread_state.token_source = source
+
+
+def thread_token_source():
+    """The calling thread's token source set by use_token_source, or None."""
+    return getattr(_thread_state, 'token_source', None)
 
-def smart_refresh_token():
-    """
-    Checks if the user's token is about to expire and refreshes it only if needed.
-    This is the core logic that checks the timer.
-    """
-    # print("\n\nsmart_refresh_token expires at: ", st.session_state.token_expires_at)
-    # print("\n\nsmart_refresh_token now: ", st.session_state.token_expires_at - datetime.timedelta(minutes=5))
-    if 'user' not in st.session_state or not st.session_state.user:
-        return False
-
-    if datetime.datetime.now() >= st.session_state.token_expires_at - datetime.timedelta(minutes=5):
-        try:
-            refreshed_user = st.session_state.user.refresh(st.session_state.user['refreshToken'])
-            st.session_state.user = refreshed_user
-            st.session_state.user_token = refreshed_user['idToken']
-            login_time = datetime.datetime.now()
-            token_lifetime = datetime.timedelta(seconds=int(refreshed_user['expiresIn']))
-            st.session_state.token_expires_at = login_time + token_lifetime
-        except Exception as e:
-            st.error("Your session has expired. Please log in again.")
-            st.session_state.clear() # Force a full logout on refresh failure
-            st.rerun()
-            return False
-            
-    return True
 
 def require_auth(func):
     """
-    A decorator that checks for a valid auth token before running a function.
-    If the token is invalid or expired, it stops execution and warns the user.
+    A decorator that checks the user is logged in before running a function.
+    The token itself is kept fresh by the session's AuthManager; if it could
+    not be refreshed, the session is closed and the user is sent back to log in.
     """
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
         if not st.session_state.get('logged_in'):
             st.warning("Please log in to perform this action.")
             return None # Or return a default value appropriate for the wrapped function
-        
-        if smart_refresh_token():
-            # If token is valid or refreshed, run the original function
-            return func(*args, **kwargs)
-        else:
-            # If token refresh fails, do not run the function
-            return None # Or return a default value
-            
-    return wrapper
\ No newline at end of file
+
+        manager = st.session_state.get(SESSION_KEY)
+        if manager is not None and manager.failed:
+            st.error("Your session has expired. Please log in again.")
+            stop_auth_session()
+            st.session_state.clear() # Force a full logout on refresh failure
+            st.rerun()
+            return None
+
+        return func(*args, **kwargs)
+
+    return wrapper
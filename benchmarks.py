@@ -0,0 +1,264 @@
+# benchmarks.py
+#
+# Timing benchmarks for the data-processing hot paths, run against the
+# synthetic dataset (synthetic_data.py) through the in-process fake Firebase.
+#
+#   python benchmarks.py                         # small and medium, compare with the baseline
+#   python benchmarks.py --scales large --repeats 3
+#   python benchmarks.py --save-baseline         # store these results as the new baseline
+#
+# Baselines are machine specific: record one on the machine that runs the
+# comparison (e.g. the CI runner) before relying on the regression check.
+
+import os
+
+# Must be set before config is imported
+os.environ["DATA_BACKEND"] = "fake"
+os.environ.setdefault("FAKE_LATENCY_MS", "0")
+
+import argparse
+import contextlib
+import datetime
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import pandas as pd
+import streamlit as st
+import streamlit.logger
+import async_client
+import fake_firebase
+import utils_admin
+from metrics_utils import instrument_database
+from roster_utils import roster_frame, normalize_roster
+from synthetic_data import generate_dataset, dataset_stats, teams_report
+from report_parser import read_participants, participant_names
+from name_matching import attendance_matrix, attendance_tables
+from utils import build_attendance_summary, active_students_per_month
+from utils_admin import (
+    find_students, load_breaks_from_db, parse_breaks, calculate_end_date, calculate_module_dates_forward_stretch
+)
+
+# Bare-mode warnings (no ScriptRunContext) would drown the results
+streamlit.logger.set_log_level("error")
+
+SCALES = {
+    'small': {'courses': 2, 'students_per_course': 30, 'days': 60},
+    'medium': {'courses': 5, 'students_per_course': 150, 'days': 180},
+    'large': {'courses': 10, 'students_per_course': 500, 'days': 365}
+}
+# Fixed so that every run benchmarks byte-for-byte the same data
+END_DATE = datetime.date(2025, 6, 27)
+SEED = 42
+
+BASELINE_FILE = "benchmark_baseline.json"
+RESULTS_FILE = "benchmark_results.json"
+# A benchmark regresses when its median is this much slower than the baseline...
+DEFAULT_THRESHOLD = 0.25
+# ...and at least this many milliseconds slower (timer noise on very fast paths)
+MIN_DELTA_MS = 2.0
+
+
+def _all_students(tree):
+    """One normalized-ready DataFrame with every course's roster (index 'id')."""
+    frames = [roster_frame(course['data']) for course in tree['students'].values()]
+    return pd.concat(frames)
+
+
+def build_benchmarks(tree):
+    """
+    Prepare the benchmarks for one dataset.
+
+    Returns:
+        list: (name, size, callable) tuples. `size` is the number of records the callable processes.
+    """
+    first_course = next(iter(tree['students']))
+    course_students = roster_frame(tree['students'][first_course]['data']).rename_axis('id').reset_index()
+    course_attendance = tree['attendance'][first_course]
+    attendance_dates = sorted(course_attendance)
+    report_start = datetime.date.fromisoformat(attendance_dates[0])
+    report_end = datetime.date.fromisoformat(attendance_dates[-1])
+
+    all_students = _all_students(tree)
+    # Teams exports the report as UTF-16
+    report_bytes = teams_report(all_students['nombre'].tolist()).encode('utf-16')
+    roster_names = all_students['nombre']
+    # Display names as Teams shows them: other case, last names first
+    teams_names = [' '.join(reversed(name.split())).upper() for name in roster_names]
+    # A week of reports: most students every day, a few missing each day
+    participants_by_date = {
+        report_start + datetime.timedelta(days=day): set(teams_names[day::7]) | set(teams_names[:len(teams_names) // 2])
+        for day in range(7)
+    }
+
+    active_frame = all_students[['fecha_inicio', 'fecha_fin']].copy()
+    active_frame['fecha_inicio'] = pd.to_datetime(active_frame['fecha_inicio'])
+    active_frame['fecha_fin'] = pd.to_datetime(active_frame['fecha_fin'])
+
+    module_durations = [module['duration_weeks'] for module in tree['modules'][first_course].values()]
+
+    def module_schedule():
+        # What the student pages do per row (get_end_date) plus "Recalcular las fechas"
+        # of the modules page, which chains every module of the course after the previous one
+        for start in course_students['fecha_inicio']:
+            breaks = parse_breaks(load_breaks_from_db())
+            calculate_end_date(datetime.date.fromisoformat(start), 12, breaks)
+        breaks = [(pd.Timestamp(start), pd.Timestamp(end)) for start, end in parse_breaks(load_breaks_from_db())]
+        last_date_used = pd.Timestamp(report_start) - pd.Timedelta(days=1)
+        for duration_weeks in module_durations:
+            _, last_date_used = calculate_module_dates_forward_stretch(duration_weeks, last_date_used, breaks)
+
+    return [
+        ('find_students', len(all_students), lambda: find_students("ma", None, "all")),
+        ('attendance_report', sum(len(day) for day in course_attendance.values()),
+         lambda: build_attendance_summary(course_students, course_attendance, report_start, report_end)),
+        ('parse_attendance_report', len(all_students),
+         lambda: participant_names(read_participants(report_bytes, "benchmark.csv", parse_times=False))),
+        ('attendance_tables', len(roster_names) * len(participants_by_date),
+         lambda: attendance_tables(attendance_matrix(roster_names, participants_by_date))),
+        ('normalize_roster', len(all_students), lambda: normalize_roster(all_students)),
+        ('module_schedule', len(course_students) + len(module_durations), module_schedule),
+        ('active_students_per_month', len(active_frame),
+         lambda: active_students_per_month(active_frame, 'fecha_inicio', 'fecha_fin'))
+    ]
+
+
+def time_call(func, repeats):
+    """Run `func` once to warm up, then `repeats` times. Returns the timings in milliseconds."""
+    timings = []
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        func()
+        for _ in range(repeats):
+            started = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def run(scales, repeats, only=None):
+    """
+    Run the benchmarks at each scale.
+
+    Args:
+        scales (list): Keys of SCALES.
+        repeats (int): Timed runs per benchmark.
+        only (list, optional): Benchmark names to run; all if None.
+
+    Returns:
+        list: One result dict per (scale, benchmark).
+    """
+    results = []
+    for scale in scales:
+        tree = generate_dataset(end_date=END_DATE, seed=SEED, **SCALES[scale])
+        firebase = fake_firebase.FakeFirebase(tree)
+        # find_students and load_breaks_from_db read through utils_admin.db (and the fan-out client)
+        utils_admin.db = async_client.db = instrument_database(firebase)
+        st.session_state.user_token = firebase.auth().sign_in_with_email_and_password("admin@iti.edu", "x")['idToken']
+
+        stats = dataset_stats(tree)
+        print(f"\n[{scale}] {stats['courses']} cursos, {stats['students']} estudiantes, "
+              f"{stats['attendance_records']} registros de asistencia")
+
+        for name, size, func in build_benchmarks(tree):
+            if only and name not in only:
+                continue
+            timings = time_call(func, repeats)
+            result = {
+                'scale': scale,
+                'benchmark': name,
+                'size': size,
+                'repeats': repeats,
+                'min_ms': min(timings),
+                'median_ms': statistics.median(timings),
+                'mean_ms': statistics.fmean(timings),
+                'max_ms': max(timings)
+            }
+            results.append(result)
+            print(f"  {name:<28} {result['median_ms']:>10.2f} ms  (min {result['min_ms']:.2f}, n={size})")
+    return results
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, threshold):
+    """
+    Compare median timings with a baseline.
+
+    Returns:
+        list: Result dicts of the benchmarks that regressed, with 'baseline_ms' and 'ratio' added.
+    """
+    baseline_medians = {(r['scale'], r['benchmark']): r['median_ms'] for r in baseline.get('results', [])}
+    thresholds = baseline.get('thresholds', {})
+    regressions = []
+
+    print(f"\nComparación con la línea base ({baseline.get('git_commit') or 'sin commit'}, {baseline.get('created_at')}):")
+    for result in results:
+        key = (result['scale'], result['benchmark'])
+        if key not in baseline_medians:
+            print(f"  {key[0]:<6} {key[1]:<28} sin línea base")
+            continue
+        base_ms = baseline_medians[key]
+        ratio = result['median_ms'] / base_ms if base_ms else float('inf')
+        limit = thresholds.get(result['benchmark'], threshold)
+        regressed = ratio > 1 + limit and result['median_ms'] - base_ms > MIN_DELTA_MS
+        print(f"  {key[0]:<6} {key[1]:<28} {base_ms:>10.2f} -> {result['median_ms']:>10.2f} ms  "
+              f"x{ratio:.2f}{'  REGRESIÓN' if regressed else ''}")
+        if regressed:
+            regressions.append({**result, 'baseline_ms': base_ms, 'ratio': ratio})
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks de las rutas de procesamiento de datos.")
+    parser.add_argument("--scales", nargs="+", choices=list(SCALES), default=["small", "medium"])
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--only", nargs="+", help="Nombres de benchmarks a ejecutar")
+    parser.add_argument("--out", default=RESULTS_FILE, help="Archivo JSON de resultados")
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Regresión permitida sobre la mediana de la línea base (0.25 = 25%%)")
+    parser.add_argument("--save-baseline", action="store_true", help="Guardar los resultados como nueva línea base")
+    args = parser.parse_args()
+
+    report = {
+        'created_at': datetime.datetime.now().isoformat(timespec='seconds'),
+        'git_commit': _git_commit(),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'platform': platform.platform(),
+        'results': run(args.scales, args.repeats, args.only)
+    }
+
+    with open(args.out, 'w', encoding='utf-8') as out:
+        json.dump(report, out, ensure_ascii=False, indent=2)
+    print(f"\nResultados guardados en {args.out}")
+
+    if args.save_baseline:
+        previous = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline, encoding='utf-8') as baseline_file:
+                previous = json.load(baseline_file)
+        # Per-benchmark thresholds are edited by hand in the baseline file and kept across updates
+        report['thresholds'] = previous.get('thresholds', {})
+        with open(args.baseline, 'w', encoding='utf-8') as baseline_file:
+            json.dump(report, baseline_file, ensure_ascii=False, indent=2)
+        print(f"Línea base guardada en {args.baseline}")
+        sys.exit(0)
+
+    if not os.path.exists(args.baseline):
+        print(f"No hay línea base en {args.baseline}; ejecute con --save-baseline para crearla.")
+        sys.exit(0)
+
+    with open(args.baseline, encoding='utf-8') as baseline_file:
+        baseline = json.load(baseline_file)
+    regressions = compare(report['results'], baseline, args.threshold)
+    if regressions:
+        print(f"\n{len(regressions)} benchmark(s) más lentos que la línea base.")
+        sys.exit(1)
@@ -1,26 +1,80 @@
+import os
 import streamlit as st
 import pyrebase
 from dotenv import load_dotenv
+from metrics_utils import instrument_database
 
 # Load environment variables
 load_dotenv()
 
-# Firebase configuration
-firebaseConfig = {
-    "apiKey": st.secrets["firebase"]["apiKey"],
-    "databaseURL": st.secrets["firebase"]["databaseURL"],
-    "authDomain": st.secrets["firebase"]["authDomain"],
-    "projectId": st.secrets["firebase"]["projectId"],
-    "storageBucket": st.secrets["firebase"]["storageBucket"],
-    "messagingSenderId": st.secrets["firebase"]["messagingSenderId"],
-    "appId": st.secrets["firebase"]["appId"],
-    "measurementId": st.secrets["firebase"]["measurementId"]
+def _secrets_section(name):
+    """A section of st.secrets, or {} when there is no secrets file (e.g. with the fake backend)."""
+    try:
+        return st.secrets.get(name, {})
+    except FileNotFoundError:
+        return {}
+
+# Logging configuration (st.secrets["logging"] overrides the environment).
+# payloads: "metadata" logs only sizes/counts of Firebase payloads (production default),
+#           "sample" also logs a truncated sample for a fraction of calls (sample_rate).
+_logging_secrets = _secrets_section("logging")
+LOG_CONFIG = {
+    "level": str(_logging_secrets.get("level", os.getenv("LOG_LEVEL", "INFO"))).upper(),
+    "payloads": str(_logging_secrets.get("payloads", os.getenv("LOG_PAYLOADS", "metadata"))).lower(),
+    "sample_rate": float(_logging_secrets.get("sample_rate", os.getenv("LOG_SAMPLE_RATE", "0.05")))
+}
+
+# Page profiler configuration (st.secrets["profiler"] overrides the environment).
+# Off by default: when enabled, every page run records phase timings and, while
+# cprofile is on, cProfile stats (see profiler_utils.py).
+_profiler_secrets = _secrets_section("profiler")
+PROFILER_CONFIG = {
+    "enabled": str(_profiler_secrets.get("enabled", os.getenv("PROFILE_PAGES", "false"))).lower() in ("1", "true", "yes"),
+    "cprofile": str(_profiler_secrets.get("cprofile", os.getenv("PROFILE_CPROFILE", "true"))).lower() in ("1", "true", "yes"),
+    "keep_slowest": int(_profiler_secrets.get("keep_slowest", os.getenv("PROFILE_KEEP_SLOWEST", "5"))),
+    "output_dir": str(_profiler_secrets.get("output_dir", os.getenv("PROFILE_OUTPUT_DIR", "profiles")))
+}
+
+# Data backend: "firebase" (production) or "fake", an in-process database filled with
+# synthetic data for offline benchmarks and load tests (see fake_firebase.py).
+# Set with st.secrets["DATA_BACKEND"] or the DATA_BACKEND environment variable. The fake
+# backend needs no secrets file; its settings come from st.secrets["fake_backend"] or the
+# FAKE_* environment variables.
+try:
+    DATA_BACKEND = str(st.secrets.get("DATA_BACKEND", os.getenv("DATA_BACKEND", "firebase"))).lower()
+except FileNotFoundError:
+    DATA_BACKEND = os.getenv("DATA_BACKEND", "firebase").lower()
+_fake_secrets = _secrets_section("fake_backend")
+FAKE_BACKEND_CONFIG = {
+    "data_file": _fake_secrets.get("data_file", os.getenv("FAKE_DATA_FILE")),
+    "courses": int(_fake_secrets.get("courses", os.getenv("FAKE_COURSES", "4"))),
+    "students_per_course": int(_fake_secrets.get("students_per_course", os.getenv("FAKE_STUDENTS", "30"))),
+    "days": int(_fake_secrets.get("days", os.getenv("FAKE_DAYS", "60"))),
+    "seed": int(_fake_secrets.get("seed", os.getenv("FAKE_SEED", "42"))),
+    "latency_ms": float(_fake_secrets.get("latency_ms", os.getenv("FAKE_LATENCY_MS", "0"))),
+    "jitter_ms": float(_fake_secrets.get("jitter_ms", os.getenv("FAKE_JITTER_MS", "0"))),
+    "password": _fake_secrets.get("password", os.getenv("FAKE_PASSWORD"))
 }
 
 # Initialize Firebase
-firebase = pyrebase.initialize_app(firebaseConfig)
+if DATA_BACKEND == "fake":
+    import fake_firebase
+    firebase = fake_firebase.initialize_app(FAKE_BACKEND_CONFIG)
+else:
+    firebaseConfig = {
+        "apiKey": st.secrets["firebase"]["apiKey"],
+        "databaseURL": st.secrets["firebase"]["databaseURL"],
+        "authDomain": st.secrets["firebase"]["authDomain"],
+        "projectId": st.secrets["firebase"]["projectId"],
+        "storageBucket": st.secrets["firebase"]["storageBucket"],
+        "messagingSenderId": st.secrets["firebase"]["messagingSenderId"],
+        "appId": st.secrets["firebase"]["appId"],
+        "measurementId": st.secrets["firebase"]["measurementId"]
+    }
+    firebase = pyrebase.initialize_app(firebaseConfig)
 auth = firebase.auth()
-db = firebase.database()
+# Every database operation goes through the metrics layer (see metrics_utils.py)
+db = instrument_database(firebase)
 
 @st.cache_data(ttl=300)
 
@@ -0,0 +1,135 @@
+# diff_utils.py
+
+import datetime
+import numpy as np
+import pandas as pd
+
+
+def clean_value(value, empty=""):
+    """
+    Convert a single DataFrame cell into a JSON-serializable Firebase value.
+
+    Args:
+        value: The cell value (may be a numpy/pandas scalar).
+        empty: Value used for NaN / None / pd.NA / NaT.
+
+    Returns:
+        A plain Python value (str, int, float, bool) or `empty`.
+    """
+    if value is None or value is pd.NA or value is pd.NaT:
+        return empty
+    if isinstance(value, float) and np.isnan(value):
+        return empty
+    if isinstance(value, (pd.Timestamp, datetime.datetime, datetime.date)):
+        return value.strftime("%Y-%m-%d")
+    if isinstance(value, np.bool_):
+        return bool(value)
+    if isinstance(value, np.integer):
+        return int(value)
+    if isinstance(value, np.floating):
+        return empty if np.isnan(value) else float(value)
+    if isinstance(value, str) and value == "":
+        return empty
+    return value
+
+
+def _keyed(df: pd.DataFrame, key: str) -> pd.DataFrame:
+    """Index a frame by `key`, dropping rows without a key (new, unsaved rows)."""
+    if key is None:
+        keyed = df.copy()
+        keyed.index = keyed.index.astype(str)
+    else:
+        keys = df[key]
+        has_key = keys.notna() & ~keys.astype(str).str.strip().isin(["", "None", "nan"])
+        keyed = df[has_key].set_index(keys[has_key].astype(str))
+    return keyed[~keyed.index.duplicated(keep="last")]
+
+
+def diff_frames(df_old: pd.DataFrame, df_new: pd.DataFrame, key="firebase_key", columns=None) -> dict:
+    """
+    Compare two versions of a table keyed by `key` without per-key filtering.
+
+    Both frames are indexed once by key and the common rows are compared
+    column-wise in a single vectorized pass. Pass `key=None` to use the
+    existing DataFrame index as the key (e.g. student ids).
+
+    Args:
+        df_old (pd.DataFrame): The version that was loaded from Firebase.
+        df_new (pd.DataFrame): The edited version.
+        key (str or None): Column holding the record key, or None to use the index.
+        columns (list, optional): Columns to compare. Defaults to every column
+                                  of df_new except the key.
+
+    Returns:
+        dict: {
+            'changed': {record_key: {column: new_value, ...}, ...},
+            'added': {record_key: {column: value, ...}, ...},
+            'deleted': [record_key, ...]
+        }
+    """
+    old = _keyed(df_old, key)
+    new = _keyed(df_new, key)
+
+    if columns is None:
+        columns = [col for col in new.columns if col != key]
+    columns = [col for col in columns if col in new.columns]
+
+    deleted = old.index.difference(new.index).tolist()
+    added_keys = new.index.difference(old.index)
+    common = new.index.intersection(old.index)
+
+    new_common = new.loc[common, columns].astype(object)
+    old_common = old.reindex(index=common, columns=columns).astype(object)
+    new_missing = new_common.isna().to_numpy()
+    old_missing = old_common.isna().to_numpy()
+
+    same = (old_common.to_numpy() == new_common.to_numpy()) | (old_missing & new_missing)
+    rows, cols = np.nonzero(~same)
+
+    changed = {}
+    values = new_common.to_numpy()
+    for row, col in zip(rows, cols):
+        changed.setdefault(common[row], {})[columns[col]] = values[row, col]
+
+    added = {}
+    if len(added_keys):
+        added = new.loc[added_keys, columns].to_dict("index")
+
+    return {'changed': changed, 'added': added, 'deleted': deleted}
+
+
+def build_patch(diff: dict, field_map=None, empty="", include_added=True) -> dict:
+    """
+    Turn a diff from `diff_frames` into one Firebase multi-path update.
+
+    Changed fields become "<key>/<field>" paths, deleted records become
+    "<key>": None and added records are written whole under "<key>".
+
+    Args:
+        diff (dict): Result of `diff_frames`.
+        field_map (dict, optional): Maps DataFrame column names to Firebase field names.
+                                    Columns not in the map keep their name.
+        empty: Value written for empty cells (None removes the field in Firebase).
+        include_added (bool): Whether to include added records in the patch.
+
+    Returns:
+        dict: Multi-path update payload, empty if there is nothing to write.
+    """
+    field_map = field_map or {}
+    patch = {}
+
+    for record_key, fields in diff['changed'].items():
+        for column, value in fields.items():
+            patch[f"{record_key}/{field_map.get(column, column)}"] = clean_value(value, empty)
+
+    if include_added:
+        for record_key, fields in diff['added'].items():
+            patch[str(record_key)] = {
+                field_map.get(column, column): clean_value(value, empty)
+                for column, value in fields.items()
+            }
+
+    for record_key in diff['deleted']:
+        patch[str(record_key)] = None
+
+    return patch
@@ -0,0 +1,400 @@
+# fake_firebase.py
+
+import copy
+import json
+import random
+import threading
+import time
+import types
+from pyrebase.pyrebase import PyreResponse, convert_to_pyre, convert_list_to_pyre
+from synthetic_data import push_id
+
+
+class _FakeResponse:
+    """The parts of a requests.Response that response hooks read (see metrics_utils)."""
+
+    def __init__(self, content: bytes, body: bytes = None):
+        self.content = content
+        self.request = types.SimpleNamespace(body=body)
+
+
+def _to_stored(value):
+    """
+    Normalize a value the way Realtime Database stores it: arrays become
+    objects keyed by index and null or empty children disappear.
+    """
+    if isinstance(value, (list, tuple)):
+        value = {str(i): item for i, item in enumerate(value)}
+    if isinstance(value, dict):
+        stored = {}
+        for key, item in value.items():
+            item = _to_stored(item)
+            if item is not None:
+                stored[str(key)] = item
+        return stored or None
+    return value
+
+
+def _to_response(value):
+    """Convert stored objects back to arrays when Firebase would (integer keys, mostly dense)."""
+    if not isinstance(value, dict):
+        return value
+    value = {key: _to_response(item) for key, item in value.items()}
+    if value and all(key.isdigit() for key in value):
+        highest = max(int(key) for key in value)
+        if len(value) > highest / 2:
+            return [value.get(str(i)) for i in range(highest + 1)]
+    return value
+
+
+def _split(path: str) -> list:
+    return [segment for segment in path.split('/') if segment]
+
+
+def _ranked(item):
+    """Firebase ordering across types: null first, then booleans, numbers, strings and objects."""
+    if item is None:
+        return (0, 0)
+    if isinstance(item, bool):
+        return (1, item)
+    if isinstance(item, (int, float)):
+        return (2, item)
+    if isinstance(item, str):
+        return (3, item)
+    return (4, 0)
+
+
+def _ordered_by(key, value, order_by):
+    """The value a child is ordered by for orderBy=`order_by`."""
+    if order_by == '$key':
+        return key
+    if order_by == '$value':
+        return value
+    for segment in _split(order_by):
+        value = value.get(segment) if isinstance(value, dict) else None
+    return value
+
+
+class FakeDatabase:
+    """
+    In-process stand-in for pyrebase's Database, backed by a FakeFirebase store.
+
+    Mirrors pyrebase's builder interface: `child()` and the query methods
+    modify this object and return it, and every operation resets the path.
+    """
+
+    def __init__(self, firebase):
+        self._firebase = firebase
+        self.path = ""
+        self.build_query = {}
+
+    def child(self, *args):
+        new_path = "/".join([str(arg) for arg in args])
+        if self.path:
+            self.path += "/{}".format(new_path)
+        else:
+            if new_path.startswith("/"):
+                new_path = new_path[1:]
+            self.path = new_path
+        return self
+
+    def order_by_key(self):
+        self.build_query["orderBy"] = "$key"
+        return self
+
+    def order_by_value(self):
+        self.build_query["orderBy"] = "$value"
+        return self
+
+    def order_by_child(self, order):
+        self.build_query["orderBy"] = order
+        return self
+
+    def start_at(self, start):
+        self.build_query["startAt"] = start
+        return self
+
+    def end_at(self, end):
+        self.build_query["endAt"] = end
+        return self
+
+    def equal_to(self, equal):
+        self.build_query["equalTo"] = equal
+        return self
+
+    def limit_to_first(self, limit_first):
+        self.build_query["limitToFirst"] = limit_first
+        return self
+
+    def limit_to_last(self, limit_last):
+        self.build_query["limitToLast"] = limit_last
+        return self
+
+    def shallow(self):
+        self.build_query["shallow"] = True
+        return self
+
+    def generate_key(self):
+        return self._firebase.generate_key()
+
+    def _take_path(self):
+        path, query = self.path, self.build_query
+        self.path, self.build_query = "", {}
+        return path, query
+
+    def get(self, token=None, json_kwargs=None):
+        path, query = self._take_path()
+        query_key = path.split("/")[-1]
+        request_dict = self._firebase.read(path, query)
+
+        # Same response shaping as pyrebase's Database.get
+        if isinstance(request_dict, list):
+            return PyreResponse(convert_list_to_pyre(request_dict), query_key)
+        if not isinstance(request_dict, dict):
+            return PyreResponse(request_dict, query_key)
+        if not query:
+            return PyreResponse(convert_to_pyre(request_dict.items()), query_key)
+        if query.get("shallow"):
+            return PyreResponse(request_dict.keys(), query_key)
+        sorted_response = None
+        if query.get("orderBy"):
+            if query["orderBy"] == "$key":
+                sorted_response = sorted(request_dict.items(), key=lambda item: item[0])
+            elif query["orderBy"] == "$value":
+                sorted_response = sorted(request_dict.items(), key=lambda item: item[1])
+            else:
+                sorted_response = sorted(request_dict.items(), key=lambda item: (query["orderBy"] in item[1], item[1].get(query["orderBy"], "")))
+        return PyreResponse(convert_to_pyre(sorted_response), query_key)
+
+    def set(self, data, token=None, json_kwargs=None):
+        path, _ = self._take_path()
+        return self._firebase.write('set', path, data)
+
+    def update(self, data, token=None, json_kwargs=None):
+        path, _ = self._take_path()
+        return self._firebase.write('update', path, data)
+
+    def push(self, data, token=None, json_kwargs=None):
+        path, _ = self._take_path()
+        key = self._firebase.generate_key()
+        self._firebase.write('set', f"{path}/{key}" if path else key, data)
+        return {'name': key}
+
+    def remove(self, token=None):
+        path, _ = self._take_path()
+        self._firebase.write('set', path, None)
+
+
+class FakeAuth:
+    """Stand-in for pyrebase's Auth: any email signs in; an optional shared password is enforced."""
+
+    def __init__(self, password=None, expires_in=3600):
+        self.password = password
+        self.expires_in = expires_in
+        self.current_user = None
+
+    def _tokens(self, email):
+        suffix = f"{email}:{time.time_ns()}"
+        return f"fake-id-token:{suffix}", f"fake-refresh-token:{suffix}"
+
+    def sign_in_with_email_and_password(self, email, password):
+        if self.password is not None and password != self.password:
+            raise ValueError("INVALID_PASSWORD")
+        id_token, refresh_token = self._tokens(email)
+        self.current_user = {
+            'kind': 'identitytoolkit#VerifyPasswordResponse',
+            'localId': email.split('@')[0],
+            'email': email,
+            'displayName': '',
+            'idToken': id_token,
+            'registered': True,
+            'refreshToken': refresh_token,
+            'expiresIn': str(self.expires_in)
+        }
+        return self.current_user
+
+    def refresh(self, refresh_token):
+        email = refresh_token.split(':')[1] if refresh_token.count(':') >= 2 else 'fake'
+        id_token, new_refresh_token = self._tokens(email)
+        return {'userId': email.split('@')[0], 'idToken': id_token, 'refreshToken': new_refresh_token}
+
+    def get_account_info(self, id_token):
+        email = id_token.split(':')[1] if id_token.count(':') >= 2 else ''
+        return {'users': [{'localId': email.split('@')[0], 'email': email}]}
+
+
+class FakeFirebase:
+    """
+    In-process stand-in for a pyrebase app: `database()`, `auth()` and `requests.hooks`.
+
+    The data lives in one process-wide tree, so every session of the server sees the
+    same database. Payloads go through JSON both ways, like the REST API, and
+    response hooks receive the byte sizes, so metrics_utils accounting keeps working.
+
+    Args:
+        data (dict, optional): Initial tree (e.g. synthetic_data.generate_dataset()).
+        latency (float or callable): Seconds added to every operation, or
+            `latency(operation, path) -> seconds`.
+        jitter (float): Extra uniformly random seconds in [0, jitter).
+        password (str, optional): Password FakeAuth requires; any password if None.
+        seed (int, optional): Seed for the jitter.
+    """
+
+    def __init__(self, data=None, latency=0.0, jitter=0.0, password=None, seed=None):
+        self._lock = threading.RLock()
+        self._root = _to_stored(copy.deepcopy(data or {})) or {}
+        self._latency = latency
+        self._jitter = jitter
+        self._rng = random.Random(seed)
+        self._last_key_ms = 0
+        self._auth = FakeAuth(password)
+        self.requests = types.SimpleNamespace(hooks={'response': []})
+
+    def database(self):
+        return FakeDatabase(self)
+
+    def auth(self):
+        return self._auth
+
+    def generate_key(self) -> str:
+        with self._lock:
+            # Keys created in the same millisecond still sort in creation order
+            now = max(int(time.time() * 1000), self._last_key_ms + 1)
+            self._last_key_ms = now
+            return push_id(now, self._rng)
+
+    def export(self) -> dict:
+        """Deep copy of the whole tree as Firebase would return it."""
+        with self._lock:
+            return _to_response(copy.deepcopy(self._root)) or {}
+
+    def _delay(self, operation, path):
+        delay = self._latency(operation, path) if callable(self._latency) else self._latency
+        if self._jitter:
+            with self._lock:
+                delay += self._rng.uniform(0, self._jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+    def _notify(self, content: bytes, body: bytes = None):
+        response = _FakeResponse(content, body)
+        for hook in list(self.requests.hooks.get('response', [])):
+            hook(response)
+
+    def _node(self, segments):
+        node = self._root
+        for segment in segments:
+            if not isinstance(node, dict) or segment not in node:
+                return None
+            node = node[segment]
+        return node
+
+    def _assign(self, segments, value):
+        """Set (or delete, when value is None) the node at `segments`, pruning empty parents."""
+        if not segments:
+            self._root = value if isinstance(value, dict) else {}
+            return
+        parents = [self._root]
+        node = self._root
+        for segment in segments[:-1]:
+            child = node.get(segment)
+            if not isinstance(child, dict):
+                if value is None:
+                    return
+                child = node[segment] = {}
+            node = child
+            parents.append(node)
+        if value is None:
+            node.pop(segments[-1], None)
+            for parent, segment in zip(reversed(parents[:-1]), reversed(segments[:-1])):
+                if parent.get(segment) == {}:
+                    del parent[segment]
+        else:
+            node[segments[-1]] = value
+
+    def read(self, path: str, query: dict):
+        """Value at `path` after applying a pyrebase query, as decoded JSON."""
+        self._delay('get', path)
+        with self._lock:
+            value = self._node(_split(path))
+            if isinstance(value, dict) and query:
+                value = self._apply_query(value, query)
+            content = json.dumps(value).encode('utf-8')
+        self._notify(content)
+        return _to_response(json.loads(content))
+
+    def _apply_query(self, value: dict, query: dict):
+        if query.get("shallow"):
+            return {key: True if isinstance(item, dict) else item for key, item in value.items()}
+        order_by = query.get("orderBy")
+        if not order_by:
+            return value
+        items = sorted(value.items(), key=lambda item: (_ranked(_ordered_by(item[0], item[1], order_by)), item[0]))
+        if "equalTo" in query:
+            items = [item for item in items
+                     if _ranked(_ordered_by(item[0], item[1], order_by)) == _ranked(query["equalTo"])]
+        if "startAt" in query:
+            items = [item for item in items
+                     if _ranked(_ordered_by(item[0], item[1], order_by)) >= _ranked(query["startAt"])]
+        if "endAt" in query:
+            items = [item for item in items
+                     if _ranked(_ordered_by(item[0], item[1], order_by)) <= _ranked(query["endAt"])]
+        if "limitToFirst" in query:
+            items = items[:query["limitToFirst"]]
+        if "limitToLast" in query:
+            items = items[-query["limitToLast"]:]
+        return dict(items)
+
+    def write(self, operation: str, path: str, data):
+        """Apply a set (None removes) or a multi-path update at `path`."""
+        self._delay(operation, path)
+        body = json.dumps(data).encode('utf-8')
+        data = json.loads(body)
+        segments = _split(path)
+        with self._lock:
+            if operation == 'update':
+                if not isinstance(data, dict):
+                    raise ValueError("update() requires a dict")
+                for key, value in data.items():
+                    self._assign(segments + _split(key), _to_stored(value))
+            else:
+                self._assign(segments, _to_stored(data))
+        # The REST API echoes the written data back
+        self._notify(body, body)
+        return data
+
+
+def initialize_app(config: dict = None) -> FakeFirebase:
+    """
+    Build a FakeFirebase from the FAKE_BACKEND_CONFIG settings in config.py.
+
+    Loads `data_file` (a JSON dump from synthetic_data.py) if given, otherwise
+    generates a dataset with synthetic_data.generate_dataset.
+
+    Args:
+        config (dict, optional): Keys data_file, courses, students_per_course, days,
+            seed, latency_ms, jitter_ms, password.
+
+    Returns:
+        FakeFirebase: Ready to pass to metrics_utils.instrument_database.
+    """
+    from synthetic_data import generate_dataset
+
+    config = config or {}
+    if config.get("data_file"):
+        with open(config["data_file"], encoding='utf-8') as data_file:
+            data = json.load(data_file)
+    else:
+        data = generate_dataset(
+            courses=config.get("courses", 4),
+            students_per_course=config.get("students_per_course", 30),
+            days=config.get("days", 60),
+            seed=config.get("seed", 42)
+        )
+    return FakeFirebase(
+        data,
+        latency=config.get("latency_ms", 0) / 1000,
+        jitter=config.get("jitter_ms", 0) / 1000,
+        password=config.get("password"),
+        seed=config.get("seed", 42)
+    )
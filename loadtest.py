@@ -0,0 +1,340 @@
+# loadtest.py
+#
+# Concurrent-session load test. N simulated admins drive the whole app
+# (Home.py and its pages) through streamlit.testing.v1.AppTest against the
+# fake data backend: log in, open attendance, select a course, upload Teams
+# reports, save them, then generate the attendance report.
+#
+#   python loadtest.py --users 20 --iterations 3
+#   FAKE_LATENCY_MS=120 python loadtest.py --users 50 --out loadtest.json
+#
+# Every session runs in this process and shares its caches and Firebase
+# stand-in, like sessions of one server pod. Script execution is bound by
+# the GIL just as it is in `streamlit run`, so the throughput reported here
+# is a capacity estimate for one server process.
+
+import os
+
+# Must be set before config is imported
+os.environ["DATA_BACKEND"] = "fake"
+os.environ.setdefault("FAKE_LATENCY_MS", "80")
+os.environ.setdefault("FAKE_JITTER_MS", "40")
+
+import argparse
+import contextlib
+import datetime
+import json
+import random
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock
+import streamlit.logger
+from streamlit import config
+import streamlit.testing.v1.app_test as app_test
+import streamlit.testing.v1.local_script_runner as local_script_runner
+from streamlit.runtime import Runtime
+from streamlit.runtime.caching.storage.dummy_cache_storage import MemoryCacheStorageManager
+from streamlit.runtime.dataframe_source_manager import DataframeSourceManager
+from streamlit.runtime.media_file_manager import MediaFileManager
+from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+from streamlit.runtime.pages_manager import PagesManager
+from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+from streamlit.testing.v1 import AppTest
+from streamlit.testing.v1.util import build_mock_config_get_option
+from config import firebase, FAKE_BACKEND_CONFIG
+from metrics_utils import process_memory
+from save_queue import SESSION_KEY as SAVE_QUEUE_KEY
+from synthetic_data import teams_report, teams_report_filename
+
+# Bare-mode warnings (no ScriptRunContext) would drown the results
+streamlit.logger.set_log_level("error")
+
+APP_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Home.py")
+RUN_TIMEOUT = 120
+PRESENT_RATIO = 0.85
+RSS_SAMPLE_SECONDS = 0.25
+SAVE_POLL_SECONDS = 0.02
+
+
+def share_runtime_between_sessions():
+    """
+    Let AppTest sessions run concurrently in one process, like sessions of a server.
+
+    AppTest assumes one test at a time: every run installs its own mock Runtime,
+    script cache and pages-directory flag as process-wide globals and resets them
+    when it finishes, which breaks the runs still going on other threads. Here
+    those globals are set once (one Runtime, one ScriptCache and the test-mode
+    config option, as in `streamlit run`) and each run's own assignments land on
+    throwaway subclasses or no-ops.
+    """
+    runtime = MagicMock(spec=Runtime)
+    runtime.media_file_mgr = MediaFileManager(MemoryMediaFileStorage("/mock/media"))
+    runtime.dataframe_source_mgr = DataframeSourceManager()
+    runtime.cache_storage_manager = MemoryCacheStorageManager()
+    Runtime._instance = runtime
+    app_test.Runtime = type("SessionRuntime", (Runtime,), {})
+
+    # Home.py uses st.navigation, which turns the pages-directory mode off
+    PagesManager.uses_pages_directory = False
+    app_test.PagesManager = type("SessionPagesManager", (PagesManager,), {})
+
+    # Each run turns the global.appTest option on by patching config.get_option
+    # and restores the previous function when it ends, which turns it off (so
+    # widgets stop registering their test state) for runs still in progress.
+    # Turn it on once for the whole process instead
+    config.get_option = build_mock_config_get_option({"global.appTest": True})
+    app_test.patch_config_options = lambda overrides: contextlib.nullcontext()
+
+    # Compiling scripts on several threads at once is not safe on every Python
+    # version ("AST constructor recursion depth mismatch"). AppTest (for the
+    # pages) and its script runner (for Home.py) each build their own cache, so
+    # both get the shared one: every script is compiled once, under its lock
+    script_cache = ScriptCache()
+    app_test.ScriptCache = lambda: script_cache
+    local_script_runner.ScriptCache = lambda: script_cache
+
+
+class FlowError(Exception):
+    """A step of a flow failed (script exception or an expected widget is missing)."""
+
+
+class VirtualUser:
+    """
+    One simulated admin session. Each step is one or more reruns of the app;
+    every rerun is timed and recorded with the step name.
+    """
+
+    def __init__(self, user_n: int, courses: dict, rng: random.Random, reports_per_flow: int):
+        self.email = f"admin{user_n}@iti.edu"
+        self.courses = courses
+        self.rng = rng
+        self.reports_per_flow = reports_per_flow
+        self.reruns = []
+        self.app = None
+
+    def _rerun(self, step, action):
+        started = time.perf_counter()
+        error = None
+        try:
+            action().run(timeout=RUN_TIMEOUT)
+            if self.app.exception:
+                error = self.app.exception[0].value
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        self.reruns.append({'step': step, 'seconds': time.perf_counter() - started, 'error': error})
+        if error:
+            raise FlowError(f"{step}: {error}")
+
+    def _button(self, label_prefix):
+        for button in self.app.button:
+            if button.label.startswith(label_prefix):
+                return button
+        raise FlowError(f"Botón '{label_prefix}' no encontrado")
+
+    def login(self):
+        self.app = AppTest.from_file(APP_FILE, default_timeout=RUN_TIMEOUT)
+        self._rerun("abrir", lambda: self.app)
+        self.app.text_input(key="login_email").input(self.email)
+        self.app.text_input(key="login_password").input(FAKE_BACKEND_CONFIG["password"] or "loadtest")
+        self._rerun("login", lambda: self._button("Iniciar Sesión").click())
+        if not self.app.session_state["logged_in"]:
+            raise FlowError("login: la sesión no se inició")
+
+    def upload_and_save(self, course):
+        self._rerun("abrir asistencia", lambda: self.app.switch_page("pages/2_Asistencia_admin.py"))
+        self._rerun("curso (asistencia)", lambda: self.app.selectbox(key="course_selector").set_value(course))
+
+        names = self.courses[course]
+        uploader = self.app.file_uploader[0]
+        for _ in range(self.reports_per_flow):
+            meeting_date = datetime.date.today() - datetime.timedelta(days=self.rng.randrange(1, 60))
+            present = [name for name in names if self.rng.random() < PRESENT_RATIO]
+            content = teams_report(present, meeting_date).encode('utf-16')
+            uploader.upload(teams_report_filename(meeting_date), content, "text/csv")
+        self._rerun("subir reportes", lambda: uploader)
+
+        self._rerun("preparar tablas", lambda: self._button("Preparar Tablas").click())
+        self._rerun("guardar", lambda: self.app.button(key="save_all_reports").click())
+        if self.app.session_state["prepared_attendance_dfs"]:
+            errors = "; ".join(error.value for error in self.app.error)
+            raise FlowError(f"guardar: {errors or 'los reportes no se guardaron'}")
+        self._wait_for_saves("guardar")
+
+    def _wait_for_saves(self, step):
+        """
+        Wait for the session's background writes and fail on any that did not
+        land. The wait is added to the step's last rerun: the user's save is
+        only done when the write is.
+        """
+        queue = self.app.session_state[SAVE_QUEUE_KEY]
+        started = time.perf_counter()
+        while queue.busy and time.perf_counter() - started < RUN_TIMEOUT:
+            time.sleep(SAVE_POLL_SECONDS)
+        self.reruns[-1]['seconds'] += time.perf_counter() - started
+        if queue.busy:
+            error = f"las escrituras siguen pendientes tras {RUN_TIMEOUT} s"
+        else:
+            _, outcomes = queue.drain()
+            error = "; ".join(f"{outcome['label']}: {outcome['error']}" for outcome in outcomes if not outcome['ok'])
+        if error:
+            self.reruns[-1]['error'] = error
+            raise FlowError(f"{step}: {error}")
+
+    def report(self, course):
+        self._rerun("abrir reportes", lambda: self.app.switch_page("pages/3_Reportes_admin.py"))
+        self._rerun("curso (reportes)", lambda: self.app.selectbox(key="course_selector").set_value(course))
+        self._rerun("generar reporte", lambda: self.app.button(key="generate_report_btn").click())
+
+    def run_flow(self):
+        """Run one full flow. Returns None on success or the error message."""
+        course = self.rng.choice(list(self.courses))
+        try:
+            if self.app is None:
+                self.login()
+            self.upload_and_save(course)
+            self.report(course)
+            return None
+        except FlowError as e:
+            # Start the next flow from a fresh session
+            self.app = None
+            return str(e)
+
+
+class RssSampler(threading.Thread):
+    """Samples the process RSS until stopped (ru_maxrss alone also counts the startup)."""
+
+    def __init__(self):
+        super().__init__(daemon=True)
+        self.samples = []
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            rss = process_memory()['rss_bytes']
+            if rss is not None:
+                self.samples.append(rss)
+            self._stop_event.wait(RSS_SAMPLE_SECONDS)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    index = min(len(ordered) - 1, max(0, int(round(fraction * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def course_rosters():
+    """{course key: [student names]} from the fake database (keys as the course selectors list them)."""
+    students = firebase.database().child("students").get().val() or {}
+    return {
+        course_key: [record['nombre'] for record in (course.get('data') or {}).values()]
+        for course_key, course in students.items()
+    }
+
+
+def run_load(users, iterations, reports_per_flow, seed=0):
+    """
+    Run `users` concurrent sessions, each doing `iterations` flows.
+
+    Returns:
+        dict: Summary with throughput, per-step rerun latency percentiles, errors and memory.
+    """
+    share_runtime_between_sessions()
+    courses = course_rosters()
+    virtual_users = [VirtualUser(n, courses, random.Random(seed + n), reports_per_flow) for n in range(users)]
+    flow_errors = []
+    errors_lock = threading.Lock()
+
+    def drive(user):
+        for _ in range(iterations):
+            error = user.run_flow()
+            if error:
+                with errors_lock:
+                    flow_errors.append(error)
+
+    rss_before = process_memory()['rss_bytes']
+    sampler = RssSampler()
+    sampler.start()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=users) as pool:
+        list(pool.map(drive, virtual_users))
+    elapsed = time.perf_counter() - started
+    sampler.stop()
+    memory = process_memory()
+
+    reruns = [rerun for user in virtual_users for rerun in user.reruns]
+    steps = {}
+    for rerun in reruns:
+        steps.setdefault(rerun['step'], []).append(rerun['seconds'])
+
+    def latency_summary(values):
+        return {
+            'count': len(values),
+            'p50_ms': percentile(values, 0.50) * 1000,
+            'p95_ms': percentile(values, 0.95) * 1000,
+            'p99_ms': percentile(values, 0.99) * 1000,
+            'max_ms': max(values) * 1000,
+            'mean_ms': statistics.fmean(values) * 1000
+        }
+
+    flows = users * iterations
+    return {
+        'created_at': datetime.datetime.now().isoformat(timespec='seconds'),
+        'users': users,
+        'iterations': iterations,
+        'reports_per_flow': reports_per_flow,
+        'backend': {key: FAKE_BACKEND_CONFIG[key] for key in ('courses', 'students_per_course', 'days', 'latency_ms', 'jitter_ms')},
+        'elapsed_seconds': elapsed,
+        'flows': flows,
+        'failed_flows': len(flow_errors),
+        'errors': sorted(set(flow_errors))[:20],
+        'flows_per_minute': (flows - len(flow_errors)) / elapsed * 60,
+        'reruns_per_second': len(reruns) / elapsed,
+        'reruns': latency_summary([rerun['seconds'] for rerun in reruns]),
+        'steps': {step: latency_summary(values) for step, values in steps.items()},
+        'rss_before_bytes': rss_before,
+        'peak_rss_bytes': max(sampler.samples, default=memory['rss_bytes']),
+        'peak_rss_process_bytes': memory['peak_rss_bytes']
+    }
+
+
+def print_summary(summary):
+    mb = 1024 * 1024
+    print(f"\n{summary['users']} usuarios x {summary['iterations']} flujos en {summary['elapsed_seconds']:.1f} s "
+          f"({summary['failed_flows']} fallidos)")
+    print(f"Rendimiento: {summary['flows_per_minute']:.1f} flujos/min, {summary['reruns_per_second']:.1f} ejecuciones/s")
+    print(f"{'Paso':<22}{'n':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'máx ms':>10}")
+    for step, values in [*summary['steps'].items(), ('TOTAL', summary['reruns'])]:
+        print(f"{step:<22}{values['count']:>6}{values['p50_ms']:>10.0f}{values['p95_ms']:>10.0f}"
+              f"{values['p99_ms']:>10.0f}{values['max_ms']:>10.0f}")
+    if summary['peak_rss_bytes'] is not None:
+        print(f"Memoria: {summary['rss_before_bytes'] / mb:.0f} MB al inicio, pico {summary['peak_rss_bytes'] / mb:.0f} MB")
+    for error in summary['errors']:
+        print(f"  error: {error}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prueba de carga con sesiones concurrentes de AppTest.")
+    parser.add_argument("--users", type=int, default=10, help="Sesiones concurrentes")
+    parser.add_argument("--iterations", type=int, default=2, help="Flujos por sesión")
+    parser.add_argument("--reports", type=int, default=2, help="Reportes subidos por flujo")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="Archivo JSON con el resumen")
+    args = parser.parse_args()
+
+    summary = run_load(args.users, args.iterations, args.reports, args.seed)
+    print_summary(summary)
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as out:
+            json.dump(summary, out, ensure_ascii=False, indent=2)
+        print(f"\nResumen guardado en {args.out}")
+    # Failed flows fail the run, so CI (or a bisect) notices a regression
+    sys.exit(1 if summary['errors'] else 0)
@@ -0,0 +1,116 @@
+# log_utils.py
+
+import itertools
+import logging
+import random
+import reprlib
+import sys
+import pandas as pd
+from config import LOG_CONFIG
+
+_LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+
+class _SampleRepr(reprlib.Repr):
+    """reprlib.Repr that keeps insertion order (no sorting of big dicts) and samples DataFrames."""
+
+    def repr_dict(self, x, level):
+        if not x:
+            return '{}'
+        if level <= 0:
+            return '{...}'
+        items = [
+            f"{self.repr1(key, level - 1)}: {self.repr1(value, level - 1)}"
+            for key, value in itertools.islice(x.items(), self.maxdict)
+        ]
+        if len(x) > self.maxdict:
+            items.append('...')
+        return '{' + ', '.join(items) + '}'
+
+    def repr_OrderedDict(self, x, level):
+        return self.repr_dict(x, level)
+
+    def repr_DataFrame(self, x, level):
+        return x.head(self.maxlist).to_string()
+
+
+# Bounded repr used for payload samples: never walks the whole payload
+_sample_repr = _SampleRepr()
+_sample_repr.maxlevel = 3
+_sample_repr.maxdict = 5
+_sample_repr.maxlist = 5
+_sample_repr.maxstring = 60
+_sample_repr.maxother = 60
+
+
+def get_logger(name: str) -> logging.Logger:
+    """
+    Get a logger configured from LOG_CONFIG in config.py.
+
+    Args:
+        name (str): Logger name, usually the module name.
+
+    Returns:
+        logging.Logger: The logger (handlers are attached only once).
+    """
+    root = logging.getLogger("app")
+    if not root.handlers:
+        handler = logging.StreamHandler(sys.stderr)
+        handler.setFormatter(logging.Formatter(_LOG_FORMAT))
+        root.addHandler(handler)
+        root.setLevel(LOG_CONFIG["level"])
+        root.propagate = False
+    return root.getChild(name)
+
+
+class PayloadSummary:
+    """Lazily describes a payload's shape and size; computed only if the record is emitted."""
+
+    def __init__(self, payload):
+        self.payload = payload
+
+    def __str__(self):
+        payload = self.payload
+        if payload is None:
+            return "empty"
+        if isinstance(payload, pd.DataFrame):
+            return f"DataFrame({len(payload)} rows x {len(payload.columns)} cols)"
+        if isinstance(payload, dict):
+            children = sum(len(value) for value in payload.values() if isinstance(value, (dict, list)))
+            return f"dict({len(payload)} keys, {children} child entries)"
+        if isinstance(payload, (list, tuple, set)) or hasattr(payload, "__len__"):
+            return f"{type(payload).__name__}({len(payload)} items)"
+        return type(payload).__name__
+
+
+class PayloadSample:
+    """Lazily renders a truncated repr of a payload."""
+
+    def __init__(self, payload):
+        self.payload = payload
+
+    def __str__(self):
+        return _sample_repr.repr(self.payload)
+
+
+def log_payload(logger: logging.Logger, label: str, payload, level=logging.INFO):
+    """
+    Log a Firebase payload without stringifying it.
+
+    Always logs a size summary. When LOG_CONFIG["payloads"] is "sample", a
+    truncated sample is also logged at DEBUG for a random fraction
+    (LOG_CONFIG["sample_rate"]) of calls.
+
+    Args:
+        logger (logging.Logger): Logger from get_logger.
+        label (str): What was read, e.g. "students/<course>".
+        payload: The value returned by Firebase (dict, list, DataFrame...).
+        level (int): Level for the summary line.
+    """
+    if logger.isEnabledFor(level):
+        logger.log(level, "%s: %s", label, PayloadSummary(payload))
+
+    if (LOG_CONFIG["payloads"] == "sample"
+            and logger.isEnabledFor(logging.DEBUG)
+            and random.random() < LOG_CONFIG["sample_rate"]):
+        logger.debug("%s sample: %s", label, PayloadSample(payload))
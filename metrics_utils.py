@@ -0,0 +1,539 @@
+# metrics_utils.py
+
+import bisect
+import collections
+import datetime
+import functools
+import re
+import threading
+import time
+import pandas as pd
+import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+try:
+    import resource # Unix only
+except ImportError:
+    resource = None
+
+# Latency buckets in seconds (Prometheus-style upper bounds, +Inf is implicit)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+PAGE_STATE_KEY = "_metrics_page"
+
+# How many page reruns are kept for the "slowest recent reruns" table
+RERUN_HISTORY_SIZE = 500
+
+
+class _Histogram:
+    """Cumulative-bucket histogram with count and sum."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.total += value
+
+    def quantile(self, q):
+        """Estimate a quantile by linear interpolation inside the bucket that contains it."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, bucket_count in enumerate(self.counts):
+            if seen + bucket_count >= rank and bucket_count:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+                return lower + (upper - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return self.buckets[-1]
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'sum': self.total,
+            'p50': self.quantile(0.50),
+            'p95': self.quantile(0.95),
+            'p99': self.quantile(0.99),
+            'buckets': dict(zip([*map(str, self.buckets), '+Inf'], self.counts))
+        }
+
+
+class MetricsRegistry:
+    """
+    Process-wide store of counters and histograms, keyed by metric name and labels.
+
+    Shared by every session of the Streamlit server; all access goes through a lock.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+        self._help = {}
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def describe(self, name, help_text):
+        self._help[name] = help_text
+
+    def inc(self, name, amount=1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name, value, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _Histogram()
+            histogram.observe(value)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def snapshot(self) -> dict:
+        """
+        Copy of every metric.
+
+        Returns:
+            dict: {'counters': [{'name', 'labels', 'value'}, ...],
+                   'histograms': [{'name', 'labels', 'count', 'sum', 'p50', 'p95', 'p99', 'buckets'}, ...]}
+        """
+        with self._lock:
+            counters = [
+                {'name': name, 'labels': dict(labels), 'value': value}
+                for (name, labels), value in self._counters.items()
+            ]
+            histograms = [
+                {'name': name, 'labels': dict(labels), **histogram.to_dict()}
+                for (name, labels), histogram in self._histograms.items()
+            ]
+        return {'counters': counters, 'histograms': histograms}
+
+    def prometheus_text(self) -> str:
+        """
+        Render every metric in the Prometheus text exposition format.
+
+        Returns:
+            str: The exposition text.
+        """
+        def fmt_labels(labels, extra=None):
+            items = list(labels) + (extra or [])
+            if not items:
+                return ''
+            escaped = [(k, str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')) for k, v in items]
+            return '{' + ','.join(f'{k}="{v}"' for k, v in escaped) + '}'
+
+        lines = []
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(self._histograms.items(), key=lambda item: item[0])
+
+        seen = set()
+        for (name, labels), value in counters:
+            if name not in seen:
+                seen.add(name)
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} counter")
+            lines.append(f"{name}{fmt_labels(labels)} {value}")
+
+        for (name, labels), histogram in histograms:
+            if name not in seen:
+                seen.add(name)
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} histogram")
+            cumulative = 0
+            for bound, bucket_count in zip([*map(str, histogram.buckets), '+Inf'], histogram.counts):
+                cumulative += bucket_count
+                lines.append(f"{name}_bucket{fmt_labels(labels, [('le', bound)])} {cumulative}")
+            lines.append(f"{name}_sum{fmt_labels(labels)} {histogram.total}")
+            lines.append(f"{name}_count{fmt_labels(labels)} {histogram.count}")
+
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+REGISTRY.describe('firebase_requests_total', 'Firebase Realtime Database operations.')
+REGISTRY.describe('firebase_errors_total', 'Firebase operations that raised an error.')
+REGISTRY.describe('firebase_response_bytes_total', 'Bytes received from Firebase.')
+REGISTRY.describe('firebase_request_bytes_total', 'Bytes sent to Firebase.')
+REGISTRY.describe('firebase_latency_seconds', 'Firebase operation latency.')
+REGISTRY.describe('cache_requests_total', 'Calls to cached data loaders, by result (hit/miss).')
+REGISTRY.describe('page_render_seconds', 'Time spent running a page script, per rerun.')
+
+
+def snapshot() -> dict:
+    """Snapshot of the process-wide registry (see MetricsRegistry.snapshot)."""
+    return REGISTRY.snapshot()
+
+
+def prometheus_text() -> str:
+    """Prometheus text export of the process-wide registry."""
+    return REGISTRY.prometheus_text()
+
+
+def aggregate_histograms(name: str, by: tuple) -> list:
+    """
+    Merge the histograms of one metric over every label not in `by`.
+
+    Bucket counts are summed before estimating percentiles, so the result is
+    exact per bucket (averaging per-label percentiles would not be).
+
+    Args:
+        name (str): Metric name, e.g. 'firebase_latency_seconds'.
+        by (tuple): Labels to keep, e.g. ('op', 'path').
+
+    Returns:
+        list: [{<label>: value, ..., 'count', 'sum', 'p50', 'p95', 'p99'}, ...]
+    """
+    merged = {}
+    for entry in snapshot()['histograms']:
+        if entry['name'] != name:
+            continue
+        group = tuple(entry['labels'].get(label, '') for label in by)
+        histogram = merged.get(group)
+        if histogram is None:
+            histogram = merged[group] = _Histogram()
+        histogram.counts = [a + b for a, b in zip(histogram.counts, entry['buckets'].values())]
+        histogram.count += entry['count']
+        histogram.total += entry['sum']
+
+    rows = []
+    for group, histogram in merged.items():
+        summary = histogram.to_dict()
+        del summary['buckets']
+        rows.append({**dict(zip(by, group)), **summary})
+    return rows
+
+
+# --- Page of origin ---
+
+def set_current_page(page_name: str):
+    """Record the page the current session is running (called by Home.py before pg.run())."""
+    st.session_state[PAGE_STATE_KEY] = page_name
+
+
+def current_page() -> str:
+    """Page of the session whose script is running on this thread, or 'background'."""
+    if get_script_run_ctx(suppress_warning=True) is None:
+        return 'background'
+    return st.session_state.get(PAGE_STATE_KEY, 'unknown')
+
+
+# --- Page reruns ---
+
+_reruns_lock = threading.Lock()
+_reruns = collections.deque(maxlen=RERUN_HISTORY_SIZE)
+
+
+def record_rerun(page_name: str, seconds: float):
+    """
+    Record how long one run of a page script took (called by Home.py around pg.run()).
+
+    Args:
+        page_name (str): Page that was run.
+        seconds (float): Wall-clock duration of the run.
+    """
+    REGISTRY.observe('page_render_seconds', seconds, page=page_name)
+    ctx = get_script_run_ctx(suppress_warning=True)
+    entry = {
+        'page': page_name,
+        'seconds': seconds,
+        'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+        'session': ctx.session_id[:8] if ctx is not None else '',
+        'user': st.session_state.get('email') if ctx is not None else None
+    }
+    with _reruns_lock:
+        _reruns.append(entry)
+
+
+def slowest_reruns(limit: int = 20) -> list:
+    """
+    Slowest reruns among the last RERUN_HISTORY_SIZE, slowest first.
+
+    Returns:
+        list: [{'page', 'seconds', 'timestamp', 'session', 'user'}, ...]
+    """
+    with _reruns_lock:
+        reruns = list(_reruns)
+    return sorted(reruns, key=lambda entry: entry['seconds'], reverse=True)[:limit]
+
+
+# --- Sessions and memory ---
+
+def _sizeof(value) -> int:
+    """Approximate memory footprint of a session_state value in bytes."""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    from streamlit.runtime.stats import safe_sizeof
+    return safe_sizeof(value)
+
+
+def session_stats() -> list:
+    """
+    Active sessions of this server with the approximate size of their session_state.
+
+    Reads other sessions' state without locking them, so the numbers are an
+    estimate; sessions whose state changes while being measured are skipped.
+
+    Returns:
+        list: [{'session', 'user', 'page', 'keys', 'bytes'}, ...] largest first,
+              or [] when not running inside a Streamlit server.
+    """
+    from streamlit.runtime import Runtime
+
+    if not Runtime.exists():
+        return []
+    try:
+        # No public API lists sessions; this is what Streamlit's own stats provider uses
+        active_sessions = Runtime.instance()._session_mgr.list_active_sessions()
+    except AttributeError:
+        return []
+
+    stats = []
+    for session_info in active_sessions:
+        try:
+            state = session_info.session.session_state.filtered_state
+            stats.append({
+                'session': session_info.session.id[:8],
+                'user': state.get('email'),
+                'page': state.get(PAGE_STATE_KEY, 'unknown'),
+                'keys': len(state),
+                'bytes': sum(_sizeof(value) for value in state.values())
+            })
+        except (RuntimeError, KeyError):
+            continue
+    return sorted(stats, key=lambda entry: entry['bytes'], reverse=True)
+
+
+def process_memory() -> dict:
+    """
+    Resident memory of the server process.
+
+    Returns:
+        dict: {'rss_bytes': current RSS, 'peak_rss_bytes': peak RSS}, None where unavailable
+    """
+    if resource is None:
+        return {'rss_bytes': None, 'peak_rss_bytes': None}
+    rss = None
+    try:
+        with open('/proc/self/statm') as statm:
+            rss = int(statm.read().split()[1]) * resource.getpagesize()
+    except (OSError, ValueError, IndexError):
+        pass
+    # ru_maxrss is in kilobytes on Linux
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return {'rss_bytes': rss, 'peak_rss_bytes': peak}
+
+
+# --- Firebase instrumentation ---
+
+_DATE_SEGMENT = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+_LITERAL_SEGMENTS = {
+    'students', 'attendance', 'modules', 'breaks', 'metadata', 'data',
+    'last_updated', 'filename', 'timestamp', 'record_count', 'fields'
+}
+
+
+def path_template(path: str) -> str:
+    """
+    Replace the variable parts of a database path with placeholders.
+
+    'attendance/cba2@iti,edu/2025-01-03/-Nabc' -> 'attendance/{course}/{date}/{key}'
+    """
+    if not path:
+        return '/'
+    segments = []
+    for segment in path.strip('/').split('/'):
+        if segment in _LITERAL_SEGMENTS:
+            segments.append(segment)
+        elif '@' in segment:
+            segments.append('{course}')
+        elif _DATE_SEGMENT.match(segment):
+            segments.append('{date}')
+        else:
+            segments.append('{key}')
+    return '/'.join(segments)
+
+
+_transfer = threading.local()
+
+
+def _record_transfer(response, *args, **kwargs):
+    """requests response hook: remember the byte counts of the last request on this thread."""
+    _transfer.response_bytes = len(response.content or b'')
+    body = response.request.body if response.request is not None else None
+    _transfer.request_bytes = len(body) if body else 0
+    return response
+
+
+class InstrumentedDatabase:
+    """
+    Drop-in replacement for a pyrebase Database that records metrics for every operation.
+
+    Unlike pyrebase's Database, references are immutable: `child()` and the
+    query helpers return new references, and each operation runs on a fresh
+    pyrebase Database, so references can be shared between threads.
+    """
+
+    def __init__(self, firebase, path: str = '', query=()):
+        self._firebase = firebase
+        self._path = path
+        self._query = query
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    def _with(self, path=None, query=None):
+        return InstrumentedDatabase(
+            self._firebase,
+            self._path if path is None else path,
+            self._query if query is None else query
+        )
+
+    def child(self, *args):
+        new_path = '/'.join(str(arg) for arg in args)
+        path = f"{self._path}/{new_path}" if self._path else new_path.lstrip('/')
+        return self._with(path=path)
+
+    def _query_step(self, method, *args):
+        return self._with(query=self._query + ((method, args),))
+
+    def order_by_child(self, order):
+        return self._query_step('order_by_child', order)
+
+    def order_by_key(self):
+        return self._query_step('order_by_key')
+
+    def order_by_value(self):
+        return self._query_step('order_by_value')
+
+    def start_at(self, start):
+        return self._query_step('start_at', start)
+
+    def end_at(self, end):
+        return self._query_step('end_at', end)
+
+    def equal_to(self, equal):
+        return self._query_step('equal_to', equal)
+
+    def limit_to_first(self, limit_first):
+        return self._query_step('limit_to_first', limit_first)
+
+    def limit_to_last(self, limit_last):
+        return self._query_step('limit_to_last', limit_last)
+
+    def shallow(self):
+        return self._query_step('shallow')
+
+    def generate_key(self):
+        return self._firebase.database().generate_key()
+
+    def _run(self, operation, *args, **kwargs):
+        database = self._firebase.database()
+        if self._path:
+            database.child(self._path)
+        for method, query_args in self._query:
+            getattr(database, method)(*query_args)
+
+        labels = {
+            'op': operation,
+            'path': path_template(self._path),
+            'page': current_page()
+        }
+        _transfer.response_bytes = 0
+        _transfer.request_bytes = 0
+        start = time.perf_counter()
+        try:
+            return getattr(database, operation)(*args, **kwargs)
+        except Exception:
+            REGISTRY.inc('firebase_errors_total', **labels)
+            raise
+        finally:
+            REGISTRY.observe('firebase_latency_seconds', time.perf_counter() - start, **labels)
+            REGISTRY.inc('firebase_requests_total', **labels)
+            REGISTRY.inc('firebase_response_bytes_total', getattr(_transfer, 'response_bytes', 0), **labels)
+            REGISTRY.inc('firebase_request_bytes_total', getattr(_transfer, 'request_bytes', 0), **labels)
+
+    def get(self, *args, **kwargs):
+        return self._run('get', *args, **kwargs)
+
+    def set(self, *args, **kwargs):
+        return self._run('set', *args, **kwargs)
+
+    def update(self, *args, **kwargs):
+        return self._run('update', *args, **kwargs)
+
+    def push(self, *args, **kwargs):
+        return self._run('push', *args, **kwargs)
+
+    def remove(self, *args, **kwargs):
+        return self._run('remove', *args, **kwargs)
+
+
+def instrument_database(firebase) -> InstrumentedDatabase:
+    """
+    Build the app's `db` for a pyrebase app, hooking byte accounting into its HTTP session.
+
+    Args:
+        firebase: The object returned by pyrebase.initialize_app.
+
+    Returns:
+        InstrumentedDatabase: Root reference of the database.
+    """
+    hooks = firebase.requests.hooks.setdefault('response', [])
+    if _record_transfer not in hooks:
+        hooks.append(_record_transfer)
+    return InstrumentedDatabase(firebase)
+
+
+# --- Cache instrumentation ---
+
+_executions = threading.local()
+
+
+def cached(func=None, **cache_kwargs):
+    """
+    st.cache_data that also counts hits and misses per function.
+
+    Use exactly like st.cache_data (`@cached` or `@cached(ttl=...)`); the
+    returned function keeps `.clear()`.
+    """
+    if func is None:
+        return lambda f: cached(f, **cache_kwargs)
+
+    name = f"{func.__module__}.{func.__qualname__}"
+
+    @functools.wraps(func)
+    def counted(*args, **kwargs):
+        counts = _executions.__dict__.setdefault('counts', {})
+        counts[name] = counts.get(name, 0) + 1
+        return func(*args, **kwargs)
+
+    cached_func = st.cache_data(**cache_kwargs)(counted)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        counts = _executions.__dict__.setdefault('counts', {})
+        before = counts.get(name, 0)
+        result = cached_func(*args, **kwargs)
+        outcome = 'miss' if counts.get(name, 0) > before else 'hit'
+        REGISTRY.inc('cache_requests_total', function=func.__qualname__, result=outcome, page=current_page())
+        return result
+
+    wrapper.clear = cached_func.clear
+    return wrapper
@@ -0,0 +1,200 @@
+# name_matching.py
+#
+# Matching of Teams display names against a course roster. Teams names often
+# differ from the roster in accents, case, missing middle names or word order
+# ("Diaz Flores, Ana" vs "Ana María Díaz Flores"), so names are compared as sets
+# of accent-folded tokens. A token index limits each lookup to the students
+# that share at least one token (or token prefix) with the participant, so a
+# lookup costs about the same whether the roster has 30 or 3000 students.
+
+import collections
+import difflib
+import re
+import unicodedata
+import pandas as pd
+
+# Minimum score to mark a student present
+MATCH_THRESHOLD = 0.85
+# Candidates scoring within this margin of the best one make the match ambiguous
+AMBIGUITY_MARGIN = 0.05
+# Tokens that carry no identity ("María de la Cruz")
+STOP_TOKENS = {'de', 'del', 'la', 'las', 'los', 'y', 'e', 'da', 'do', 'dos', 'van', 'von'}
+# Tokens longer than this are also indexed by their prefix, so small typos
+# at the end of a name ("Gonzales" / "González") still reach the candidate
+PREFIX_LENGTH = 4
+# Keys shared by more students than this (common first names) are too broad
+# to select candidates on their own; rarer keys of the same name are used instead
+BLOCK_LIMIT = 50
+_NON_ALNUM = re.compile(r'[^0-9a-z]+')
+
+
+def fold(name: str) -> str:
+    """Lowercase, accent-free, punctuation-free form of a name ('Díaz-Flores, Ana' -> 'diaz flores ana')."""
+    decomposed = unicodedata.normalize('NFKD', str(name))
+    without_marks = ''.join(char for char in decomposed if not unicodedata.combining(char))
+    return _NON_ALNUM.sub(' ', without_marks.lower()).strip()
+
+
+def name_tokens(name: str) -> tuple:
+    """Sorted identity tokens of a name (folded, without stop words)."""
+    return tuple(sorted(token for token in fold(name).split() if token not in STOP_TOKENS))
+
+
+def _index_keys(tokens) -> set:
+    keys = set(tokens)
+    keys.update(token[:PREFIX_LENGTH] + '*' for token in tokens if len(token) > PREFIX_LENGTH)
+    return keys
+
+
+def _score(tokens_a: tuple, tokens_b: tuple) -> float:
+    """
+    Similarity of two token sets in [0, 1]: the better of the character ratio
+    of the sorted tokens (typos, word order) and the share of the shorter name
+    found in the longer one (missing middle or second last names). Containment
+    needs two shared tokens to count fully; one shared first name is weak evidence.
+    """
+    if not tokens_a or not tokens_b:
+        return 0.0
+    if tokens_a == tokens_b:
+        return 1.0
+    ratio = difflib.SequenceMatcher(None, ' '.join(tokens_a), ' '.join(tokens_b)).ratio()
+    shared = len(set(tokens_a) & set(tokens_b))
+    containment = shared / min(len(tokens_a), len(tokens_b))
+    return max(ratio, containment * (0.95 if shared >= 2 else 0.6))
+
+
+class NameIndex:
+    """
+    Precomputed token keys of a roster, for repeated participant lookups.
+
+    Args:
+        roster_names (list): Student names as stored in the roster.
+    """
+
+    def __init__(self, roster_names: list):
+        self.names = list(roster_names)
+        self._tokens = [name_tokens(name) for name in self.names]
+        self._exact = {}
+        self._index = collections.defaultdict(set)
+        for position, tokens in enumerate(self._tokens):
+            self._exact.setdefault(tokens, []).append(position)
+            for key in _index_keys(tokens):
+                self._index[key].add(position)
+
+    def _candidates(self, tokens: tuple) -> set:
+        """Roster positions sharing a selective key with `tokens`; if every key is common, those sharing all of them."""
+        postings = [self._index[key] for key in _index_keys(tokens) if key in self._index]
+        if not postings:
+            return set()
+        selective = [posting for posting in postings if len(posting) <= BLOCK_LIMIT]
+        if selective:
+            return set().union(*selective)
+        common = set.intersection(*postings)
+        return common or min(postings, key=len)
+
+    def match(self, participant: str) -> dict:
+        """
+        Find the roster student behind a Teams display name.
+
+        >>> NameIndex(["Ana María Díaz Flores", "Ana Díaz"]).match("Diaz Flores, Ana")['match']
+        'Ana María Díaz Flores'
+
+        Returns:
+            dict: {'match': roster name or None,
+                   'confidence': score of the best candidate (0-1),
+                   'ambiguous': roster names that fit about equally well (empty unless
+                                the match is ambiguous, in which case 'match' is None)}.
+        """
+        tokens = name_tokens(participant)
+        exact = self._exact.get(tokens, [])
+        if len(exact) == 1:
+            return {'match': self.names[exact[0]], 'confidence': 1.0, 'ambiguous': []}
+        if len(exact) > 1:
+            return {'match': None, 'confidence': 1.0, 'ambiguous': [self.names[position] for position in exact]}
+
+        scored = sorted(((_score(tokens, self._tokens[position]), position) for position in self._candidates(tokens)), reverse=True)
+        if not scored or scored[0][0] < MATCH_THRESHOLD:
+            return {'match': None, 'confidence': scored[0][0] if scored else 0.0, 'ambiguous': []}
+
+        best_score = scored[0][0]
+        close = [position for score, position in scored if best_score - score <= AMBIGUITY_MARGIN]
+        # Containment scores a short roster name inside a longer participant name as
+        # high as the full name ("Ana Díaz" and "Ana María Díaz Flores" for "Diaz
+        # Flores, Ana"); among close candidates the one sharing more tokens wins
+        shared = {position: len(set(tokens) & set(self._tokens[position])) for position in close}
+        most_shared = max(shared.values())
+        close = [position for position in close if shared[position] == most_shared]
+        if len(close) > 1:
+            return {'match': None, 'confidence': best_score, 'ambiguous': [self.names[position] for position in close]}
+        scores = {position: score for score, position in scored}
+        return {'match': self.names[close[0]], 'confidence': scores[close[0]], 'ambiguous': []}
+
+
+def attendance_matrix(roster_names: pd.Series, participants_by_date: dict, index: NameIndex = None) -> pd.DataFrame:
+    """
+    Attendance of every uploaded day as one students × dates frame.
+
+    Each distinct display name is matched once, however many days it appears
+    on; presence, matched Teams names and confidences for all days then come
+    from one pivot of the (day, participant) pairs instead of a loop over
+    days × students.
+
+    Args:
+        roster_names (pd.Series): Student names of the course indexed by student id (one row each, in this order).
+        participants_by_date (dict): {datetime.date: display names found in that day's reports}.
+        index (NameIndex, optional): Prebuilt index of `roster_names`.
+
+    Returns:
+        pd.DataFrame: Indexed by ('id', 'Nombre'), with (campo, fecha) columns. campo is 'Presente',
+                      'Nombre en Teams' (the participant matched to the student, or '¿name?' on
+                      every candidate of an ambiguous participant) or 'Confianza' (0-1, NaN if unmatched).
+    """
+    index = index or NameIndex(roster_names.tolist())
+    dates = list(participants_by_date)
+    roster = pd.Index(roster_names, name='Nombre')
+    rows = pd.MultiIndex.from_arrays([roster_names.index.astype(str), roster], names=['id', 'Nombre'])
+    matches = {participant: index.match(participant) for participant in set().union(*participants_by_date.values())}
+
+    pairs = pd.DataFrame(
+        [(date, participant) for date, participants in participants_by_date.items() for participant in participants],
+        columns=['fecha', 'participante']
+    )
+    pairs['Nombre'] = pairs['participante'].map({participant: result['match'] for participant, result in matches.items()})
+    pairs['Confianza'] = pairs['participante'].map({participant: result['confidence'] for participant, result in matches.items()})
+
+    # Keep the best participant per student and day (people rejoin under other names)
+    matched = (pairs.dropna(subset=['Nombre'])
+               .sort_values('Confianza', ascending=False)
+               .drop_duplicates(['fecha', 'Nombre']))
+    confidence = matched.pivot(index='Nombre', columns='fecha', values='Confianza').reindex(index=roster, columns=dates)
+    teams_name = matched.pivot(index='Nombre', columns='fecha', values='participante').reindex(index=roster, columns=dates)
+
+    pairs['Nombre'] = pairs['participante'].map({participant: result['ambiguous'] for participant, result in matches.items()})
+    ambiguous = pairs.explode('Nombre').dropna(subset=['Nombre']).drop_duplicates(['fecha', 'Nombre'])
+    ambiguous = ambiguous.assign(participante='¿' + ambiguous['participante'] + '?')
+    teams_name = teams_name.combine_first(
+        ambiguous.pivot(index='Nombre', columns='fecha', values='participante').reindex(index=roster, columns=dates)
+    )
+
+    return pd.concat(
+        {'Presente': confidence.notna(), 'Nombre en Teams': teams_name.fillna(''), 'Confianza': confidence},
+        axis=1, names=['campo', 'fecha']
+    ).set_axis(rows, axis=0)
+
+
+def attendance_tables(matrix: pd.DataFrame) -> dict:
+    """
+    Split an attendance_matrix into the per-day tables the data editor shows.
+
+    The tables are slices of the matrix (copy-on-write), so nothing is copied
+    until a day is edited. They keep the student ids as index (hidden in the
+    editor), which is what the saved days are keyed by.
+
+    Returns:
+        dict: {datetime.date: DataFrame indexed by student id, with 'Nombre', 'Presente',
+               'Nombre en Teams' and 'Confianza'}.
+    """
+    return {
+        date: matrix.xs(date, axis=1, level='fecha').rename_axis(columns=None).reset_index('Nombre')
+        for date in matrix.columns.unique(level='fecha')
+    }
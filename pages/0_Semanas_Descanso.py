@@ -3,8 +3,10 @@ import pandas as pd
 import datetime
 # Assuming 'config' module has 'setup_page' and 'db' (Firebase instance)
 from config import setup_page, db 
+from auth_utils import current_token
 from utils import date_format
-from utils_admin import load_breaks
+from utils_admin import load_breaks, admin_set_last_updated
+from diff_utils import build_patch
 
 # --- Page Setup and Login Check ---
 setup_page("Semanas de Descanso")
@@ -25,7 +27,8 @@ def save_break(break_id, break_data):
     try:
         # Create a fresh reference to the specific break using its ID
         break_ref = db.child("breaks").child(break_id)
-        break_ref.set(break_data, token=st.session_state.user_token) # Set (create or overwrite) the data
+        break_ref.set(break_data, token=current_token()) # Set (create or overwrite) the data
+        admin_set_last_updated('breaks', None)
         return True
     except Exception as e:
         st.error(f"Error al guardar la semana de descanso: {e}")
@@ -118,13 +121,14 @@ def display_breaks_table(breaks_data):
         
         if st.button("⚠️ Confirmar eliminación"):
             success_count = 0
-            for _, row in breaks_to_delete.iterrows():
-                try:
-                    # Create a fresh reference for each deletion to avoid path issues
-                    db.child("breaks").child(row['ID']).remove(token=st.session_state.user_token)
-                    success_count += 1
-                except Exception as e:
-                    st.error(f"Error al eliminar la semana de descanso '{row['Nombre']}': {str(e)}")
+            # Remove all selected breaks with a single multi-path update
+            patch = build_patch({'changed': {}, 'added': {}, 'deleted': breaks_to_delete['ID'].tolist()})
+            try:
+                db.child("breaks").update(patch, token=current_token())
+                admin_set_last_updated('breaks', None)
+                success_count = len(patch)
+            except Exception as e:
+                st.error(f"Error al eliminar las semanas de descanso: {str(e)}")
             
             if success_count > 0:
                 st.success(f"Se eliminaron {success_count} semana(s) de descanso correctamente.")
@@ -250,7 +254,8 @@ def main():
         
         # Save the new break to Firebase
         try:
-            db.child("breaks").child(break_id).set(break_data, token=st.session_state.user_token)
+            db.child("breaks").child(break_id).set(break_data, token=current_token())
+            admin_set_last_updated('breaks', None)
             st.success("¡Semana de descanso agregada exitosamente!")
             st.rerun()
         except Exception as e:
@@ -4,7 +4,7 @@ import datetime
 # Assuming 'config' module has 'setup_page' and 'db' (Firebase instance)
 from config import setup_page, db 
 from utils import date_format
-from utils_admin import load_breaks
+from utils_admin import load_breaks_version, admin_get_last_updated
 
 # --- Page Setup and Login Check ---
 setup_page("Semanas de Descanso")
@@ -18,12 +18,12 @@ if not st.session_state.get('logged_in', False):
 def load_breaks():
     """Load breaks from Firebase and return as a list of dictionaries with calculated end date."""
     try:
-        breaks_ref = db.child("breaks").get(token=st.session_state.user_token)
-        if not breaks_ref.val():
+        breaks_data_all = load_breaks_version(admin_get_last_updated('breaks', None))
+        if not breaks_data_all:
             return []
         
         breaks_list = []
-        for break_id, break_data in breaks_ref.val().items():
+        for break_id, break_data in breaks_data_all.items():
             if break_data and isinstance(break_data, dict):
                 start_date_str = break_data.get('start_date', '')
                 duration_weeks = int(break_data.get('duration_weeks', 1))
@@ -3,7 +3,8 @@ import pandas as pd
 import datetime
 import urllib.parse
 from config import setup_page
-from utils import save_students, load_students, get_available_modules, get_last_updated, set_last_updated, get_module_name_by_id
+from roster_utils import assign_student_ids, normalize_roster
+from utils import save_students, patch_students, load_students, get_available_modules, get_last_updated, set_last_updated, get_module_name_by_id
 
 # --- Session Check ---
 # This block now checks for both login status AND a valid session structure
@@ -278,10 +279,10 @@ if 'text_area_input' in st.session_state and st.session_state.text_area_input an
                 if skipped_names:
                     st.caption(f"Nombres omitidos (ya existen o duplicados): {', '.join(skipped_names)}")
             else:
-                new_students_df = pd.DataFrame(students_to_add_list)
-                updated_students_df = pd.concat([current_students_df, new_students_df], ignore_index=True)
+                new_students_df = assign_student_ids(pd.DataFrame(students_to_add_list))
+                updated_students_df = normalize_roster(pd.concat([current_students_df, new_students_df])) # Keep the student ids
                 
-                if save_students(updated_students_df):
+                if patch_students(current_students_df, updated_students_df):
                     set_last_updated('students')
                     st.success(f"¡{added_count} estudiante(s) agregado(s) exitosamente!")
                     if skipped_names:
@@ -311,13 +312,11 @@ if df_loaded is not None and not df_loaded.empty:
             if col not in df_display.columns:
                 df_display[col] = ''
         
-        # Update module names using modulo_id
-        for idx, row in df_display.iterrows():
-            if pd.notna(row.get('modulo_id')) and row['modulo_id']:
-                module_name = get_module_name_by_id(user_email, str(row['modulo_id']))
-                print("\n module name returned", module_name)
-                if module_name:
-                    df_display.at[idx, 'modulo'] = module_name
+        # Update module names using modulo_id (one lookup per distinct module)
+        module_ids = df_display['modulo_id'].fillna('').astype(str)
+        module_names = {module_id: get_module_name_by_id(user_email, module_id) for module_id in module_ids[module_ids != ''].unique()}
+        resolved_names = module_ids.map(module_names)
+        df_display['modulo'] = resolved_names.where(resolved_names.notna() & resolved_names.ne(''), df_display['modulo'].astype(object))
         
         if 'Eliminar' not in df_display.columns:
             df_display.insert(0, 'Eliminar', False)
@@ -431,12 +430,11 @@ if df_loaded is not None and not df_loaded.empty:
                 name_changes = edited_df[edited_df['nombre'] != editable_df['nombre']]
                 
                 # Apply changes to the original dataframe
-                for idx, row in name_changes.iterrows():
-                    original_idx = df_loaded.index[idx]
-                    updated_df.at[original_idx, 'nombre'] = row['nombre']
+                for student_id, row in name_changes.iterrows():
+                    updated_df.at[student_id, 'nombre'] = row['nombre']
                 
                 # Save the updated dataframe
-                if save_students(updated_df):
+                if patch_students(df_loaded, updated_df):
                     set_last_updated('students')
                     st.success("¡Cambios guardados exitosamente!")
                     # Add a button to refresh the page to see changes
@@ -463,7 +461,7 @@ if df_loaded is not None and not df_loaded.empty:
                         ~current_students_df_from_db['nombre'].astype(str).str.lower().str.strip().isin(normalized_names_to_delete)
                     ]
                     
-                    if save_students(students_to_keep_df):
+                    if patch_students(df_loaded, students_to_keep_df):
                         set_last_updated('students')
                         st.success(f"¡{len(names_to_delete)} estudiante(s) eliminado(s) exitosamente!")
                         st.rerun()
@@ -1,11 +1,12 @@
 import streamlit as st
 import pandas as pd
 import datetime
-import time
 import urllib.parse
 from config import setup_page
 from utils import get_available_modules, get_last_updated, set_last_updated, get_module_name_by_id
-from utils_admin import admin_get_students_by_email, admin_get_student_group_emails, admin_load_students, admin_save_students, load_breaks, parse_breaks, calculate_end_date, load_breaks_from_db
+from roster_utils import assign_student_ids, normalize_roster
+from prefetch_utils import prefetch
+from utils_admin import admin_get_students_by_email, admin_get_student_group_emails, admin_load_students, admin_queue_students_patch, load_breaks, parse_breaks, calculate_end_date, load_breaks_from_db
 
 def create_whatsapp_link(phone: str) -> str:
     if pd.isna(phone) or not str(phone).strip():
@@ -118,13 +119,28 @@ def get_current_students_data(course_email, students_last_updated):
     # st.success("Estudiantes cargados exitosamente." if df is not None else "Error al cargar estudiantes.")
     return df, timestamp
 
+def forget_course_roster(course_email):
+    """Returns a callback that drops the session copy of a roster whose background save failed, so it is reloaded from Firebase."""
+    def forget():
+        st.session_state.students_df_by_course.pop(course_email, None)
+        get_current_students_data.clear()
+        st.session_state.editor_key += 1
+    return forget
+
 # --- Load current students based on selected_course ---
 # This block uses the cached function and stores the result in session state.
 # This ensures the database is read only once per course per session.
 if selected_course:
+    # The module list and (unless this session already has it) the roster are independent loads
+    loaders = {'modules': lambda: get_available_modules(selected_course, get_last_updated('modules', selected_course))}
+    if selected_course not in st.session_state.students_df_by_course:
+        loaders['students'] = lambda: get_current_students_data(selected_course, get_last_updated('students', selected_course))
+    prefetched, prefetch_errors = prefetch(loaders)
+
     if selected_course not in st.session_state.students_df_by_course:
-        students_last_updated = get_last_updated('students', selected_course)
-        df_loaded, _ = get_current_students_data(selected_course, students_last_updated) # Use the cached function
+        if 'students' in prefetch_errors:
+            raise prefetch_errors['students']
+        df_loaded, _ = prefetched['students'] # From the cached function
         if df_loaded is not None:
             st.session_state.students_df_by_course[selected_course] = df_loaded
         else:
@@ -146,9 +162,9 @@ if selected_course: # Only show module selection if a course is selected
     st.subheader("2. Seleccionar Módulo")
 
     try:
-        modules_last_updated = get_last_updated('modules', selected_course)
-        # st.info(f"Módulos actualizados el: {modules_last_updated}")
-        module_options = get_available_modules(selected_course, modules_last_updated)
+        if 'modules' in prefetch_errors:
+            raise prefetch_errors['modules']
+        module_options = prefetched['modules']
         st.session_state.module_data = module_options
         # print("\n\nmodule_data", st.session_state.module_data)
         # print("\n\nmodule_options", module_options)
@@ -357,15 +373,14 @@ if 'text_area_input' in st.session_state and st.session_state.text_area_input an
                     student_data.pop('whatsapp', None)
                     student_data.pop('teams', None)
 
-                new_students_df = pd.DataFrame(students_to_add_list_copy)
-                updated_students_df = pd.concat([current_students_df, new_students_df], ignore_index=True)
+                new_students_df = assign_student_ids(pd.DataFrame(students_to_add_list_copy))
+                updated_students_df = normalize_roster(pd.concat([current_students_df, new_students_df])) # Keep the student ids
 
                 print("\n\nupdated_students_df", updated_students_df)
 
                 # print("\n\nupdated_students_df", updated_students_df)
-                if admin_save_students(selected_course, updated_students_df): # Pass selected_course
-                    st.toast(f"¡{added_count} estudiante(s) agregado(s) exitosamente!", icon="✅")
-                    time.sleep(1)
+                if admin_queue_students_patch(selected_course, st.session_state.students_df_by_course[selected_course], updated_students_df,
+                                              f"{added_count} estudiante(s) agregado(s)", on_failure=forget_course_roster(selected_course)): # Only the appended rows are written
                     if skipped_names:
                         st.caption(f"Nombres omitidos (ya existen o duplicados en la entrada): {', '.join(skipped_names)}")
                     st.session_state.students_df_by_course[selected_course] = updated_students_df.copy() # Update session state copy
@@ -402,13 +417,11 @@ if df_loaded is not None and not df_loaded.empty:
         if 'Eliminar' not in df_display.columns:
             df_display.insert(0, 'Eliminar', False)
 
-        # Update module names using modulo_id
-        for idx, row in df_display.iterrows():
-            if pd.notna(row.get('modulo_id')) and row['modulo_id']:
-                module_name = get_module_name_by_id(selected_course, str(row['modulo_id']))
-                # print("\n module name returned", module_name) # Diagnostic print, can remove
-                if module_name:
-                    df_display.at[idx, 'modulo'] = module_name
+        # Update module names using modulo_id (one lookup per distinct module)
+        module_ids = df_display['modulo_id'].fillna('').astype(str)
+        module_names = {module_id: get_module_name_by_id(selected_course, module_id) for module_id in module_ids[module_ids != ''].unique()}
+        resolved_names = module_ids.map(module_names)
+        df_display['modulo'] = resolved_names.where(resolved_names.notna() & resolved_names.ne(''), df_display['modulo'].astype(object))
 
         # Generate links (apply to the display DataFrame)
         df_display['whatsapp'] = df_display['telefono'].apply(create_whatsapp_link)
@@ -529,11 +542,10 @@ if df_loaded is not None and not df_loaded.empty:
             user_editable_cols = ['nombre', 'email', 'canvas_id', 'telefono']
 
             changes_detected = False
-            # Iterate through the original DataFrame's indices to match with edited_df
+            # Match rows by student id (the index of both df_loaded and edited_df)
             for i, original_row in df_loaded.iterrows():
-                # Get the corresponding row from edited_df (assuming row order is preserved by data_editor)
-                if i < len(edited_df): # Ensure index exists in edited_df
-                    edited_row = edited_df.loc[i] # Access by label if original index used for editable_df was simple numerical range
+                if i in edited_df.index:
+                    edited_row = edited_df.loc[i]
 
                     for col in user_editable_cols:
                         original_value = str(original_row.get(col, '')).strip()
@@ -544,9 +556,8 @@ if df_loaded is not None and not df_loaded.empty:
                             changes_detected = True
 
             if changes_detected:
-                if admin_save_students(selected_course, df_to_save): # Pass selected_course
-                    st.toast("¡Cambios guardados exitosamente!", icon="✅")
-                    time.sleep(1.5)
+                if admin_queue_students_patch(selected_course, df_loaded, df_to_save, "los cambios de estudiantes",
+                                              on_failure=forget_course_roster(selected_course)): # Only the edited cells are written
                     st.session_state.students_df_by_course[selected_course] = df_to_save.copy() # Update session state copy
                     st.session_state.editor_key += 1 # Increment key to force data_editor refresh
                     get_current_students_data.clear() # Clear the cache for the loading function
@@ -575,9 +586,8 @@ if df_loaded is not None and not df_loaded.empty:
                     ~current_students_df_from_session['nombre'].astype(str).str.lower().str.strip().isin(normalized_names_to_delete)
                 ]
 
-                if admin_save_students(selected_course, students_to_keep_df): # Pass selected_course
-                    st.toast(f"¡{len(names_to_delete)} estudiante(s) eliminado(s) exitosamente!", icon="✅")
-                    time.sleep(1.5)
+                if admin_queue_students_patch(selected_course, current_students_df_from_session, students_to_keep_df,
+                                              f"{len(names_to_delete)} estudiante(s) eliminado(s)", on_failure=forget_course_roster(selected_course)):
                     st.session_state.students_df_by_course[selected_course] = students_to_keep_df.copy() # Update session state copy
                     st.session_state.editor_key += 1 # Increment key to force data_editor refresh
                     get_current_students_data.clear() # Clear the cache for the loading function
@@ -1,11 +1,13 @@
 import streamlit as st
 import pandas as pd
 import datetime
-import re
-import io
-import time
-from utils import save_attendance, load_students, delete_attendance_dates, get_attendance_dates, get_last_updated, set_last_updated
+from utils import save_attendance_changes, load_students, delete_attendance_dates, get_attendance_dates, get_last_updated, set_last_updated
 from config import setup_page, db
+from report_parser import process_reports, expand_archives
+from name_matching import attendance_matrix, attendance_tables
+from auth_utils import current_token
+from roster_utils import attendance_presence, attendance_batch_patch
+from save_queue import enqueue_update
 
 # --- Session Check ---
 # This block now checks for both login status AND a valid session structure
@@ -85,7 +87,7 @@ def update_attendance_session_state():
             not st.session_state.attendance_data['dates']):
         try:
             user_email = st.session_state.email.replace('.', ',')
-            all_dates = db.child("attendance").child(user_email).get(token=st.session_state.user_token).val() or {}
+            all_dates = db.child("attendance").child(user_email).get(token=current_token()).val() or {}
             
             st.session_state.attendance_data = {
                 'last_updated': attendance_last_updated,
@@ -96,77 +98,20 @@ def update_attendance_session_state():
             st.error(f"Error updating attendance data: {str(e)}")
     return st.session_state.attendance_data
 
-def extract_date_from_filename(filename: str) -> datetime.date | None:
-    patterns = [
-        r'(Informe de Asistencia )',
-        r'(Attendance report )'
-    ]
-    for pattern in patterns:
-        match_keyword = re.search(pattern, filename, re.IGNORECASE)
-        if match_keyword:
-            date_str_candidate = filename[match_keyword.end():]
-            match_date = re.match(r'(\d{1,2})-(\d{1,2})-(\d{2})', date_str_candidate)
-            if match_date:
-                month, day, year_short = map(int, match_date.groups())
-                year = 2000 + year_short
-                try:
-                    return datetime.date(year, month, day)
-                except ValueError:
-                    return None
-    return None
-
-def parse_attendance_report(file_content_str: str, filename_for_debug: str) -> list:
-    lines = file_content_str.splitlines()
-    start_marker_found_at = -1
-    end_marker_found_at = -1
-    for i, line in enumerate(lines):
-        line_stripped_lower = line.strip().lower()
-        if line_stripped_lower.startswith("2. participants"):
-            start_marker_found_at = i
-            continue 
-        if start_marker_found_at != -1 and line_stripped_lower.startswith("3. in-meeting activities"):
-            end_marker_found_at = i
-            break 
-    if start_marker_found_at == -1:
-        st.warning(f"No se pudo encontrar el marcador de sección '2. Participants' en '{filename_for_debug}'.")
-        return []
-    actual_data_start_index = start_marker_found_at + 1
-    actual_data_end_index = end_marker_found_at if end_marker_found_at != -1 else len(lines)
-    participant_data_lines = lines[actual_data_start_index : actual_data_end_index]
-    if not participant_data_lines:
-        st.warning(f"No se encontraron líneas de datos entre '2. Participantes' y '3. Actividades en la reunión' (o fin de archivo) en '{filename_for_debug}'.")
-        return []
-    header_row_index_in_block = -1
-    for i, line_in_block in enumerate(participant_data_lines):
-        line_norm = line_in_block.strip().lower()
-        if "name" in line_norm and ("first join" in line_norm or "last leave" in line_norm or "email" in line_norm or "duration" in line_norm):
-            header_row_index_in_block = i
-            break
-    if header_row_index_in_block == -1:
-        st.warning(f"No se pudo encontrar la fila de encabezado en el archivo: {filename_for_debug}")
-        return []
-    csv_like_data_for_pandas = "\n".join(participant_data_lines[header_row_index_in_block:])
-    try:
-        df = pd.read_csv(io.StringIO(csv_like_data_for_pandas), sep='\t')
-        df.columns = [col.strip().lower() for col in df.columns] 
-        if "name" in df.columns:
-            return df["name"].astype(str).str.strip().unique().tolist()
-        else:
-            st.warning(f"Columna 'nombre' no encontrada después del análisis en '{filename_for_debug}'. Columnas encontradas: {df.columns.tolist()}")
-            return []
-    except pd.errors.EmptyDataError:
-        st.warning(f"No se pudieron analizar filas de datos del contenido CSV en '{filename_for_debug}'. El encabezado identificado podría haber sido la última línea o los datos estaban vacíos.")
-        return []
-    except Exception as e:
-        st.error(f"Error analizando datos CSV de la sección 'Participantes' de '{filename_for_debug}': {e}")
-        return []
-
 def reset_dialog_states():
     st.session_state.show_delete_all_dialog = False
     st.session_state.show_delete_selected_dialog = False
     st.session_state.show_edit_dialog = False
 
-# Define the callback function that will be executed ONLY when the button is clicked
+def restore_prepared_attendance(prepared_dfs, batch_data):
+    """Returns a callback that puts prepared tables back for review if their background save fails."""
+    def restore():
+        # Tables prepared since then take precedence
+        st.session_state.prepared_attendance_dfs = {**prepared_dfs, **st.session_state.get('prepared_attendance_dfs', {})}
+        st.session_state.current_batch_data_by_date = {**batch_data, **st.session_state.get('current_batch_data_by_date', {})}
+    return restore
+
+# Called by the 'Editar Seleccionados' button right before the full rerun that opens the dialog
 def prepare_edit_dialog(selected_dates):
     """Sets the one-time flag to show the dialog on the next rerun."""
     if not selected_dates:
@@ -178,7 +123,7 @@ def prepare_edit_dialog(selected_dates):
     st.session_state.show_edit_dialog = True
 
 @st.dialog("Editar Asistencia")
-def edit_selected_dialog():
+def edit_selected_dialog(students_df_master):
     if not st.session_state.get('edit_dates_list'):
         st.warning("No hay fechas seleccionadas para editar.")
         if st.button("Cerrar"):
@@ -198,8 +143,6 @@ def edit_selected_dialog():
         st.stop()
 
     date_key = datetime.datetime.strptime(selected_date_str, '%m/%d/%Y').strftime('%Y-%m-%d')
-    students_last_updated = get_last_updated('students')
-    students_df_master, _ = load_students(students_last_updated)
 
     if students_df_master is None or students_df_master.empty:
         st.error("Lista de estudiantes no encontrada. Por favor, súbala en la página de 'Gestión de Estudiantes'.")
@@ -208,48 +151,17 @@ def edit_selected_dialog():
             st.rerun()
         return
 
-    # 1. Get the raw attendance data for the date, which could be a list or a dict.
-    saved_attendance_raw = st.session_state.attendance_data['records'].get(date_key, {})
-    
-    # 2. Standardize the data into a single dictionary format: {student_id: status}
-    attendance_lookup = {}
-    if isinstance(saved_attendance_raw, list):
-        # This handles the old format from file uploads: a list of {'Nombre': ..., 'Presente': ...}
-        # We need a quick way to look up a student's ID from their name.
-        name_to_id_map = {row['nombre']: str(idx) for idx, row in students_df_master.iterrows()}
-        for record in saved_attendance_raw:
-            student_name = record.get('Nombre')
-            student_id = name_to_id_map.get(student_name)
-            if student_id:
-                status = 'presente' if record.get('Presente', False) else 'ausente'
-                attendance_lookup[student_id] = status
-    elif isinstance(saved_attendance_raw, dict):
-        # This handles the correct format: a dictionary of {student_id: status}
-        attendance_lookup = saved_attendance_raw
-    
-    edit_records = []
-    for index, student_row in students_df_master.iterrows():
-        student_id = str(index) 
-        student_name = student_row['nombre']
-        
-        # Now we use our standardized `attendance_lookup` dictionary, which is guaranteed to work.
-        status = attendance_lookup.get(student_id, 'ausente') 
-        is_present = (status == 'presente' if isinstance(status, str) else bool(status))
-        edit_records.append({'ID': student_id, 'Nombre': student_name, 'Presente': is_present})
-
-    if not edit_records:
-        st.warning("No se pudieron construir los registros de edición.")
-        if st.button("Cerrar"):
-            st.session_state.show_edit_dialog = False
-            st.rerun()
-        return
-        
-    edit_df = pd.DataFrame(edit_records)
+    # Presence by student id as stored (id-keyed day or legacy list of {'Nombre', 'Presente'})
+    saved_attendance_raw = st.session_state.attendance_data['records'].get(date_key)
+    loaded_presence = attendance_presence(saved_attendance_raw, students_df_master)
+    edit_df = pd.DataFrame(
+        {'Nombre': students_df_master['nombre'].to_numpy(), 'Presente': loaded_presence.to_numpy()},
+        index=loaded_presence.index
+    )
     st.markdown(f"**Editando asistencia para el {selected_date_str}**")
     
-    edit_df_no_id = edit_df.drop(columns=["ID"])
     edited_df_in_dialog = st.data_editor(
-        edit_df_no_id,
+        edit_df,
         column_config={
             'Nombre': st.column_config.TextColumn('Nombre del Estudiante', disabled=True),
             'Presente': st.column_config.CheckboxColumn('¿Presente?')
@@ -263,18 +175,18 @@ def edit_selected_dialog():
     with col1:
         if st.button("💾 Guardar Cambios", type="primary", use_container_width=True):
             try:
-                updated_records_for_db = edited_df_in_dialog.to_dict('records')
-
-                date_obj = datetime.datetime.strptime(date_key, '%Y-%m-%d').date()
-                if save_attendance(date_obj, updated_records_for_db):
-                    st.session_state.attendance_data['records'][date_key] = updated_records_for_db
-                    st.session_state.attendance_data['last_updated'] = datetime.datetime.now().isoformat()
-                    st.toast("¡Cambios guardados!", icon="✅")
-                    time.sleep(1)
-                    
-                    
-                else:
+                # Only the students whose checkbox changed are written; legacy list days are converted once
+                result = save_attendance_changes(date_key, loaded_presence, edited_df_in_dialog['Presente'], rewrite=not isinstance(saved_attendance_raw, dict))
+                if result is None:
                     st.error("Error al guardar los cambios.")
+                elif not result['changes']:
+                    st.info("No hay cambios para guardar.")
+                else:
+                    records = st.session_state.attendance_data['records']
+                    day = records.get(date_key)
+                    records[date_key] = {**day, **result['changes']} if isinstance(day, dict) else result['changes']
+                    st.session_state.attendance_data['last_updated'] = result['last_updated']
+                    st.toast("¡Cambios guardados!", icon="✅")
             except Exception as e:
                 st.error(f"Ocurrió un error al guardar: {str(e)}")
 
@@ -383,7 +295,9 @@ st.session_state.show_edit_dialog = False
 
 # 3. Now, use our local variable to decide whether to open the dialog.
 if should_show_dialog_this_run:
-    edit_selected_dialog() # The dialog will only be called this one time.
+    # The roster is read here, once: the dialog's own reruns (date picker, checkboxes, save) only rerun the dialog
+    students_df_master, _ = load_students(get_last_updated('students'))
+    edit_selected_dialog(students_df_master) # The dialog will only be called this one time.
 elif st.session_state.show_delete_selected_dialog:
     confirm_delete_selected_dialog()
 elif st.session_state.show_delete_all_dialog:
@@ -391,20 +305,166 @@ elif st.session_state.show_delete_all_dialog:
 
 # --- End of Advanced Handling ---
 
+@st.fragment
+def review_prepared_attendance():
+    """
+    Review and save of the prepared tables as a fragment: the date picker and
+    the checkboxes rerun only this function, with no database reads. Saves
+    rerun the whole page to refresh the attendance data.
+    """
+    st.divider()
+    st.subheader("📋 Revisar y Guardar Asistencia")
+    st.info("Revise los registros de asistencia abajo. Marque la casilla 'Presente' para los estudiantes que asistieron. Desmarque para los ausentes. Al finalizar, haga clic en '💾 Guardar Asistencia' para guardar los cambios de asistencia para el día seleccionado. Haga click en **'💾✅ Guardar todos los registros'** para guardar los cambios de asistencia para todos los días seleccionados.")
+
+    dates_with_data = sorted(st.session_state.prepared_attendance_dfs.keys())
+
+    if not dates_with_data:
+        st.info("No hay datos de asistencia preparados para mostrar.")
+    else:
+        col1, _ = st.columns(2)
+        with col1:
+            selected_date_str = st.selectbox(
+                "Seleccione una fecha para ver/editar asistencia:",
+                options=[d.strftime('%m/%d/%Y') for d in dates_with_data],
+                index=0
+            )
+            selected_date_obj = datetime.datetime.strptime(selected_date_str, '%m/%d/%Y').date()
+
+        if selected_date_obj in st.session_state.prepared_attendance_dfs:
+            df_to_edit = st.session_state.prepared_attendance_dfs[selected_date_obj]
+            total_attended = df_to_edit['Presente'].value_counts().get(True, 0)
+            # Show date in Spanish
+            spanish_day_name = SPANISH_DAY_NAMES[selected_date_obj.strftime('%A')]
+            spanish_month_name = SPANISH_MONTH_NAMES[selected_date_obj.strftime('%B')]
+            st.caption(f"{spanish_day_name}, {selected_date_obj.day} de {spanish_month_name} de {selected_date_obj.year} ({total_attended} de {len(df_to_edit)} estudiantes asistieron)")
+
+            edited_df = st.data_editor(
+                df_to_edit,
+                column_config={
+                    "Nombre": st.column_config.TextColumn("Nombre del Estudiante", disabled=True, width="large"),
+                    "Presente": st.column_config.CheckboxColumn("¿Presente?", default=False, width="small"),
+                    "Nombre en Teams": st.column_config.TextColumn("Nombre en Teams", disabled=True, help="Participante del reporte asignado al estudiante. '¿…?' indica un participante que coincide con varios estudiantes: marque el correcto."),
+                    "Confianza": st.column_config.ProgressColumn("Confianza", min_value=0.0, max_value=1.0, format="%.2f", width="small")
+                },
+                hide_index=True,
+                key=f"attendance_editor_upload_{selected_date_str}"
+            )
+            st.session_state.prepared_attendance_dfs[selected_date_obj] = edited_df
+
+            col1, col2, _ = st.columns([2, 3, 2])
+            with col1:
+                if st.button(f"💾 Guardar {selected_date_str}", key=f"save_{selected_date_str}"):
+                    enqueue_update(
+                        f"la asistencia del {selected_date_str}",
+                        attendance_batch_patch(st.session_state.email.replace('.', ','),
+                                               {selected_date_obj: edited_df['Presente']}),
+                        on_failure=restore_prepared_attendance({selected_date_obj: edited_df}, {})
+                    )
+                    del st.session_state.prepared_attendance_dfs[selected_date_obj]
+                    st.rerun()
+            with col2:
+                if st.button("🗑️ Limpiar Ficheros Cargados"):
+                    st.session_state.current_batch_data_by_date = {}
+                    st.session_state.prepared_attendance_dfs = {}
+                    st.session_state.processed_files_this_session = set()
+                    st.session_state.uploader_key_suffix += 1
+                    st.rerun()
+            st.markdown("---")
+        else:
+            st.warning("La fecha seleccionada ya no tiene datos preparados. Por favor, recargue o seleccione otra fecha.")
+
+        # save button
+        if st.button("💾✅ Guardar Todos los Registros", type="primary", key="save_all_reports"):
+            attendance_by_date = {
+                date_obj: df['Presente']
+                for date_obj, df in st.session_state.prepared_attendance_dfs.items()
+            }
+            # Every day and the metadata bump in one atomic write, made in the background;
+            # the tables come back for another try if it fails
+            enqueue_update(
+                f"{len(attendance_by_date)} reporte(s) de asistencia",
+                attendance_batch_patch(st.session_state.email.replace('.', ','), attendance_by_date),
+                on_failure=restore_prepared_attendance(st.session_state.prepared_attendance_dfs,
+                                                       st.session_state.current_batch_data_by_date)
+            )
+            st.session_state.current_batch_data_by_date = {}
+            st.session_state.prepared_attendance_dfs = {}
+            st.session_state.processed_files_this_session = set()
+            st.session_state.uploader_key_suffix += 1
+            st.rerun()
+
+
+@st.fragment
+def attendance_dates_table(attendance_dates):
+    """
+    Saved days, to pick days to edit or delete. A fragment: ticking days reruns
+    only this table; the buttons open their dialogs with a full rerun.
+    """
+    st.subheader("📋 Registros de Asistencia guardados")
+
+    try:
+        dates_df = pd.DataFrame({
+            'Día': [SPANISH_DAY_NAMES[datetime.datetime.strptime(d, '%Y-%m-%d').strftime('%A')] for d in attendance_dates],
+            'Fecha': [datetime.datetime.strptime(d, '%Y-%m-%d').strftime('%m/%d/%Y') for d in attendance_dates],
+            'Seleccionar': [False] * len(attendance_dates)
+        })
+        dates_df = dates_df[["Seleccionar", "Día", "Fecha"]]
+
+        st.info("Marque las casillas para editar o eliminar las asistencias correspondientes.")
+
+        edited_df = st.data_editor(
+            dates_df,
+            column_config={
+                "Seleccionar": st.column_config.CheckboxColumn("Seleccionar", width="small", pinned=True),
+                "Fecha": st.column_config.TextColumn("Fecha", disabled=True),
+                "Día": st.column_config.TextColumn("Día", disabled=True, width="small"),
+            },
+            hide_index=True,
+            use_container_width=True,
+            key=f"attendance_dates_selector_{st.session_state.editor_key_counter}"
+        )
+
+        selected_rows = edited_df[edited_df['Seleccionar']]
+
+        col1, col2, col3 = st.columns([2, 2, 2])
+        with col1:
+            if st.button("Eliminar todo", type="primary", use_container_width=True):
+                reset_dialog_states()
+                st.session_state.show_delete_all_dialog = True
+                st.rerun() # Rerun is fine for dialogs that self-manage state.
+
+        if not selected_rows.empty:
+            selected_dates_list = selected_rows['Fecha'].tolist()
+            with col2:
+                if st.button("Eliminar", use_container_width=True):
+                    reset_dialog_states()
+                    st.session_state.to_delete = selected_dates_list
+                    st.session_state.show_delete_selected_dialog = True
+                    st.rerun()
+            with col3:
+                # Dialogs open from the full page run, so leave the fragment with a full rerun
+                if st.button("Editar Seleccionados", type="secondary", use_container_width=True):
+                    prepare_edit_dialog(selected_dates_list)
+                    st.rerun()
+
+    except Exception as e:
+        st.error(f"Error al cargar las asistencias: {str(e)}")
+
+
 tab1, tab2 = st.tabs(["Nuevo Registro", "Editar Registro"])
 
 with tab1:
     st.subheader("⬆️ Subir Archivos de Asistencia")
     uploaded_reports = st.file_uploader(
         "Las fechas se detectarán de los nombres de archivo.",
-        type=['csv'],
+        type=['csv', 'zip'],
         accept_multiple_files=True,
         key=f"report_uploader_daily_{st.session_state.uploader_key_suffix}",
         on_change=lambda: [
             setattr(st.session_state, 'current_batch_data_by_date', {}),
             setattr(st.session_state, 'prepared_attendance_dfs', {})
         ],
-        help="Suba archivos CSV. La fecha se detecta del nombre de archivo (p.ej., '...Attendance Report MM-DD-YY.csv')"
+        help="Suba archivos CSV o un archivo ZIP con los reportes de todo un período. La fecha se detecta del nombre de archivo (p.ej., '...Attendance Report MM-DD-YY.csv')"
     )
 
     if uploaded_reports:
@@ -417,40 +477,44 @@ with tab1:
         files_processed_summary = {}
         files_skipped_summary = {}
 
-        for report_file in uploaded_reports:
-            if report_file.name in st.session_state.processed_files_this_session:
-                continue
-            file_date = extract_date_from_filename(report_file.name)
-            if not file_date:
-                st.warning(f"Omitiendo '{report_file.name}': No se pudo extraer la fecha del nombre del archivo.")
-                files_skipped_summary[report_file.name] = "Sin fecha en el nombre del archivo"
-                st.session_state.processed_files_this_session.add(report_file.name)
+        # Tracked by upload id: two different files may share a name
+        new_uploads = [
+            (report_file.file_id, report_file.name, report_file.getvalue())
+            for report_file in uploaded_reports
+            if report_file.file_id not in st.session_state.processed_files_this_session
+        ]
+        # ZIP uploads are replaced by their members, read in memory
+        pending_reports, archive_errors = expand_archives(new_uploads)
+        for report in archive_errors:
+            st.error(f"No se pudo leer '{report['filename']}': {report['message']}")
+            files_skipped_summary[report['filename']] = "Archivo ZIP inválido"
+        if pending_reports:
+            progress_bar = st.progress(0.0, text="Procesando reportes...")
+        # Date, codec and participants of each file are extracted in parallel; results merge as they complete.
+        # Reports this user already uploaded (same content, any name) are not parsed again.
+        for n_done, report in enumerate(process_reports(pending_reports, user=st.session_state.email), start=1):
+            progress_bar.progress(n_done / len(pending_reports), text=f"Procesando reportes: {n_done} de {len(pending_reports)}")
+            file_name = report['filename']
+            file_date = report['date']
+            if report['status'] == 'no_date':
+                st.warning(f"Omitiendo '{file_name}': No se pudo extraer la fecha del nombre del archivo.")
+                files_skipped_summary[file_name] = "Sin fecha en el nombre del archivo"
                 continue
-            file_bytes = report_file.getvalue()
-            file_content_str = None
-            tried_encodings_list = ['utf-16', 'utf-8', 'utf-8-sig', 'latin-1', 'cp1252'] 
-            try:
-                file_content_str = file_bytes.decode('utf-16')
-            except UnicodeDecodeError:
-                for enc in [e for e in tried_encodings_list if e != 'utf-16']:
-                    try:
-                        file_content_str = file_bytes.decode(enc)
-                        break 
-                    except UnicodeDecodeError:
-                        continue
-            if file_content_str is None:
-                st.error(f"Error al decodificar '{report_file.name}'. Intentados: {', '.join(tried_encodings_list)}.")
-                files_skipped_summary[report_file.name] = "Falló la decodificación"
-                st.session_state.processed_files_this_session.add(report_file.name)
+            if report['status'] == 'decode_error':
+                st.error(f"Error al decodificar '{file_name}': {report['message']}")
+                files_skipped_summary[file_name] = "Falló la decodificación"
                 continue
-            names_from_report = parse_attendance_report(file_content_str, report_file.name)
-            if names_from_report:
-                st.session_state.current_batch_data_by_date.setdefault(file_date, set()).update(names_from_report)
-                files_processed_summary.setdefault(file_date, []).append(report_file.name)
+            if report['status'] == 'format_error':
+                st.warning(report['message'])
+            if report['names']:
+                st.session_state.current_batch_data_by_date.setdefault(file_date, set()).update(report['names'])
+                files_processed_summary.setdefault(file_date, []).append(file_name)
             else:
-                st.warning(f"No se pudieron extraer nombres de '{report_file.name}'.")
-                files_skipped_summary[report_file.name] = "Falló el análisis de nombres"
-            st.session_state.processed_files_this_session.add(report_file.name)
+                st.warning(f"No se pudieron extraer nombres de '{file_name}'.")
+                files_skipped_summary[file_name] = "Falló el análisis de nombres"
+        if pending_reports:
+            progress_bar.empty()
+        st.session_state.processed_files_this_session.update(file_id for file_id, _, _ in new_uploads)
 
         if files_processed_summary:
             st.subheader("✅ Archivos Procesados Exitosamente")
@@ -494,20 +558,11 @@ with tab1:
                     st.error("No se encontraron datos de estudiantes. Por favor, suba una lista de estudiantes en la página 'Gestión de Estudiantes' primero.")
                     st.stop()
                 
-                student_names_master_list = students_df['nombre'].astype(str).str.strip().tolist()
-                for date_obj, names_from_reports_set in st.session_state.current_batch_data_by_date.items():
-                    normalized_names_from_reports = {name.lower().strip() for name in names_from_reports_set}
-                    attendance_records = []
-                    for master_name in student_names_master_list:
-                        normalized_master_name = master_name.lower().strip()
-                        present = normalized_master_name in normalized_names_from_reports
-                        attendance_records.append({'Nombre': master_name, 'Presente': present})
-                    
-                    if attendance_records:
-                        attendance_df = pd.DataFrame(attendance_records)
-                        st.session_state.prepared_attendance_dfs[date_obj] = attendance_df
-                    else:
-                        st.info(f"No se generaron registros de asistencia para {date_obj.strftime('%Y-%m-%d')}.")
+                roster_names = students_df['nombre'].astype(str).str.strip()
+                # Fuzzy match Teams names against the roster (accents, order, missing middle names)
+                # for all days at once; each day's table is a slice of the students × dates matrix
+                attendance_by_student = attendance_matrix(roster_names, st.session_state.current_batch_data_by_date)
+                st.session_state.prepared_attendance_dfs = attendance_tables(attendance_by_student)
                 
                 if st.session_state.prepared_attendance_dfs:
                     st.success("Tablas de asistencia preparadas. Proceda al Paso 3.")
@@ -516,92 +571,7 @@ with tab1:
                     st.warning("No se pudieron preparar tablas de asistencia.")
 
     if st.session_state.prepared_attendance_dfs:
-        st.divider()
-        st.subheader("📋 Revisar y Guardar Asistencia")
-        st.info("Revise los registros de asistencia abajo. Marque la casilla 'Presente' para los estudiantes que asistieron. Desmarque para los ausentes. Al finalizar, haga clic en '💾 Guardar Asistencia' para guardar los cambios de asistencia para el día seleccionado. Haga click en **'💾✅ Guardar todos los registros'** para guardar los cambios de asistencia para todos los días seleccionados.")
-
-        dates_with_data = sorted(st.session_state.prepared_attendance_dfs.keys())
-
-        if not dates_with_data:
-            st.info("No hay datos de asistencia preparados para mostrar.")
-        else:
-            col1, _ = st.columns(2)
-            with col1:
-                selected_date_str = st.selectbox(
-                    "Seleccione una fecha para ver/editar asistencia:",
-                    options=[d.strftime('%m/%d/%Y') for d in dates_with_data],
-                    index=0
-                )
-                selected_date_obj = datetime.datetime.strptime(selected_date_str, '%m/%d/%Y').date()
-
-            if selected_date_obj in st.session_state.prepared_attendance_dfs:
-                df_to_edit = st.session_state.prepared_attendance_dfs[selected_date_obj]
-                total_attended = df_to_edit['Presente'].value_counts().get(True, 0)
-                # Show date in Spanish
-                spanish_day_name = SPANISH_DAY_NAMES[selected_date_obj.strftime('%A')]
-                spanish_month_name = SPANISH_MONTH_NAMES[selected_date_obj.strftime('%B')]
-                st.caption(f"{spanish_day_name}, {selected_date_obj.day} de {spanish_month_name} de {selected_date_obj.year} ({total_attended} de {len(df_to_edit)} estudiantes asistieron)")
-                
-                edited_df = st.data_editor(
-                    df_to_edit,
-                    column_config={
-                        "Nombre": st.column_config.TextColumn("Nombre del Estudiante", disabled=True, width="large"),
-                        "Presente": st.column_config.CheckboxColumn("¿Presente?", default=False, width="small")
-                    },
-                    hide_index=True,
-                    key=f"attendance_editor_upload_{selected_date_str}"
-                )
-                st.session_state.prepared_attendance_dfs[selected_date_obj] = edited_df
-
-                col1, col2, _ = st.columns([2, 3, 2])
-                with col1:
-                    if st.button(f"💾 Guardar {selected_date_str}", key=f"save_{selected_date_str}"):
-                        attendance_data_to_save = edited_df.to_dict('records')
-                        if save_attendance(selected_date_obj, attendance_data_to_save):
-                            update_attendance_session_state()
-                            set_last_updated('attendance')
-                            st.toast(f"✅ ¡Asistencia guardada exitosamente para {selected_date_str}!")
-                            time.sleep(1.5)
-                            st.rerun()
-                        else:
-                            st.error(f"Error al guardar asistencia para {selected_date_str}.")
-                with col2:
-                    if st.button("🗑️ Limpiar Ficheros Cargados"):
-                        st.session_state.current_batch_data_by_date = {}
-                        st.session_state.prepared_attendance_dfs = {}
-                        st.session_state.processed_files_this_session = set()
-                        st.session_state.uploader_key_suffix += 1
-                        st.rerun()
-                st.markdown("---")
-            else:
-                st.warning("La fecha seleccionada ya no tiene datos preparados. Por favor, recargue o seleccione otra fecha.")
-            
-            # save button
-            if st.button("💾✅ Guardar Todos los Registros", type="primary", key="save_all_reports"):
-                save_success = True
-                saved_count = 0
-                for date_obj, df in st.session_state.prepared_attendance_dfs.items():
-                    date_str = date_obj.strftime('%Y-%m-%d')
-                    attendance_data_to_save = df.to_dict('records')
-                    if save_attendance(date_obj, attendance_data_to_save):
-                        saved_count += 1
-                    else:
-                        save_success = False
-                        st.error(f"Error al guardar la asistencia para {date_str}.")
-                if save_success and saved_count > 0:
-                    set_last_updated('attendance')
-                    st.toast("¡Informes guardados exitosamente!", icon="✅")
-                    st.success(f"¡Se guardaron exitosamente {saved_count} reporte(s) de asistencia!")
-                    st.balloons()
-                    update_attendance_session_state()
-                    st.session_state.current_batch_data_by_date = {}
-                    st.session_state.prepared_attendance_dfs = {}
-                    st.session_state.processed_files_this_session = set()
-                    st.session_state.uploader_key_suffix += 1
-                    time.sleep(2)
-                    st.rerun()
-                elif saved_count == 0:
-                    st.warning("No se pudo guardar ningún reporte. Por favor intente de nuevo.")
+        review_prepared_attendance()
 
 
 with tab2:
@@ -609,60 +579,6 @@ with tab2:
     all_attendance_dates = attendance_data['dates']
 
     if all_attendance_dates:
-        st.subheader("📋 Registros de Asistencia guardados")
-
-        try:
-            dates_df = pd.DataFrame({
-                'Día': [SPANISH_DAY_NAMES[datetime.datetime.strptime(d, '%Y-%m-%d').strftime('%A')] for d in all_attendance_dates],
-                'Fecha': [datetime.datetime.strptime(d, '%Y-%m-%d').strftime('%m/%d/%Y') for d in all_attendance_dates],
-                'Seleccionar': [False] * len(all_attendance_dates)
-            })
-            dates_df = dates_df[["Seleccionar", "Día", "Fecha"]]
-            
-            st.info("Marque las casillas para editar o eliminar las asistencias correspondientes.")
-            
-            edited_df = st.data_editor(
-                dates_df,
-                column_config={
-                    "Seleccionar": st.column_config.CheckboxColumn("Seleccionar", width="small", pinned=True),
-                    "Fecha": st.column_config.TextColumn("Fecha", disabled=True),
-                    "Día": st.column_config.TextColumn("Día", disabled=True, width="small"),
-                },
-                hide_index=True,
-                use_container_width=True,
-                key=f"attendance_dates_selector_{st.session_state.editor_key_counter}"
-            )
-            
-            selected_rows = edited_df[edited_df['Seleccionar']]
-            
-            col1, col2, col3 = st.columns([2, 2, 2])
-            with col1:
-                if st.button("Eliminar todo", type="primary", use_container_width=True):
-                    reset_dialog_states()
-                    st.session_state.show_delete_all_dialog = True
-                    st.rerun() # Rerun is fine for dialogs that self-manage state.
-            
-            # This logic now uses the callback
-            if not selected_rows.empty:
-                selected_dates_list = selected_rows['Fecha'].tolist()
-                with col2:
-                    if st.button("Eliminar", use_container_width=True):
-                        reset_dialog_states()
-                        st.session_state.to_delete = selected_dates_list
-                        st.session_state.show_delete_selected_dialog = True
-                        st.rerun()
-                with col3:
-                    # Use the on_click callback here. It runs BEFORE the script reruns.
-                    # We pass the selected dates as an argument to the callback.
-                    st.button(
-                        "Editar Seleccionados", 
-                        type="secondary", 
-                        use_container_width=True,
-                        on_click=prepare_edit_dialog,
-                        args=(selected_dates_list,)
-                    )
-
-        except Exception as e:
-            st.error(f"Error al cargar las asistencias: {str(e)}")
+        attendance_dates_table(all_attendance_dates)
     else:
         st.info("No hay asistencias registradas.")
@@ -4,7 +4,7 @@ import urllib.parse
 import datetime
 from config import setup_page, db # Assuming db is implicitly used by load_attendance via utils
 from utils import load_attendance, load_students # Use the centralized functions
-from utils import create_filename_date_range, load_attendance, get_attendance_dates, load_students, get_last_updated, get_student_email, get_student_start_date, get_student_end_date, get_student_phone, date_format, load_all_attendance, get_student_modulo_inicio, get_student_modulo_fin
+from utils import create_filename_date_range, load_attendance, get_attendance_dates, load_students, get_last_updated, get_student_email, get_student_start_date, get_student_end_date, get_student_phone, date_format, load_all_attendance, get_student_modulo_inicio, get_student_modulo_fin, build_attendance_summary
 
 
 # --- Session Check ---
@@ -36,22 +36,12 @@ with st.spinner("Cargando datos de asistencia..."):
     attendance_last_updated = get_last_updated('attendance', st.session_state.email)
     st.session_state.all_attendance_data = load_all_attendance( st.session_state.email, attendance_last_updated)
 
-# Manual Spanish day name mapping to avoid locale/encoding issues
-SPANISH_DAY_NAMES = {
-    "Monday": "Lunes",
-    "Tuesday": "Martes",
-    "Wednesday": "Miércoles",
-    "Thursday": "Jueves",
-    "Friday": "Viernes",
-    "Saturday": "Sábado",
-    "Sunday": "Domingo"
-}
 # Main UI
 
 # Initialize with default values
 
 # attendance_last_updated = get_last_updated('attendance', st.session_state.email)
-all_attendance = get_attendance_dates(attendance_last_updated)
+all_attendance = get_attendance_dates(st.session_state.email, attendance_last_updated)
 if all_attendance:
     today = datetime.date.today()
     all_attendance_dates = sorted(all_attendance)
@@ -164,63 +154,19 @@ if all_attendance:
                 st.error("No se pudo cargar la lista de estudiantes. Por favor, registre estudiantes en la página 'Estudiantes'.") # Translated
                 st.stop()
             
-            # Assuming student names are in 'nombre' column and are unique identifiers
-            master_student_list = set(all_students_df['nombre'].astype(str).str.strip().unique())
-            total_registered_students = len(master_student_list)
-
-            # 2. Process attendance data for the date range
-            daily_summary_data = []
-            students_present_in_range = set() # This still considers all days for 'never attended'
-            
-            current_date_iter = start_date
-            
+            # 2. Process attendance data for the date range (list days from uploads and
+            # {student_id: status} days saved by the edit dialog alike)
             spinner_message = f"Cargando y procesando asistencia desde {start_date.strftime('%Y-%m-%d')} hasta {end_date.strftime('%Y-%m-%d')}..." # Translated
             with st.spinner(spinner_message):
-                print("all attendance data", st.session_state.all_attendance_data)
-                while current_date_iter <= end_date:
-                    # Exclude weekends (Saturday=5, Sunday=6 in weekday() method)
-                    if current_date_iter.weekday() >= 5: # 0=Monday, 1=Tuesday, ..., 5=Saturday, 6=Sunday
-                        current_date_iter += datetime.timedelta(days=1)
-                        continue # Skip to next day if it's a weekend
-
-                    # Get attendance from pre-loaded data
-                    date_key = current_date_iter.strftime('%Y-%m-%d')
-                    # Assign daily_attendance_records immediately with a default of an empty list
-                    daily_attendance_records = st.session_state.all_attendance_data.get(date_key, [])
-                    
-                    # Ensure daily_attendance_records is actually a list
-                    if not isinstance(daily_attendance_records, list):
-                        st.error(f"Error: Data for {date_key} was expected to be a list of records, but got {type(daily_attendance_records)}. Treating as empty.")
-                        daily_attendance_records = [] # Reset to empty list to prevent further errors
-
-                    present_today_count = 0
-                    if daily_attendance_records: # Check if the list of records is not empty
-                        # Iterate over each student's attendance record in the list
-                        for record in daily_attendance_records:
-                            # Ensure each record is a dictionary before trying to access its items
-                            if isinstance(record, dict):
-                                # Access student name using the 'Nombre' key
-                                student_name = record.get('Nombre')
-                                # Check the 'Presente' status
-                                if record.get('Presente', False): # Default to False if 'Presente' key is missing
-                                    present_today_count += 1
-                                    # Add the student name to the set of students present in the range
-                                    if student_name: # Only add if a name was found
-                                        students_present_in_range.add(student_name)
-                            # else:
-                            #     st.warning(f"DEBUG: Found a non-dictionary item in the attendance list for {date_key}: {record}. Skipping this item.")
-                    
-                    absent_today_count = total_registered_students - present_today_count
-                    english_day_name = current_date_iter.strftime('%A')
-                    spanish_day_name = SPANISH_DAY_NAMES.get(english_day_name, english_day_name) # Fallback to English if not found
-                    
-                    daily_summary_data.append({
-                        'Fecha': date_format(current_date_iter, '%Y-%m-%d'), # Keep 'Fecha' or 'Date'
-                        'Día': spanish_day_name.capitalize(), # Spanish Day Name, capitalized
-                        '# Presentes': present_today_count, # Translated
-                        '# Ausentes': absent_today_count    # Translated
-                    })
-                    current_date_iter += datetime.timedelta(days=1)
+                summary = build_attendance_summary(
+                    all_students_df.rename_axis('id').reset_index(), st.session_state.all_attendance_data, start_date, end_date
+                )
+            for date_key, type_name in summary['skipped_dates']:
+                st.warning(f"Se omitieron los datos de asistencia para el {date_key} debido a un formato de datos desconocido: '{type_name}'.")
+
+            master_student_list = summary['registered_names']
+            students_present_in_range = summary['present_names']
+            daily_summary_data = summary['daily_summary']
             
             # 3. Display Daily Summary Report
             if daily_summary_data:
@@ -3,8 +3,9 @@ import pandas as pd
 import urllib.parse
 import datetime
 from config import setup_page, db
-from utils import create_filename_date_range, get_student_email, get_student_start_date, get_student_phone, date_format, get_student_modulo_inicio, get_student_modulo_fin, get_student_end_date
+from utils import create_filename_date_range, get_student_email, get_student_start_date, get_student_phone, date_format, get_student_modulo_inicio, get_student_modulo_fin, get_student_end_date, build_attendance_summary
 from utils_admin import admin_get_student_group_emails, admin_load_students, admin_get_last_updated, admin_get_attendance
+from prefetch_utils import prefetch
 
 # --- Session Check ---
 if not st.session_state.get("logged_in"):
@@ -25,13 +26,6 @@ if 'attendance_records' not in st.session_state:
 if 'course_data_cache' not in st.session_state:
     st.session_state.course_data_cache = {}
 
-# Manual Spanish day name mapping
-SPANISH_DAY_NAMES = {
-    "Monday": "Lunes", "Tuesday": "Martes", "Wednesday": "Miércoles",
-    "Thursday": "Jueves", "Friday": "Viernes", "Saturday": "Sábado",
-    "Sunday": "Domingo"
-}
-
 # --- Data Loading and Caching Function ---
 def load_data_into_session(course_email):
     """
@@ -40,31 +34,31 @@ def load_data_into_session(course_email):
     """
     
     with st.spinner(f"Cargando todos los datos para el curso {course_email}..."):
-        # Load students for the selected course
-        students_last_updated = admin_get_last_updated('students', course_email)
-        students_df, _ = admin_load_students(course_email, students_last_updated)
-    
-
-        # This ensures the DataFrame index (likely the student ID from Firebase) becomes a column named 'id'
+        # Students and attendance don't depend on each other: load both at once
+        user_email_db_key = course_email.replace('.', ',')
+        loaded, errors = prefetch({
+            'students': lambda: admin_load_students(course_email, admin_get_last_updated('students', course_email)),
+            'attendance': lambda: admin_get_attendance(user_email_db_key, admin_get_last_updated('attendance', course_email))
+        })
+        if 'students' in errors:
+            raise errors['students']
+        students_df, _ = loaded['students']
+
+        # The DataFrame index is the stable student id from Firebase; expose it as the 'id' column
         if students_df is not None and not students_df.empty:
-            students_df = students_df.reset_index().rename(columns={'index': 'id'})
+            students_df = students_df.rename_axis('id').reset_index()
         else:
             students_df = pd.DataFrame()
         
         st.session_state.students_df = students_df
 
-        # Load ALL attendance records for the course into a dictionary
-        try:
-            attendance_last_updated = admin_get_last_updated('attendance', course_email)
-            # print("\n\nattendance_last_updated", attendance_last_updated)
-            user_email_db_key = course_email.replace('.', ',')
-            all_records = admin_get_attendance(user_email_db_key, attendance_last_updated)
-
-            st.session_state.attendance_records = all_records
-        except Exception as e:
-            st.error(f"No se pudieron cargar los registros de asistencia: {e}")
+        # ALL attendance records for the course, as a dictionary
+        if 'attendance' in errors:
+            st.error(f"No se pudieron cargar los registros de asistencia: {errors['attendance']}")
             all_records = {}
-            # st.session_state.attendance_records = {}
+        else:
+            all_records = loaded['attendance']
+            st.session_state.attendance_records = all_records
 
         # Store/Update the loaded data for THIS course in the cache
         # This will overwrite any previous data for this course_email, ensuring it's fresh
@@ -231,71 +225,17 @@ if selected_course:
                 st.error("La lista de estudiantes está vacía o no tiene las columnas 'id' y 'nombre'. Verifique los datos del curso.")
                 st.stop()
             
-            master_student_list = set(all_students_df['nombre'].astype(str).str.strip().unique())
-            total_registered_students = len(master_student_list)
-
-            # --- FIX STARTS HERE ---
-            # 1. Create a useful ID -> Name mapping dictionary for fast lookups.
-            student_id_to_name = all_students_df.set_index('id')['nombre'].to_dict()
-            # 2. The line that caused the crash is removed.
-            # --- FIX ENDS HERE ---
-
-            daily_summary_data = []
-            students_present_in_range = set()
-            
             spinner_message = "Generando reporte desde los datos locales..."
             with st.spinner(spinner_message):
-                current_date_iter = start_date
-                while current_date_iter <= end_date:
-                    if current_date_iter.weekday() >= 5:
-                        current_date_iter += datetime.timedelta(days=1)
-                        continue
-
-                    date_key = current_date_iter.strftime('%Y-%m-%d')
-                    daily_attendance_dict = st.session_state.attendance_records.get(date_key, {})
-                    
-                    present_today_count = 0
-                    if daily_attendance_dict:
-                        # CASE 1: Handle the LIST format (your current structure)
-                        if isinstance(daily_attendance_dict, list):
-                            for record in daily_attendance_dict:
-                                # Firebase can create 'null' entries in lists, so we check if the record is a dictionary
-                                if isinstance(record, dict):
-                                    is_present = record.get('Presente', False)
-                                    
-                                    if is_present:
-                                        present_today_count += 1
-                                        student_name = record.get('Nombre')
-                                        if student_name:
-                                            # Add the name directly from the attendance record
-                                            students_present_in_range.add(student_name.strip())
-
-                        # CASE 2: Handle the DICTIONARY format (for backward compatibility or other courses)
-                        elif isinstance(daily_attendance_dict, dict):
-                            for student_id, details in daily_attendance_dict.items():
-                                status = details.get('status', 'ausente') if isinstance(details, dict) else (details or 'ausente')
-                                
-                                if status.lower() == 'presente':
-                                    present_today_count += 1
-                                    student_name = student_id_to_name.get(student_id)
-                                    if student_name:
-                                        students_present_in_range.add(student_name.strip())
-                        
-                        # CASE 3: Warn about any other unexpected format
-                        else:
-                            st.warning(f"Se omitieron los datos de asistencia para el {date_key} debido a un formato de datos desconocido: '{type(daily_attendance_dict).__name__}'.")
-
-                    absent_today_count = total_registered_students - present_today_count
-                    english_day_name = current_date_iter.strftime('%A')
-                    spanish_day_name = SPANISH_DAY_NAMES.get(english_day_name, english_day_name)
-                    
-                    daily_summary_data.append({
-                        'Fecha': date_format(current_date_iter, '%Y-%m-%d'),
-                        'Día': spanish_day_name.capitalize(),
-                        '# Presentes': present_today_count,
-                        '# Ausentes': absent_today_count
-                    })
-                    current_date_iter += datetime.timedelta(days=1)
+                summary = build_attendance_summary(
+                    all_students_df, st.session_state.attendance_records, start_date, end_date
+                )
+            for date_key, type_name in summary['skipped_dates']:
+                st.warning(f"Se omitieron los datos de asistencia para el {date_key} debido a un formato de datos desconocido: '{type_name}'.")
+
+            master_student_list = summary['registered_names']
+            students_present_in_range = summary['present_names']
+            daily_summary_data = summary['daily_summary']
             
             # Display Daily Summary Report
             if daily_summary_data:
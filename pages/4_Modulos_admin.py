@@ -1,9 +1,11 @@
 import streamlit as st
 import pandas as pd
 from config import setup_page
-from utils_admin import delete_module_from_db, update_module_to_db, admin_get_student_group_emails, save_new_module_to_db, admin_get_available_modules, load_breaks_from_db, parse_breaks, adjust_date_for_breaks, row_to_clean_dict, transform_module_input, sync_firebase_updates
+from utils_admin import delete_module_from_db, update_module_to_db, admin_get_student_group_emails, save_new_module_to_db, admin_get_available_modules, load_breaks_from_db, parse_breaks, adjust_date_for_breaks, calculate_module_dates_forward_stretch, row_to_clean_dict, transform_module_input, sync_firebase_updates
 import datetime
-import time
+import logging
+from log_utils import get_logger, log_payload
+from save_queue import notify
 # from streamlit_sortables import sort_items
 
 # --- Page Setup and Login Check ---
@@ -13,6 +15,8 @@ if not st.session_state.get('logged_in', False):
     st.info("Por favor, regrese a la página principal para iniciar sesión.")
     st.stop()
 
+logger = get_logger("modulos_admin")
+
 # if st.button("Limpiar Sesión"):
 #     st.session_state.modules_df_by_course = {}
 #     st.session_state.editor_key = 0
@@ -35,20 +39,14 @@ if 'reverse_dates' not in st.session_state:
     
 # --- End Initialize session state variables ---
 
-print("\n*********************************", "\n")
-print("\n*********************************", "\n")
-print("\n*********************************", "\n")
-print("\n*********************************", "\n")
-
 date_updates = st.session_state.get("modules_date_updates", {})
-print("\n\n****modules_date_updates variable", date_updates)
 
 if date_updates:
-    print("\n\n****modules_date_updates variable updated", date_updates)
+    log_payload(logger, "modules_date_updates", date_updates)
     for course_email, course_data in date_updates.items():
         for firebase_key, module_data in course_data.items():
             if firebase_key is not None:
-                print("\n\nmodule_dataddd", module_data)
+                logger.debug("Updating dates of module %s/%s", course_email, firebase_key)
                 
                 # print("Fecha inicio:", datetime.datetime.fromisoformat(module_data['Fecha Inicio']).strftime('%Y-%m-%d'))
 
@@ -424,65 +422,6 @@ try:
                         (edited_df['Fecha Fin'] >= today)
                     ]
 
-                    def calculate_module_dates_forward_stretch(row, anchor_date, all_breaks):
-                        """
-                        Calcula las fechas de un módulo hacia adelante, "estirando" su duración
-                        si se superpone con vacaciones. El módulo se "pausa" durante las vacaciones.
-                        
-                        Args:
-                            row (pd.Series): La fila del módulo con su 'Duración'.
-                            anchor_date (pd.Timestamp): La fecha de finalización del módulo anterior.
-                            all_breaks (list): Una lista de tuplas con fechas de inicio y fin de las vacaciones.
-                            
-                        Returns:
-                            tuple: (start_date, end_date) para el módulo calculado.
-                        """
-                        # La fecha de inicio tentativa es el día siguiente a la fecha de anclaje.
-                        start_date = anchor_date + pd.Timedelta(days=1)
-                        
-                        # Bucle para asegurar que la propia start_date no caiga en unas vacaciones.
-                        # Si lo hace, la movemos al día después de que terminen esas vacaciones.
-                        date_adjusted = True
-                        while date_adjusted:
-                            date_adjusted = False
-                            for break_start, break_end in all_breaks:
-                                if break_start <= start_date <= break_end:
-                                    start_date = break_end + pd.Timedelta(days=1)
-                                    date_adjusted = True # Re-evaluar por si cae en otro break consecutivo
-                                    break
-
-                        # Duración del trabajo del módulo en días
-                        work_duration_days = row['Duración'] * 7
-                        
-                        # Calculamos la fecha de finalización inicial, solo con la duración del trabajo.
-                        current_end_date = start_date + pd.Timedelta(days=work_duration_days - 1)
-                        
-                        # Bucle iterativo para ajustar la fecha de finalización hasta que se estabilice
-                        while True:
-                            total_overlap_days = 0
-                            # Revisa si el intervalo [start_date, current_end_date] se solapa con alguna vacación
-                            for break_start, break_end in all_breaks:
-                                if start_date <= break_end and current_end_date >= break_start:
-                                    # Calcular la intersección (los días exactos de solapamiento)
-                                    overlap_start = max(start_date, break_start)
-                                    overlap_end = min(current_end_date, break_end)
-                                    
-                                    # Sumar la cantidad de días de este solapamiento
-                                    overlap_duration = (overlap_end - overlap_start).days + 1
-                                    total_overlap_days += overlap_duration
-                            
-                            # Calculamos la fecha de finalización requerida, añadiendo los días de vacaciones a la duración
-                            required_end_date = start_date + pd.Timedelta(days=work_duration_days + total_overlap_days - 1)
-                            
-                            # Si la fecha de finalización ya no cambia, hemos terminado.
-                            if required_end_date == current_end_date:
-                                break
-                            else:
-                                # Si cambió, actualizamos la fecha de finalización y volvemos a iterar
-                                current_end_date = required_end_date
-                                
-                        return start_date, current_end_date
-
                     if not module_with_today.empty:
                         current_index = module_with_today.index[0]
                         current_order = edited_df.loc[current_index, 'Orden']
@@ -506,7 +445,7 @@ try:
                             if pd.notna(row['Duración']):
                                 
                                 # Usamos la nueva función para obtener las fechas correctas, que ya consideran vacaciones
-                                new_start_date, new_end_date = calculate_module_dates_forward_stretch(row, last_date_used, breaks)
+                                new_start_date, new_end_date = calculate_module_dates_forward_stretch(row['Duración'], last_date_used, breaks)
 
                                 old_start = edited_df.loc[index, 'Fecha Inicio']
                                 old_end = edited_df.loc[index, 'Fecha Fin']
@@ -528,7 +467,7 @@ try:
                         st.session_state.modules_df_by_course[modules_selected_course] = edited_df
                         st.session_state.modules_date_updates = changed_rows
 
-                        print(f"\n\nFinal result:\n{edited_df}")
+                        log_payload(logger, "Recalculated module dates", edited_df, level=logging.DEBUG)
                         st.rerun()
                     else:
                         st.warning("No se encontró ningún módulo correspondiente al día actual.")
@@ -546,13 +485,10 @@ try:
                     
                     # Renombrar columnas visibles a nombres de base de datos
                     edited_df_for_save = edited_df.rename(columns=reverse_display_names)
-                    print("\n\n 📝 Edited df for save:\n", edited_df_for_save)
+                    log_payload(logger, "Modules to save", edited_df_for_save, level=logging.DEBUG)
                     old_df = st.session_state.modules_df_by_course[modules_selected_course]
                     new_df = edited_df_for_save.copy()
 
-                    old_keys = set(old_df["firebase_key"].dropna().astype(str))
-                    new_keys = set(new_df["firebase_key"].dropna().astype(str))
-
                     # Detectar filas nuevas (sin firebase_key)
                     new_rows = new_df[new_df["firebase_key"].apply(is_missing_firebase_key)]
 
@@ -575,47 +511,19 @@ try:
                         if firebase_key:
                             new_df.loc[row.name, "firebase_key"] = firebase_key
                             st.session_state.modules_df_by_course[modules_selected_course] = new_df.copy()
-                            st.toast("✅ Módulo nuevo guardado.")
+                            notify("Módulo nuevo guardado.")
                             st.session_state.editor_key += 1
-                            time.sleep(1)
                             st.rerun()
 
-                    # 🔁 Detectar y guardar filas modificadas
-                    common_keys = old_keys & new_keys
-                    for key in common_keys:
-                        old_row = old_df[old_df["firebase_key"] == key].squeeze()
-                        new_row = new_df[new_df["firebase_key"] == key].squeeze()
-                        print("\n\n 📝 Old row:", old_row)
-                        print("\n\n 📝 New row:", new_row)
-                        # Comparamos los valores excepto firebase_key
-                        if not old_row.drop(labels=["firebase_key"]).equals(new_row.drop(labels=["firebase_key"])):
-                            clean = row_to_clean_dict(new_row)
-                            data = transform_module_input(clean)
-                            print("\n\n 📝 Data to update:", data)
-                            update_module_to_db(modules_selected_course, key, data)
-
-                            # st.success(f"Modulo con ID {key} actualizado.")
-                            st.toast("✅ Modulo actualizado.")
-                            st.session_state.modules_df_by_course[modules_selected_course] = new_df.copy()
-                            st.session_state.editor_key += 1
-                            time.sleep(1)
-                            st.rerun()
-
-                    # 🗑️ Detectar y eliminar filas eliminadas   
-                    deleted_keys = old_keys - new_keys
-                    for key in deleted_keys:
-                        try:
-                            delete_module_from_db(modules_selected_course, key)   
-                            # print(f"Nuevo DataFrame: {new_df[new_df["firebase_key"] != key]}")   
-                            new_df = new_df[new_df["firebase_key"] != key]
-                            st.session_state.modules_df_by_course[modules_selected_course] = new_df.copy()                     
-                            st.toast("✅ Módulo eliminado.")
-                            st.session_state.editor_key += 1
-                            time.sleep(1)
-                            st.rerun()
-                        except Exception as e:
-                            st.error(f"Error al eliminar el módulo con ID {key}: {str(e)}")
-                            st.stop()
+                    # 🔁 Detectar filas modificadas y eliminadas y guardarlas en una sola escritura
+                    patch = sync_firebase_updates(old_df, edited_df, modules_selected_course)
+                    if patch is None:
+                        st.stop()
+                    if patch:
+                        st.session_state.modules_df_by_course[modules_selected_course] = edited_df.copy()
+                        notify("Módulos actualizados.")
+                        st.session_state.editor_key += 1
+                        st.rerun()
                     
     else:
         st.info("No hay módulos disponibles. Por favor, agregue módulos.") # Keep this message
@@ -8,9 +8,12 @@ from config import setup_page
 from utils import (
     load_students,
     get_module_on_date, get_highest_module_credit, get_last_updated,
-    get_module_name_by_id, load_modules, highlight_style
+    get_module_name_by_id, load_modules, highlight_style,
+    active_students_per_month, SPANISH_MONTH_NAMES
 )
 from utils_admin import admin_get_student_group_emails, admin_load_students
+from profiler_utils import page_profiler
+from prefetch_utils import prefetch
 
 # --- Login Check ---
 if not st.session_state.get('logged_in', False):
@@ -21,6 +24,8 @@ if not st.session_state.get('logged_in', False):
 
 setup_page("Reporte de Estudiantes Admin")
 
+profiler = page_profiler("reporte_estudiantes_admin", first_phase="carga de datos")
+
 # Module section
 
 # if 'modules_df' not in st.session_state:
@@ -57,15 +62,25 @@ if course_emails:
         index=0,
         key="course_selector" # Added key for consistency
     )
+    # Students and today's module are independent loads: fetch them at once
+    loaders = {
+        'students': lambda: admin_load_students(modules_selected_course, get_last_updated('students', modules_selected_course))
+    }
+    if st.session_state.current_module_id_for_today is None:
+        loaders['module_today'] = lambda: get_module_on_date(modules_selected_course)
+    loaded, errors = prefetch(loaders)
+    if 'students' in errors:
+        raise errors['students']
+
     # Student section
-    students_last_updated = get_last_updated('students',modules_selected_course)
-    df_loaded, _ = admin_load_students(modules_selected_course, students_last_updated)
+    df_loaded, _ = loaded['students']
     # df_loaded = admin_load_students(modules_selected_course)
     # print("\n\ndf_loaded\n", df_loaded)
 
     if df_loaded is None or df_loaded.empty:
         st.info("No hay estudiantes registrados.")
     else:
+        profiler.mark("transformación")
         # Clean and format the data
         if 'ciclo' in df_loaded.columns:
             df_loaded = df_loaded.drop(columns=['ciclo'])
@@ -94,7 +109,7 @@ if course_emails:
 
         if 'current_module_id_for_today' in st.session_state and st.session_state.current_module_id_for_today is None:
             print("\n\nst.session_state.get('email')\n", modules_selected_course)
-            result = get_module_on_date(modules_selected_course)
+            result = loaded.get('module_today')
             print("\n\nresult\n", result)
             if result and 'module_id' in result:
                 st.session_state.current_module_id_for_today = result['firebase_key']
@@ -319,6 +334,7 @@ if course_emails:
             df_to_show = df_renamed
 
         
+        profiler.mark("tabla y estilos")
         st.subheader("📜 Reporte de Estudiantes")
 
         # Metrics
@@ -369,37 +385,16 @@ if course_emails:
         # st.info("Por favor, seleccione un módulo para ver los estudiantes.")
         # st.warning("Por favor, seleccione un módulo para ver los estudiantes.")
         # st.success("Por favor, seleccione un módulo para ver los estudiantes.")
+        profiler.mark("gráfico de activos")
         st.subheader("📊 Flujo de estudiantes activos por mes")
         
-        meses_es = {
-            1: "Enero", 2: "Febrero", 3: "Marzo", 4: "Abril",
-            5: "Mayo", 6: "Junio", 7: "Julio", 8: "Agosto",
-            9: "Septiembre", 10: "Octubre", 11: "Noviembre", 12: "Diciembre"
-        }
         # Copia y formatea fechas
         students = df_renamed.copy()
         students['Fecha de Inicio'] = pd.to_datetime(students['Fecha de Inicio'])
         students['Fecha de Finalización'] = pd.to_datetime(students['Fecha de Finalización'])
 
-        # Rango mensual para analizar
-        min_date = students['Fecha de Inicio'].min()
-        max_date = students['Fecha de Finalización'].max()
-        monthly_range = pd.date_range(min_date, max_date, freq='MS')
-
         # Calcular estudiantes activos por mes
-        active_per_month = []
-        for date in monthly_range:
-            activos = students[
-                (students['Fecha de Inicio'] <= date) &
-                ((students['Fecha de Finalización'].isna()) | (students['Fecha de Finalización'] >= date))
-            ]
-            active_per_month.append({
-                'Mes': date,
-                'Activos': len(activos),
-                'Etiqueta': meses_es[date.month] + ' ' + date.strftime('%Y')
-            })
-
-        active_df = pd.DataFrame(active_per_month)
+        active_df = active_students_per_month(students, 'Fecha de Inicio', 'Fecha de Finalización')
 
         hoy = pd.to_datetime(datetime.datetime.today().replace(day=1))
         # Grafico de estudiantes activos por mes
@@ -451,6 +446,7 @@ if course_emails:
         # ----------------------------------------
         # 📋 Ingresos y Egresos por mes (tabla y barra)
         # ----------------------------------------
+        profiler.mark("gráfico de ingresos y egresos")
         st.subheader("📋 Ingresos y egresos por mes")
 
         # Agrupar ingresos
@@ -488,7 +484,7 @@ if course_emails:
             value_name='Cantidad'          # Nueva columna: el valor numérico
         )
 
-        datos_grafico['Mes_Esp'] = datos_grafico['Mes'].apply(lambda d: f"{meses_es[d.month]} {d.year}")
+        datos_grafico['Mes_Esp'] = datos_grafico['Mes'].apply(lambda d: f"{SPANISH_MONTH_NAMES[d.month]} {d.year}")
 
         # 3. Crear el gráfico con Altair
         chart = alt.Chart(datos_grafico).mark_bar(size=30).encode(
@@ -1,20 +1,348 @@
 import streamlit as st
+import pandas as pd
+from config import setup_page, PROFILER_CONFIG
+from utils_admin import (
+    admin_get_student_group_emails, admin_get_last_updated, admin_set_last_updated,
+    stream_course_overview
+)
+from metrics_utils import (
+    snapshot, prometheus_text, aggregate_histograms, slowest_reruns,
+    session_stats, process_memory, REGISTRY
+)
+from profiler_utils import SESSION_FLAG
+from warmup_utils import warm_course
+from roster_utils import migrate_legacy_rosters
 
-# Set page configuration
-st.set_page_config(page_title="Panel de Administración", page_icon="👨‍💼")
+# --- Login Check ---
+if not st.session_state.get("logged_in") or "token_expires_at" not in st.session_state:
+    st.error("Debe iniciar sesión para acceder a esta página.")
+    st.info("Si el problema persiste, es posible que su sesión anterior haya caducado. Por favor, regrese a la página de Login y vuelva a iniciar sesión.")
+    st.stop()
 
-# Page title
-st.title("Panel de Administración")
+if not st.session_state.get("admin", False):
+    st.error("Esta página es solo para administradores.")
+    st.stop()
+# --- End Login Check ---
 
-# Add a divider for better visual separation
-st.divider()
+# Tables that are cached per course (metadata/<table>/<course>/last_updated)
+COURSE_TABLES = ['students', 'attendance', 'modules']
 
-# Add a placeholder for future admin content
-st.info("Bienvenido al panel de administración. Aquí podrás gestionar la configuración del sistema.")
 
-# You can add more admin components here
-# For example:
-# - User management
-# - System settings
-# - Data management tools
-# - Analytics and metrics
+def to_ms(df, columns):
+    """Convert latency columns from seconds to rounded milliseconds."""
+    for col in columns:
+        df[col] = (df[col].astype(float) * 1000).round(1)
+    return df
+
+
+def format_bytes(value):
+    if value is None or pd.isna(value):
+        return "N/D"
+    for unit in ["B", "KB", "MB", "GB"]:
+        if value < 1024:
+            return f"{value:.0f} {unit}" if unit == "B" else f"{value:.1f} {unit}"
+        value /= 1024
+    return f"{value:.1f} TB"
+
+
+def counters_frame(metrics, name, by):
+    """Sum one counter over every label not in `by`."""
+    rows = [
+        {**{label: entry['labels'].get(label, '') for label in by}, 'value': entry['value']}
+        for entry in metrics['counters'] if entry['name'] == name
+    ]
+    if not rows:
+        return pd.DataFrame(columns=[*by, name])
+    return pd.DataFrame(rows).groupby(list(by), as_index=False)['value'].sum().rename(columns={'value': name})
+
+
+def invalidate_course(course_email):
+    """
+    Bump the course's metadata versions so every cached loader reloads it.
+
+    Teacher pages read the global version (metadata/<table>/last_updated),
+    so that one is bumped as well.
+    """
+    for table in COURSE_TABLES:
+        admin_set_last_updated(table, course_email)
+        admin_set_last_updated(table, None)
+
+
+# --- Page Setup ---
+setup_page("Panel de Administración")
+st.caption("Métricas de este servidor desde su último reinicio. Cada sesión y cada hilo comparten el mismo registro.")
+
+metrics = snapshot()
+
+col_refresh, col_export, col_reset = st.columns(3)
+with col_refresh:
+    if st.button("🔄 Actualizar", use_container_width=True):
+        st.rerun()
+with col_export:
+    st.download_button(
+        "📥 Exportar (Prometheus)",
+        data=prometheus_text(),
+        file_name="metrics.txt",
+        mime="text/plain",
+        use_container_width=True
+    )
+with col_reset:
+    if st.button("🗑️ Reiniciar métricas", use_container_width=True):
+        REGISTRY.reset()
+        st.rerun()
+
+tab_pages, tab_firebase, tab_cache, tab_sessions, tab_courses = st.tabs(
+    ["Páginas", "Firebase", "Caché", "Sesiones", "Cursos"]
+)
+
+with tab_pages:
+    st.subheader("Tiempo de carga por página")
+    renders = aggregate_histograms('page_render_seconds', ('page',))
+    if renders:
+        renders_df = to_ms(pd.DataFrame(renders), ['p50', 'p95', 'p99'])
+        renders_df['media'] = (renders_df['sum'] / renders_df['count'] * 1000).round(1)
+        st.dataframe(
+            renders_df[['page', 'count', 'media', 'p50', 'p95', 'p99']].sort_values('p95', ascending=False),
+            column_config={
+                'page': "Página",
+                'count': "Ejecuciones",
+                'media': "Media (ms)",
+                'p50': "p50 (ms)",
+                'p95': "p95 (ms)",
+                'p99': "p99 (ms)"
+            },
+            hide_index=True,
+            use_container_width=True
+        )
+    else:
+        st.info("Todavía no hay ejecuciones registradas.")
+
+    st.subheader("Fases de páginas perfiladas")
+    if PROFILER_CONFIG["enabled"]:
+        st.caption("El perfilador está activado para todas las sesiones (configuración del servidor).")
+    else:
+        st.session_state[SESSION_FLAG] = st.toggle(
+            "Perfilar mis ejecuciones",
+            value=st.session_state.get(SESSION_FLAG, False),
+            help="Mide las fases de las páginas que abra en esta sesión y muestra el desglose al final de cada página."
+        )
+    phases = aggregate_histograms('page_phase_seconds', ('page', 'phase'))
+    if phases:
+        phases_df = to_ms(pd.DataFrame(phases), ['p50', 'p95', 'p99'])
+        st.dataframe(
+            phases_df[['page', 'phase', 'count', 'p50', 'p95', 'p99']].sort_values(['page', 'p95'], ascending=[True, False]),
+            column_config={
+                'page': "Página",
+                'phase': "Fase",
+                'count': "Ejecuciones",
+                'p50': "p50 (ms)",
+                'p95': "p95 (ms)",
+                'p99': "p99 (ms)"
+            },
+            hide_index=True,
+            use_container_width=True
+        )
+    else:
+        st.info("Todavía no hay ejecuciones perfiladas.")
+
+    st.subheader("Ejecuciones más lentas")
+    slowest = slowest_reruns(20)
+    if slowest:
+        slowest_df = pd.DataFrame(slowest)
+        slowest_df['seconds'] = slowest_df['seconds'].round(2)
+        st.dataframe(
+            slowest_df[['timestamp', 'page', 'seconds', 'user', 'session']],
+            column_config={
+                'timestamp': "Hora",
+                'page': "Página",
+                'seconds': "Segundos",
+                'user': "Usuario",
+                'session': "Sesión"
+            },
+            hide_index=True,
+            use_container_width=True
+        )
+    else:
+        st.info("Todavía no hay ejecuciones registradas.")
+
+with tab_firebase:
+    st.subheader("Latencia de Firebase por operación")
+    pages = sorted({entry['labels'].get('page', '') for entry in metrics['histograms']
+                    if entry['name'] == 'firebase_latency_seconds'})
+    page_filter = st.selectbox("Página de origen", ["Todas"] + pages)
+
+    by = ('op', 'path') if page_filter == "Todas" else ('op', 'path', 'page')
+    latency = aggregate_histograms('firebase_latency_seconds', by)
+    if latency:
+        latency_df = pd.DataFrame(latency)
+        if page_filter != "Todas":
+            latency_df = latency_df[latency_df['page'] == page_filter].drop(columns='page')
+        latency_df = to_ms(latency_df, ['p50', 'p95', 'p99'])
+
+        for counter in ['firebase_errors_total', 'firebase_response_bytes_total', 'firebase_request_bytes_total']:
+            totals = counters_frame(metrics, counter, by)
+            if page_filter != "Todas":
+                totals = totals[totals['page'] == page_filter].drop(columns='page')
+            latency_df = latency_df.merge(totals, on=['op', 'path'], how='left')
+        latency_df = latency_df.fillna(0)
+        latency_df['bajado'] = latency_df['firebase_response_bytes_total'].map(format_bytes)
+        latency_df['subido'] = latency_df['firebase_request_bytes_total'].map(format_bytes)
+
+        st.dataframe(
+            latency_df[['op', 'path', 'count', 'firebase_errors_total', 'p50', 'p95', 'p99', 'bajado', 'subido']]
+                .sort_values('p95', ascending=False),
+            column_config={
+                'op': "Operación",
+                'path': "Ruta",
+                'count': "Llamadas",
+                'firebase_errors_total': "Errores",
+                'p50': "p50 (ms)",
+                'p95': "p95 (ms)",
+                'p99': "p99 (ms)",
+                'bajado': "Descargado",
+                'subido': "Enviado"
+            },
+            hide_index=True,
+            use_container_width=True
+        )
+    else:
+        st.info("Todavía no hay llamadas a Firebase registradas.")
+
+with tab_cache:
+    st.subheader("Aciertos de caché por función")
+    cache_df = counters_frame(metrics, 'cache_requests_total', ('function', 'result'))
+    if not cache_df.empty:
+        cache_df = cache_df.pivot_table(
+            index='function', columns='result', values='cache_requests_total', aggfunc='sum', fill_value=0
+        ).reindex(columns=['hit', 'miss'], fill_value=0).reset_index()
+        total = cache_df['hit'] + cache_df['miss']
+        cache_df['tasa'] = (cache_df['hit'] / total * 100).round(1)
+        st.dataframe(
+            cache_df.sort_values('tasa'),
+            column_config={
+                'function': "Función",
+                'hit': "Aciertos",
+                'miss': "Fallos",
+                'tasa': st.column_config.ProgressColumn("Tasa de aciertos", format="%.1f%%", min_value=0, max_value=100)
+            },
+            hide_index=True,
+            use_container_width=True
+        )
+    else:
+        st.info("Todavía no hay llamadas a funciones en caché registradas.")
+
+with tab_sessions:
+    memory = process_memory()
+    sessions = session_stats()
+
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Sesiones activas", len(sessions))
+    col2.metric("Memoria del proceso", format_bytes(memory['rss_bytes']))
+    col3.metric("Pico de memoria", format_bytes(memory['peak_rss_bytes']))
+
+    st.subheader("Memoria por sesión")
+    st.caption("Tamaño aproximado de st.session_state de cada sesión. No incluye la caché compartida.")
+    if sessions:
+        sessions_df = pd.DataFrame(sessions)
+        sessions_df['memoria'] = sessions_df['bytes'].map(format_bytes)
+        st.dataframe(
+            sessions_df[['session', 'user', 'page', 'keys', 'memoria']],
+            column_config={
+                'session': "Sesión",
+                'user': "Usuario",
+                'page': "Página",
+                'keys': "Claves",
+                'memoria': "Memoria"
+            },
+            hide_index=True,
+            use_container_width=True
+        )
+    else:
+        st.info("No hay sesiones activas.")
+
+with tab_courses:
+    st.subheader("Caché por curso")
+    course_emails = admin_get_student_group_emails()
+    if not course_emails:
+        st.warning("No se encontraron cursos disponibles.")
+    else:
+        selected_course = st.selectbox(
+            "Curso",
+            options=course_emails,
+            format_func=lambda x: x.capitalize().split('@')[0]
+        )
+
+        col_warm, col_invalidate = st.columns(2)
+        with col_warm:
+            if st.button("🔥 Calentar caché", use_container_width=True,
+                         help="Carga estudiantes, asistencia y módulos del curso para que la próxima visita no espere a Firebase."):
+                with st.spinner("Cargando datos del curso..."):
+                    try:
+                        warm_course(selected_course)
+                        st.success("Caché del curso cargada.")
+                    except Exception as e:
+                        st.error(f"Error al calentar la caché: {str(e)}")
+        with col_invalidate:
+            if st.button("♻️ Invalidar caché", use_container_width=True,
+                         help="Marca estudiantes, asistencia y módulos del curso como actualizados; la próxima lectura irá a Firebase."):
+                try:
+                    invalidate_course(selected_course)
+                    st.success("Caché del curso invalidada.")
+                except Exception as e:
+                    st.error(f"Error al invalidar la caché: {str(e)}")
+
+        versions = pd.DataFrame([
+            {'tabla': table, 'version': admin_get_last_updated(table, selected_course) or "N/D"}
+            for table in COURSE_TABLES
+        ])
+        st.dataframe(
+            versions,
+            column_config={'tabla': "Tabla", 'version': "Última actualización"},
+            hide_index=True,
+            use_container_width=True
+        )
+
+        st.subheader("Resumen de todos los cursos")
+        overview_days = st.number_input("Días de asistencia a resumir", min_value=1, max_value=365, value=30)
+        if st.button("📊 Generar resumen", use_container_width=True,
+                     help="Lee todos los cursos en paralelo y muestra cada uno en cuanto llega."):
+            progress = st.progress(0.0, text="Leyendo cursos...")
+            table_placeholder = st.empty()
+            overview_rows = []
+            try:
+                for row in stream_course_overview(course_emails, int(overview_days)):
+                    overview_rows.append(row)
+                    progress.progress(len(overview_rows) / len(course_emails),
+                                      text=f"{len(overview_rows)} de {len(course_emails)} cursos")
+                    overview_df = pd.DataFrame(overview_rows).sort_values('curso')
+                    overview_df['curso'] = overview_df['curso'].str.split('@').str[0].str.capitalize()
+                    table_placeholder.dataframe(
+                        overview_df,
+                        column_config={
+                            'curso': "Curso",
+                            'estudiantes': "Estudiantes",
+                            'dias_con_asistencia': "Días con asistencia",
+                            'asistencia_promedio': st.column_config.ProgressColumn(
+                                "Asistencia promedio", format="percent", min_value=0.0, max_value=1.0
+                            )
+                        },
+                        hide_index=True,
+                        use_container_width=True
+                    )
+                progress.empty()
+            except Exception as e:
+                progress.empty()
+                st.error(f"Error al generar el resumen: {str(e)}")
+
+        st.subheader("Ids de estudiantes")
+        if st.button("🆔 Migrar listas de estudiantes", use_container_width=True,
+                     help="Convierte las listas de estudiantes guardadas por posición en mapas con ids estables (y la asistencia ligada a esas posiciones). Solo se hace una vez por curso."):
+            with st.spinner("Migrando listas de estudiantes..."):
+                try:
+                    migrated = migrate_legacy_rosters(course_emails)
+                    if migrated:
+                        st.success(f"Cursos migrados: {', '.join(course.split('@')[0].capitalize() for course in migrated)}")
+                    else:
+                        st.info("Todos los cursos ya usan ids estables.")
+                except Exception as e:
+                    st.error(f"Error al migrar las listas de estudiantes: {str(e)}")
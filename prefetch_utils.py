@@ -0,0 +1,79 @@
+# prefetch_utils.py
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from auth_utils import thread_token_source, use_token_source
+from log_utils import get_logger
+from metrics_utils import REGISTRY, current_page
+
+logger = get_logger(__name__)
+
+# Firebase calls are I/O bound; a few threads per page run are enough to
+# overlap them without flooding the connection pool when many sessions load at once
+MAX_WORKERS = 4
+
+REGISTRY.describe('page_prefetch_seconds', 'Wall time of the concurrent data loads at the top of a page.')
+
+
+def session_thread_initializer():
+    """
+    Build a thread pool initializer that attaches the current session's
+    ScriptRunContext to each worker, so work submitted on behalf of this
+    session can read st.session_state and use st.cache_data. On a thread
+    without a context, the workers get the thread's token source instead.
+    """
+    ctx = get_script_run_ctx(suppress_warning=True)
+    source = thread_token_source()
+
+    def attach_context():
+        if ctx is not None:
+            add_script_run_ctx(threading.current_thread(), ctx)
+        use_token_source(source)
+
+    return attach_context
+
+
+def prefetch(loaders: dict, max_workers: int = MAX_WORKERS) -> tuple:
+    """
+    Run a page's independent data loads concurrently and wait for all of them.
+
+    Each loader fetches its own metadata version and then calls the versioned,
+    cached loader (e.g. `admin_load_students(course, admin_get_last_updated(...))`),
+    so results land in the same st.cache_data entries the sequential code uses,
+    and the page waits for the slowest load instead of the sum of all of them.
+
+    Worker threads get the session's ScriptRunContext, so loaders can read
+    st.session_state (the user token) and use st.cache_data like the page does.
+
+    Args:
+        loaders (dict): {name: callable with no arguments}.
+        max_workers (int): Upper bound on the number of threads.
+
+    Returns:
+        tuple: ({name: result} for the loaders that succeeded,
+                {name: exception} for the ones that raised).
+    """
+    results = {}
+    errors = {}
+    if not loaders:
+        return results, errors
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(loaders)), thread_name_prefix="prefetch",
+                            initializer=session_thread_initializer()) as pool:
+        futures = {name: pool.submit(loader) for name, loader in loaders.items()}
+
+    for name, future in futures.items():
+        error = future.exception()
+        if error is None:
+            results[name] = future.result()
+        else:
+            logger.warning("Prefetch of %s failed: %s", name, error)
+            errors[name] = error
+
+    elapsed = time.perf_counter() - started
+    REGISTRY.observe('page_prefetch_seconds', elapsed, page=current_page())
+    logger.debug("Prefetched %s in %.3f s", ", ".join(loaders), elapsed)
+    return results, errors
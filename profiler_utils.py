@@ -0,0 +1,236 @@
+# profiler_utils.py
+
+import cProfile
+import datetime
+import io
+import json
+import os
+import pstats
+import re
+import threading
+import time
+from contextlib import contextmanager
+import pandas as pd
+import streamlit as st
+from config import PROFILER_CONFIG
+from log_utils import get_logger
+from metrics_utils import REGISTRY
+
+logger = get_logger(__name__)
+
+# Session flag that turns the profiler on for one session (set from pages/6_Admin.py)
+SESSION_FLAG = "_profile_pages"
+SAMPLES_FILE = "page_profiles.jsonl"
+TOP_FUNCTIONS = 25
+
+REGISTRY.describe('page_phase_seconds', 'Time spent in each named phase of a profiled page run.')
+
+# Only one cProfile profiler can be active per process on Python 3.12+
+# (sys.monitoring), so concurrent runs skip cProfile instead of failing.
+# On those versions the stats may also include work from other threads.
+_cprofile_lock = threading.Lock()
+_slowest_lock = threading.Lock()
+_slowest = {} # page -> [(seconds, run_id), ...] of the runs whose cProfile stats were kept
+_active = threading.local()
+
+
+def profiling_enabled() -> bool:
+    """Whether page runs of the current session are profiled."""
+    return PROFILER_CONFIG["enabled"] or st.session_state.get(SESSION_FLAG, False)
+
+
+class _NullProfiler:
+    """Stand-in returned when profiling is off; every call is a no-op."""
+
+    def mark(self, phase_name):
+        pass
+
+    @contextmanager
+    def phase(self, phase_name):
+        yield
+
+
+class PageProfiler:
+    """
+    Times the named phases of one page run and optionally records cProfile stats.
+
+    Phases are laps: `mark(name)` ends the current phase and starts `name`.
+    Time before the first mark is reported as `first_phase`.
+    """
+
+    def __init__(self, page_name: str, first_phase: str = "inicio"):
+        self.page = page_name
+        self.started = time.perf_counter()
+        self.timestamp = datetime.datetime.now()
+        self.phases = {}
+        self._phase = first_phase
+        self._phase_started = self.started
+        self._cprofile = None
+
+        if PROFILER_CONFIG["cprofile"] and _cprofile_lock.acquire(blocking=False):
+            try:
+                self._cprofile = cProfile.Profile()
+                self._cprofile.enable()
+            except ValueError:
+                # Another profiling tool is active (e.g. a debugger)
+                self._cprofile = None
+                _cprofile_lock.release()
+
+    def _close_phase(self):
+        now = time.perf_counter()
+        self.phases[self._phase] = self.phases.get(self._phase, 0.0) + now - self._phase_started
+        self._phase_started = now
+
+    def mark(self, phase_name: str):
+        """End the current phase and start `phase_name`."""
+        self._close_phase()
+        self._phase = phase_name
+
+    @contextmanager
+    def phase(self, phase_name: str):
+        """Time a block as `phase_name`, then go back to the enclosing phase."""
+        previous = self._phase
+        self.mark(phase_name)
+        try:
+            yield
+        finally:
+            self.mark(previous)
+
+    def finish(self) -> dict:
+        """
+        Stop timing and build the run report.
+
+        Returns:
+            dict: {'page', 'timestamp', 'seconds', 'phases': {name: seconds},
+                   'profile': top functions by cumulative time or None, 'profile_file': path or None}
+        """
+        self._close_phase()
+        seconds = time.perf_counter() - self.started
+
+        stats = None
+        if self._cprofile is not None:
+            self._cprofile.disable()
+            _cprofile_lock.release()
+            stats = pstats.Stats(self._cprofile)
+
+        report = {
+            'page': self.page,
+            'timestamp': self.timestamp.isoformat(timespec='seconds'),
+            'seconds': seconds,
+            'phases': {name: value for name, value in self.phases.items() if value > 0},
+            'profile': None,
+            'profile_file': None
+        }
+        for phase_name, value in report['phases'].items():
+            REGISTRY.observe('page_phase_seconds', value, page=self.page, phase=phase_name)
+
+        if stats is not None and _is_among_slowest(self.page, seconds, report['timestamp']):
+            report['profile'] = _top_functions(stats)
+            report['profile_file'] = _dump_stats(stats, self.page, self.timestamp)
+
+        _append_sample(report)
+        return report
+
+
+def _is_among_slowest(page_name, seconds, run_id) -> bool:
+    """Keep cProfile stats only for the PROFILER_CONFIG["keep_slowest"] slowest runs of each page."""
+    keep = PROFILER_CONFIG["keep_slowest"]
+    with _slowest_lock:
+        kept = _slowest.setdefault(page_name, [])
+        if len(kept) < keep:
+            kept.append((seconds, run_id))
+            return True
+        fastest = min(kept)
+        if seconds <= fastest[0]:
+            return False
+        kept.remove(fastest)
+        kept.append((seconds, run_id))
+        return True
+
+
+def _top_functions(stats: pstats.Stats) -> str:
+    stream = io.StringIO()
+    stats.stream = stream
+    stats.sort_stats('cumulative').print_stats(TOP_FUNCTIONS)
+    return stream.getvalue()
+
+
+def _dump_stats(stats: pstats.Stats, page_name: str, timestamp: datetime.datetime):
+    """Write the stats in pstats format (readable with pstats or snakeviz)."""
+    safe_page = re.sub(r'[^\w-]', '_', page_name)
+    path = os.path.join(PROFILER_CONFIG["output_dir"], f"{safe_page}-{timestamp:%Y%m%d-%H%M%S-%f}.prof")
+    try:
+        os.makedirs(PROFILER_CONFIG["output_dir"], exist_ok=True)
+        stats.dump_stats(path)
+        return path
+    except OSError as e:
+        logger.warning("Could not write profile %s: %s", path, e)
+        return None
+
+
+def _append_sample(report: dict):
+    """Append one JSON line per profiled run (the cProfile text stays in the .prof file)."""
+    sample = {key: value for key, value in report.items() if key != 'profile'}
+    path = os.path.join(PROFILER_CONFIG["output_dir"], SAMPLES_FILE)
+    try:
+        os.makedirs(PROFILER_CONFIG["output_dir"], exist_ok=True)
+        with open(path, 'a', encoding='utf-8') as samples:
+            samples.write(json.dumps(sample, ensure_ascii=False) + '\n')
+    except OSError as e:
+        logger.warning("Could not write profile sample to %s: %s", path, e)
+
+
+def page_profiler(page_name: str, first_phase: str = "inicio"):
+    """
+    Start profiling the current page run, if profiling is enabled.
+
+    Home.py finishes the profiler after pg.run() (also on st.stop()/st.rerun()),
+    so pages only need to call `mark()` at their phase boundaries.
+
+    Args:
+        page_name (str): Name used in the report and metrics.
+        first_phase (str): Name of the phase that starts now.
+
+    Returns:
+        PageProfiler or _NullProfiler: Object with `mark(name)` and `phase(name)`.
+    """
+    if not profiling_enabled():
+        return _NullProfiler()
+    finish_page_profile() # A page started twice in one run: close the previous one
+    profiler = PageProfiler(page_name, first_phase)
+    _active.profiler = profiler
+    return profiler
+
+
+def finish_page_profile():
+    """
+    Finish the profiler started by the current run, if any.
+
+    Returns:
+        dict or None: The run report (see PageProfiler.finish).
+    """
+    profiler = getattr(_active, 'profiler', None)
+    if profiler is None:
+        return None
+    _active.profiler = None
+    try:
+        return profiler.finish()
+    except Exception as e:
+        logger.warning("Could not finish page profile for %s: %s", profiler.page, e)
+        return None
+
+
+def show_profile(report: dict):
+    """Render a collapsible breakdown of a run report at the bottom of the page."""
+    with st.expander(f"⏱️ Perfil de esta ejecución: {report['seconds'] * 1000:.0f} ms"):
+        phases = pd.DataFrame(
+            [{'Fase': name, 'ms': round(value * 1000, 1)} for name, value in report['phases'].items()]
+        )
+        if not phases.empty:
+            phases['%'] = (phases['ms'] / (report['seconds'] * 1000) * 100).round(1)
+            st.dataframe(phases, hide_index=True, use_container_width=True)
+        if report['profile']:
+            st.caption("Una de las ejecuciones más lentas de esta página: funciones por tiempo acumulado.")
+            st.code(report['profile'], language=None)
+            if report['profile_file']:
+                st.caption(f"Guardado en {report['profile_file']}")
@@ -0,0 +1,469 @@
+# report_parser.py
+#
+# Single-pass parser for Microsoft Teams attendance reports. The report is
+# tab separated and split in numbered sections; only "2. Participants" is
+# read:
+#
+#   1. Summary
+#   ...
+#   2. Participants
+#   Name  First Join  Last Leave  In-Meeting Duration  Email  Participant ID (UPN)  Role
+#   ...one row per participant...
+#   3. In-Meeting Activities
+#   ...
+
+#
+# The module only uses the standard library, so the worker processes of
+# process_reports start quickly (they import just this file).
+
+import codecs
+import collections
+import csv
+import datetime
+import functools
+import hashlib
+import io
+import multiprocessing
+import os
+import re
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+# Batches smaller than this are parsed on the calling thread: handing files
+# to worker processes costs more than it saves for a few reports
+PARALLEL_MIN_FILES = 4
+MAX_WORKERS = os.cpu_count() or 2
+
+# Parsed reports kept for reuse, keyed by (user, digest) so each user only
+# reuses their own uploads; the size bounds the whole process (see process_reports)
+PARSED_CACHE_SIZE = 256
+
+# Archive members are decompressed in memory; larger ones are refused (zip bombs)
+MAX_MEMBER_BYTES = 50 * 1024 * 1024
+MAX_ARCHIVE_MEMBERS = 1000
+
+# Bytes sampled to pick the codec of a file without a BOM
+SNIFF_BYTES = 64 * 1024
+# Longest BOMs first: the UTF-32 LE BOM starts with the UTF-16 LE one
+BOMS = [
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16')
+]
+
+START_MARKER = "2. participants"
+END_MARKER = "3. in-meeting activities"
+
+# Header cell (lowercase) -> row field
+COLUMNS = {
+    'name': 'name',
+    'first join': 'first_join',
+    'last leave': 'last_leave',
+    'in-meeting duration': 'duration',
+    'duration': 'duration',
+    'email': 'email',
+    'participant id (upn)': 'upn',
+    'role': 'role'
+}
+TIME_FORMATS = ['%m/%d/%y, %I:%M:%S %p', '%m/%d/%Y, %I:%M:%S %p', '%m/%d/%y, %H:%M:%S', '%m/%d/%Y, %H:%M:%S']
+DURATION_PATTERN = re.compile(r'(?:(\d+)\s*h)?\s*(?:(\d+)\s*m(?!s))?\s*(?:(\d+)\s*s)?')
+
+
+class ReportFormatError(ValueError):
+    """The report has no readable "2. Participants" section. The message is shown to the user."""
+
+
+# Process-wide worker pool, started on the first large batch and shared by every session
+_pool = None
+_pool_lock = threading.Lock()
+
+# {(user, content hash): participant names}, least recently used first
+_parsed_lock = threading.Lock()
+_parsed_names = collections.OrderedDict()
+
+
+# Many rows share the same leave time (the end of the meeting)
+@functools.lru_cache(maxsize=4096)
+def parse_report_time(value: str):
+    """'6/2/25, 6:00:00 PM' -> datetime, or None if the format is not recognized."""
+    value = value.strip()
+    for time_format in TIME_FORMATS:
+        try:
+            return datetime.datetime.strptime(value, time_format)
+        except ValueError:
+            continue
+    return None
+
+
+def parse_duration(value: str):
+    """'1h 2m 3s' (any part optional) -> timedelta, or None if there is no duration."""
+    match = DURATION_PATTERN.fullmatch(value.strip())
+    if not match or not any(match.groups()):
+        return None
+    hours, minutes, seconds = (int(part or 0) for part in match.groups())
+    return datetime.timedelta(hours=hours, minutes=minutes, seconds=seconds)
+
+
+def _is_header(cells: list) -> bool:
+    line_norm = "\t".join(cells).strip().lower()
+    return "name" in line_norm and ("first join" in line_norm or "last leave" in line_norm
+                                    or "email" in line_norm or "duration" in line_norm)
+
+
+def iter_participants(lines, filename_for_debug: str = "", parse_times: bool = True):
+    """
+    Yield the participant rows of a report in one pass over its lines.
+
+    Section markers, the header and the rows are recognized while reading, so
+    nothing is buffered: rows are yielded as their lines are read and reading
+    stops at "3. In-Meeting Activities".
+
+    Args:
+        lines: Iterable of text lines (an open text file, a decoding wrapper, a list).
+        filename_for_debug (str): File name used in error messages.
+        parse_times (bool): Convert join/leave times and duration. Callers that
+                            only need names can skip the conversion.
+
+    Yields:
+        dict: {'name', 'email', 'upn', 'role', 'first_join', 'last_leave', 'duration'}.
+              Times are datetimes and duration a timedelta (or the raw strings
+              with parse_times=False); missing values are None.
+
+    Raises:
+        ReportFormatError: The section or its header is missing, or the rows are not valid CSV.
+    """
+    in_section = False
+    fields = None
+    try:
+        for cells in csv.reader(lines, delimiter='\t'):
+            first_cell = cells[0].strip().lower() if cells else ""
+            if not in_section:
+                in_section = first_cell.startswith(START_MARKER)
+                continue
+            if first_cell.startswith(END_MARKER):
+                break
+            if fields is None:
+                if cells and _is_header(cells):
+                    fields = [COLUMNS.get(cell.strip().lower()) for cell in cells]
+                    if 'name' not in fields:
+                        raise ReportFormatError(
+                            f"Columna 'nombre' no encontrada después del análisis en '{filename_for_debug}'. "
+                            f"Columnas encontradas: {[cell.strip().lower() for cell in cells]}"
+                        )
+                continue
+
+            row = dict.fromkeys(('name', 'email', 'upn', 'role', 'first_join', 'last_leave', 'duration'))
+            for field, cell in zip(fields, cells):
+                if field and cell.strip():
+                    row[field] = cell.strip()
+            if not row['name']:
+                continue
+            if parse_times:
+                row['first_join'] = parse_report_time(row['first_join']) if row['first_join'] else None
+                row['last_leave'] = parse_report_time(row['last_leave']) if row['last_leave'] else None
+                row['duration'] = parse_duration(row['duration']) if row['duration'] else None
+            yield row
+    except csv.Error as e:
+        raise ReportFormatError(f"Error analizando datos CSV de la sección 'Participantes' de '{filename_for_debug}': {e}") from e
+
+    if not in_section:
+        raise ReportFormatError(f"No se pudo encontrar el marcador de sección '2. Participants' en '{filename_for_debug}'.")
+    if fields is None:
+        raise ReportFormatError(f"No se pudo encontrar la fila de encabezado en el archivo: {filename_for_debug}")
+
+
+def detect_encoding(data, sample_size: int = SNIFF_BYTES) -> str:
+    """
+    Pick the codec of an uploaded report from its BOM or, without one, from a
+    bounded prefix, so the file is decoded once with the right codec.
+
+    Teams exports UTF-16 with a BOM. Files re-saved by other tools are usually
+    UTF-8 (with or without BOM) or Windows-1252.
+
+    Args:
+        data (bytes | binary file): The report. A file is read from its start and rewound.
+        sample_size (int): Bytes to inspect when there is no BOM.
+
+    Returns:
+        str: A codec name for io.TextIOWrapper / bytes.decode.
+    """
+    if isinstance(data, (bytes, bytearray)):
+        sample = bytes(data[:sample_size])
+    else:
+        data.seek(0)
+        sample = data.read(sample_size)
+        data.seek(0)
+
+    for bom, encoding in BOMS:
+        if sample.startswith(bom):
+            return encoding
+
+    # UTF-16 without BOM: ASCII text has a zero in every other byte
+    if len(sample) >= 2:
+        half = len(sample) // 2
+        if sample[1::2].count(0) > half * 0.4:
+            return 'utf-16-le'
+        if sample[0::2].count(0) > half * 0.4:
+            return 'utf-16-be'
+
+    try:
+        # final=False: a character cut at the end of the sample is not an error
+        codecs.getincrementaldecoder('utf-8')().decode(sample, final=False)
+        return 'utf-8'
+    except UnicodeDecodeError:
+        pass
+    try:
+        sample.decode('cp1252')
+        return 'cp1252'
+    except UnicodeDecodeError:
+        # Every byte is valid latin-1
+        return 'latin-1'
+
+
+def read_participants(data, filename_for_debug: str = "", parse_times: bool = True, encoding: str = None) -> list:
+    """
+    Decode and parse an uploaded report.
+
+    The codec is picked once by detect_encoding, and the bytes are decoded
+    incrementally while they are parsed; the decoded text is never held as one string.
+
+    Args:
+        data (bytes | binary file): The uploaded report (e.g. an UploadedFile).
+        filename_for_debug (str): File name used in error messages.
+        parse_times (bool): See iter_participants.
+        encoding (str, optional): Codec to use instead of detecting it.
+
+    Returns:
+        list: Participant rows (see iter_participants).
+
+    Raises:
+        UnicodeError: The file is not valid in the detected codec (e.g. truncated UTF-16).
+        ReportFormatError: The file decodes but has no participants section or header.
+    """
+    stream = io.BytesIO(data) if isinstance(data, (bytes, bytearray)) else data
+    encoding = encoding or detect_encoding(stream)
+    stream.seek(0)
+    text = io.TextIOWrapper(stream, encoding=encoding, newline='')
+    try:
+        return list(iter_participants(text, filename_for_debug, parse_times))
+    finally:
+        # Leave the caller's stream open
+        text.detach()
+
+
+def participant_names(rows) -> list:
+    """Unique participant names, in report order."""
+    return list(dict.fromkeys(row['name'] for row in rows))
+
+
+def extract_date_from_filename(filename: str) -> datetime.date | None:
+    """Meeting date from a Teams report name ('... Attendance report MM-DD-YY.csv'), or None."""
+    patterns = [
+        r'(Informe de Asistencia )',
+        r'(Attendance report )'
+    ]
+    for pattern in patterns:
+        match_keyword = re.search(pattern, filename, re.IGNORECASE)
+        if match_keyword:
+            date_str_candidate = filename[match_keyword.end():]
+            match_date = re.match(r'(\d{1,2})-(\d{1,2})-(\d{2})', date_str_candidate)
+            if match_date:
+                month, day, year_short = map(int, match_date.groups())
+                year = 2000 + year_short
+                try:
+                    return datetime.date(year, month, day)
+                except ValueError:
+                    return None
+    return None
+
+
+def process_report(filename: str, data: bytes) -> dict:
+    """
+    Date from the file name, then codec detection, decoding and parsing of one report.
+
+    Runs in the worker processes of process_reports, so it returns a plain,
+    picklable dict instead of raising or talking to Streamlit.
+
+    Returns:
+        dict: {'filename', 'date', 'names', 'status', 'message'}. 'status' is 'ok',
+              'no_date', 'decode_error' or 'format_error'; 'message' explains the error.
+    """
+    result = {'filename': filename, 'date': extract_date_from_filename(os.path.basename(filename)), 'names': [],
+              'status': 'ok', 'message': None}
+    if not result['date']:
+        result['status'] = 'no_date'
+        return result
+    try:
+        result['names'] = participant_names(read_participants(data, filename, parse_times=False))
+    except UnicodeError as e:
+        result['status'] = 'decode_error'
+        result['message'] = str(e)
+    except ReportFormatError as e:
+        result['status'] = 'format_error'
+        result['message'] = str(e)
+    return result
+
+
+def _process_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: forking the multithreaded server process could deadlock the children
+            _pool = ProcessPoolExecutor(max_workers=MAX_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+        return _pool
+
+
+def _discard_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def is_archive(filename: str, data: bytes) -> bool:
+    """Whether an upload is a ZIP archive (by extension or by its signature)."""
+    return filename.lower().endswith('.zip') or data[:4] == b'PK\x03\x04'
+
+
+def _archive_error(key, filename: str, message: str) -> dict:
+    return {'key': key, 'digest': None, 'filename': filename, 'date': None, 'names': [],
+            'status': 'archive_error', 'message': message}
+
+
+def expand_archives(files: list) -> tuple:
+    """
+    Replace the ZIP archives of an upload batch with the reports they contain.
+
+    Members are read from the uploaded bytes in memory, never extracted to
+    disk. Folders, non-CSV members and macOS metadata (__MACOSX, ._ files) are
+    ignored; members keep their archive path in the displayed file name, while
+    the meeting date still comes from the member's own name.
+
+    Args:
+        files (list): (key, filename, bytes) tuples, as for process_reports.
+
+    Returns:
+        tuple: (files, errors). `files` has the plain reports plus one (key, filename, bytes)
+               tuple per archive member, keyed (archive key, member path); `errors` has one
+               'archive_error' result (see process_report) per archive that could not be read.
+    """
+    expanded = []
+    errors = []
+    for key, filename, data in files:
+        if not is_archive(filename, data):
+            expanded.append((key, filename, data))
+            continue
+        try:
+            with zipfile.ZipFile(io.BytesIO(data)) as archive:
+                members = [
+                    info for info in archive.infolist()
+                    if not info.is_dir()
+                    and info.filename.lower().endswith('.csv')
+                    and not info.filename.startswith('__MACOSX/')
+                    and not os.path.basename(info.filename).startswith('._')
+                ]
+                if not members:
+                    errors.append(_archive_error(key, filename, "El archivo ZIP no contiene reportes CSV."))
+                    continue
+                if len(members) > MAX_ARCHIVE_MEMBERS:
+                    errors.append(_archive_error(key, filename, f"El archivo ZIP tiene más de {MAX_ARCHIVE_MEMBERS} reportes."))
+                    continue
+                for info in members:
+                    member_name = f"{filename}/{info.filename}"
+                    if info.file_size > MAX_MEMBER_BYTES:
+                        errors.append(_archive_error((key, info.filename), member_name, "El reporte es demasiado grande."))
+                        continue
+                    expanded.append(((key, info.filename), member_name, archive.read(info)))
+        except (zipfile.BadZipFile, zipfile.LargeZipFile, NotImplementedError, RuntimeError) as e:
+            # NotImplementedError: unsupported compression; RuntimeError: encrypted member
+            errors.append(_archive_error(key, filename, str(e)))
+    return expanded, errors
+
+
+def report_digest(data: bytes) -> str:
+    """Content hash of an uploaded report: the key of the parsed-report cache."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def _cached_names(user: str, digest: str):
+    with _parsed_lock:
+        names = _parsed_names.get((user, digest))
+        if names is not None:
+            _parsed_names.move_to_end((user, digest))
+        return names
+
+
+def _store_names(user: str, digest: str, names: list):
+    with _parsed_lock:
+        _parsed_names[(user, digest)] = names
+        _parsed_names.move_to_end((user, digest))
+        while len(_parsed_names) > PARSED_CACHE_SIZE:
+            _parsed_names.popitem(last=False)
+
+
+def process_reports(files: list, user: str = None, max_workers: int = MAX_WORKERS):
+    """
+    Process a batch of uploaded reports in parallel and yield each result as it completes.
+
+    Reports are identified by content: a report this user already uploaded
+    (in this or an earlier rerun or session, under any file name) is served from a
+    bounded LRU cache without parsing it again, and a changed file always
+    misses the cache. The meeting date still comes from each file's own name.
+
+    Parsing is CPU bound, so large batches go to a pool of worker processes
+    (one per core) instead of threads. Small batches are processed inline.
+    If the pool breaks (e.g. a worker was killed), the remaining files are
+    processed inline.
+
+    Args:
+        files (list): (key, filename, bytes) tuples; `key` identifies the upload for the caller.
+                      ZIP archives must be expanded first (expand_archives).
+        user (str, optional): Owner of the cache entries (the logged-in email).
+        max_workers (int): 1 processes everything on the calling thread.
+
+    Yields:
+        dict: process_report results plus 'key' and 'digest', in completion order.
+    """
+    to_parse = []
+    for key, filename, data in files:
+        digest = report_digest(data)
+        names = _cached_names(user, digest)
+        file_date = extract_date_from_filename(os.path.basename(filename))
+        if names is not None and file_date:
+            yield {'key': key, 'digest': digest, 'filename': filename, 'date': file_date,
+                   'names': list(names), 'status': 'ok', 'message': None}
+        else:
+            to_parse.append((key, digest, filename, data))
+
+    def finish(result, key, digest):
+        if result['status'] == 'ok':
+            _store_names(user, digest, result['names'])
+        return {**result, 'key': key, 'digest': digest}
+
+    if len(to_parse) < PARALLEL_MIN_FILES or max_workers <= 1:
+        for key, digest, filename, data in to_parse:
+            yield finish(process_report(filename, data), key, digest)
+        return
+
+    futures = {_process_pool().submit(process_report, filename, data): n for n, (_, _, filename, data) in enumerate(to_parse)}
+    finished = set()
+    try:
+        for future in as_completed(futures):
+            n = futures[future]
+            result = future.result()
+            finished.add(n)
+            yield finish(result, to_parse[n][0], to_parse[n][1])
+    except BrokenProcessPool:
+        _discard_pool()
+        for n, (key, digest, filename, data) in enumerate(to_parse):
+            if n not in finished:
+                yield finish(process_report(filename, data), key, digest)
+    finally:
+        # The caller stopped early (or a rerun interrupted it)
+        for future in futures:
+            future.cancel()
@@ -0,0 +1,479 @@
+# roster_utils.py
+
+import datetime
+import random
+import threading
+import time
+import numpy as np
+import pandas as pd
+from config import db
+from auth_utils import current_token
+from diff_utils import diff_frames, build_patch
+from log_utils import get_logger, log_payload
+from metrics_utils import cached
+
+logger = get_logger(__name__)
+
+# Fields every stored student record is expected to have
+STUDENT_OPTIONAL_FIELDS = {
+    'email': '',
+    'canvas_id': '',
+    'telefono': '',
+    'modulo': '',
+    'ciclo': '',
+    'fecha_inicio': None,
+    'fecha_fin': None
+}
+
+# Declared roster schema: column -> kind ('text', 'category' or 'date')
+ROSTER_SCHEMA = {
+    'nombre': 'text',
+    'email': 'text',
+    'canvas_id': 'text',
+    'telefono': 'text',
+    'modulo': 'category',
+    'ciclo': 'category',
+    'fecha_inicio': 'date',
+    'fecha_fin': 'date'
+}
+
+ROSTER_COLUMN_ORDER = ['nombre', 'email', 'canvas_id', 'telefono', 'modulo', 'fecha_inicio', 'ciclo']
+
+_PUSH_CHARS = '-0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ_abcdefghijklmnopqrstuvwxyz'
+_id_lock = threading.Lock()
+_last_id_time = 0
+_last_id_rand = []
+
+
+def new_student_id() -> str:
+    """
+    Generate a Firebase-style push id for a student.
+
+    Ids start with the creation time, so sorting them keeps the roster in
+    insertion order, and ids made within the same millisecond still increase.
+
+    Returns:
+        str: A 20 character id.
+    """
+    global _last_id_time, _last_id_rand
+    with _id_lock:
+        now = int(time.time() * 1000)
+        if now == _last_id_time:
+            i = len(_last_id_rand) - 1
+            while _last_id_rand[i] == 63:
+                _last_id_rand[i] = 0
+                i -= 1
+            _last_id_rand[i] += 1
+        else:
+            _last_id_rand = [random.randrange(64) for _ in range(12)]
+        _last_id_time = now
+
+        time_chars = []
+        for _ in range(8):
+            time_chars.append(_PUSH_CHARS[now % 64])
+            now //= 64
+        return ''.join(reversed(time_chars)) + ''.join(_PUSH_CHARS[c] for c in _last_id_rand)
+
+
+def assign_student_ids(students_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Make the DataFrame index the student id, generating ids for new rows.
+
+    Rows that came from Firebase keep their (string) id; rows added in the
+    app carry a default integer label and get a fresh id.
+
+    Args:
+        students_df (pd.DataFrame): Students, indexed by id where known.
+
+    Returns:
+        pd.DataFrame: A copy indexed by string ids (index name 'id').
+    """
+    df = students_df.copy()
+    df.index = pd.Index(
+        [label if isinstance(label, str) and label else new_student_id() for label in df.index],
+        name='id'
+    )
+    return df
+
+
+def roster_frame(roster) -> pd.DataFrame:
+    """
+    Build a DataFrame indexed by student id from a `students/{course}/data` node.
+
+    Args:
+        roster (dict or list): Id-keyed map of records (or a legacy positional list).
+
+    Returns:
+        pd.DataFrame: One row per student, index name 'id'. Empty if there are no records.
+    """
+    if isinstance(roster, list):
+        records = {str(i): record for i, record in enumerate(roster) if isinstance(record, dict)}
+    elif isinstance(roster, dict):
+        records = {str(key): record for key, record in roster.items() if isinstance(record, dict)}
+    else:
+        records = {}
+
+    df = pd.DataFrame.from_dict(records, orient='index')
+    df.index.name = 'id'
+    return df
+
+
+def migrate_roster_to_ids(course_key: str, roster_list: list) -> dict:
+    """
+    One-time migration of a positional roster list to an id-keyed map.
+
+    Attendance days stored by roster position ({"0": "presente", ...}) are
+    remapped to the new ids in the same multi-path update, and the students
+    and attendance versions are bumped so cached copies are reloaded.
+
+    Args:
+        course_key (str): Course key under 'students' (email with ',' instead of '.').
+        roster_list (list): The stored positional list of student records.
+
+    Returns:
+        dict: The id-keyed roster that was written.
+    """
+    position_to_id = {}
+    roster = {}
+    for position, record in enumerate(roster_list):
+        if isinstance(record, dict):
+            student_id = new_student_id()
+            position_to_id[str(position)] = student_id
+            roster[student_id] = record
+
+    patch = {f"students/{course_key}/data": roster}
+
+    attendance = db.child("attendance").child(course_key).get(token=current_token()).val() or {}
+    for date_key, day in attendance.items():
+        if isinstance(day, list):
+            if any(isinstance(entry, dict) and 'Nombre' in entry for entry in day):
+                continue  # Name-based records, not tied to positions
+            entries = {str(i): entry for i, entry in enumerate(day) if entry is not None}
+        elif isinstance(day, dict):
+            entries = day
+        else:
+            continue
+
+        if entries and all(key in position_to_id for key in entries):
+            patch[f"attendance/{course_key}/{date_key}"] = {
+                position_to_id[key]: entry for key, entry in entries.items()
+            }
+
+    now_iso = datetime.datetime.now(datetime.timezone.utc).isoformat()
+    for table_name in ('students', 'attendance'):
+        patch[f"metadata/{table_name}/{course_key}/last_updated"] = now_iso
+        patch[f"metadata/{table_name}/last_updated"] = now_iso
+
+    db.update(patch, token=current_token())
+    return roster
+
+
+def migrate_legacy_rosters(course_keys: list) -> list:
+    """
+    Run `migrate_roster_to_ids` for every course whose roster is still a positional list.
+
+    An explicit admin action: loaders only read, and keep using the list
+    positions as ids (they are valid keys of the stored list) until then.
+
+    Args:
+        course_keys (list): Course keys under 'students'.
+
+    Returns:
+        list: The course keys that were migrated.
+    """
+    migrated = []
+    for course_key in course_keys:
+        roster = db.child("students").child(course_key).child("data").get(token=current_token()).val()
+        if isinstance(roster, list):
+            migrate_roster_to_ids(course_key, roster)
+            migrated.append(course_key)
+    return migrated
+
+
+def parse_dates(values: pd.Series) -> pd.Series:
+    """
+    Parse a column of stored dates into datetime64, leaving unparseable values as NaT.
+
+    Dates are stored as 'YYYY-MM-DD'; older records may carry a time part or
+    another format, and only those fall back to the slower mixed-format parser.
+
+    Args:
+        values (pd.Series): Strings, Timestamps or empty values.
+
+    Returns:
+        pd.Series: datetime64 column.
+    """
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        values = values.astype(object)
+    parsed = pd.to_datetime(values, format='%Y-%m-%d', errors='coerce')
+    retry = np.flatnonzero(parsed.isna().to_numpy() & values.notna().to_numpy())
+    if len(retry):
+        candidates = values.iloc[retry].astype(str).str.strip()
+        parsed.iloc[retry] = pd.to_datetime(candidates.where(candidates.ne('')), format='mixed', errors='coerce').to_numpy()
+    return parsed
+
+
+def normalize_roster(students_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Apply the roster schema to a students DataFrame in one pass.
+
+    Text columns become stripped strings ('' when empty), `modulo` and `ciclo`
+    become categoricals and dates become datetime64. Missing schema columns are
+    added and the usual columns are moved to the front.
+
+    Args:
+        students_df (pd.DataFrame): Students indexed by id, with a 'nombre' column.
+
+    Returns:
+        pd.DataFrame: The normalized roster.
+    """
+    df = students_df.copy()
+    df.columns = df.columns.str.lower().str.strip()
+
+    for col in ROSTER_SCHEMA:
+        if col not in df.columns:
+            df[col] = None
+
+    text_cols = [col for col, kind in ROSTER_SCHEMA.items() if kind == 'text']
+    category_cols = [col for col, kind in ROSTER_SCHEMA.items() if kind == 'category']
+    date_cols = [col for col, kind in ROSTER_SCHEMA.items() if kind == 'date']
+
+    for col in text_cols + category_cols:
+        values = df[col]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            values = values.astype(object)
+        elif pd.api.types.is_float_dtype(values) and (values.dropna() % 1 == 0).all():
+            values = values.astype('Int64').astype(object)  # 1.0 -> '1', not '1.0'
+        values = values.fillna('').astype(str).str.strip()
+        df[col] = values.astype('category') if col in category_cols else values
+    for col in date_cols:
+        df[col] = parse_dates(df[col])
+
+    return df[[col for col in ROSTER_COLUMN_ORDER if col in df.columns] +
+              [col for col in df.columns if col not in ROSTER_COLUMN_ORDER]]
+
+
+def attendance_presence(day, roster: pd.DataFrame) -> pd.Series:
+    """
+    Presence of every roster student on one stored attendance day.
+
+    Args:
+        day (dict or list): `attendance/{course}/{date}` as read, either {student_id: 'presente'|'ausente'}
+                            or the legacy list of {'Nombre', 'Presente'} records of older uploads.
+        roster (pd.DataFrame): Students indexed by id, with a 'nombre' column.
+
+    Returns:
+        pd.Series: Booleans named 'Presente', indexed by student id, in roster order.
+                   Students missing from the day are absent.
+    """
+    ids = pd.Index(roster.index.astype(str), name='id')
+    if isinstance(day, list):
+        records = pd.DataFrame(
+            [record for record in day if isinstance(record, dict) and 'Nombre' in record],
+            columns=['Nombre', 'Presente']
+        )
+        by_name = records.drop_duplicates('Nombre', keep='last').set_index('Nombre')['Presente']
+        status = roster['nombre'].map(by_name)
+    elif isinstance(day, dict):
+        status = pd.Series(ids, index=roster.index).map(day)
+    else:
+        status = pd.Series(None, index=roster.index, dtype=object)
+    return pd.Series(status.isin([True, 'presente']).to_numpy(), index=ids, name='Presente')
+
+
+def attendance_day_patch(course_key: str, date_key: str, loaded: pd.Series, edited: pd.Series,
+                         rewrite: bool = False) -> dict:
+    """
+    Multi-path update that saves an edited attendance day.
+
+    Only the students whose presence changed are written, one child each
+    (`attendance/{course}/{date}/{student_id}`), so two people editing
+    different students of the same day do not overwrite each other. A day
+    stored in the legacy list format, or not stored yet, cannot take child
+    writes and is written whole, id-keyed, once (`rewrite`). The attendance
+    version is bumped in the same update.
+
+    Args:
+        course_key (str): Course key under 'attendance'.
+        date_key (str): Day as 'YYYY-MM-DD'.
+        loaded (pd.Series): Presence shown when the editor opened (see attendance_presence).
+        edited (pd.Series): Presence after editing, same index.
+        rewrite (bool): Write the whole day instead of the changed students.
+
+    Returns:
+        dict: {'patch': the multi-path update (empty if nothing changed),
+               'changes': {student_id: 'presente'|'ausente'} that it writes,
+               'last_updated': the new attendance version, or None if nothing changed}.
+    """
+    edited = edited.fillna(False).astype(bool)
+    if rewrite:
+        changed_ids = edited.index
+    else:
+        changed_ids = list(diff_frames(loaded.to_frame(), edited.to_frame(), key=None)['changed'])
+    changes = {str(student_id): 'presente' if edited[student_id] else 'ausente' for student_id in changed_ids}
+    if not changes:
+        return {'patch': {}, 'changes': {}, 'last_updated': None}
+
+    base_path = f"attendance/{course_key}/{date_key}"
+    if rewrite:
+        patch = {base_path: changes}
+    else:
+        patch = {f"{base_path}/{student_id}": status for student_id, status in changes.items()}
+    now_iso = datetime.datetime.now(datetime.timezone.utc).isoformat()
+    patch[f"metadata/attendance/{course_key}/last_updated"] = now_iso
+    patch["metadata/attendance/last_updated"] = now_iso
+    return {'patch': patch, 'changes': changes, 'last_updated': now_iso}
+
+
+def attendance_batch_patch(course_key: str, attendance_by_date: dict) -> dict:
+    """
+    Multi-path update that writes several attendance days of a course at once,
+    with the attendance version bump in the same (atomic) update.
+
+    Each day is written whole, id-keyed ({student_id: 'presente'|'ausente'}),
+    replacing what was stored for it.
+
+    Args:
+        course_key (str): Course key under 'attendance'.
+        attendance_by_date (dict): {datetime.date: presence Series indexed by student id}.
+
+    Returns:
+        dict: The update payload, relative to the database root.
+    """
+    patch = {
+        f"attendance/{course_key}/{date.strftime('%Y-%m-%d')}": {
+            str(student_id): 'presente' if present else 'ausente'
+            for student_id, present in presence.fillna(False).astype(bool).items()
+        }
+        for date, presence in attendance_by_date.items()
+    }
+    now_iso = datetime.datetime.now(datetime.timezone.utc).isoformat()
+    patch[f"metadata/attendance/{course_key}/last_updated"] = now_iso
+    patch["metadata/attendance/last_updated"] = now_iso
+    return patch
+
+
+@cached(show_spinner=False)
+def load_roster_version(course_key: str, last_updated):
+    """
+    Read and normalize one version of a course roster.
+
+    Cached per (course, version), so the normalization runs once per roster
+    change no matter how many pages or sessions read it.
+    Only reads: a legacy positional roster keeps its list positions as ids
+    until an admin migrates it (see `migrate_legacy_rosters`).
+
+    Args:
+        course_key (str): Course key under 'students' (email with ',' instead of '.').
+        last_updated (str): The students version from metadata, used as cache key.
+
+    Returns:
+        tuple: (DataFrame indexed by student id, filename) or (None, None) if there is no data
+    """
+    data = db.child("students").child(course_key).get(token=current_token()).val()
+    if not data or 'data' not in data:
+        return None, None
+
+    df = roster_frame(data['data'])
+    if df.empty:
+        return None, None
+
+    df.columns = df.columns.str.lower().str.strip()
+    if 'nombre' not in df.columns:
+        logger.warning("Roster of %s has no 'nombre' column; treating it as empty", course_key)
+        return None, None
+
+    df = normalize_roster(df)
+    log_payload(logger, f"load_roster_version students/{course_key}", df)
+    return df, data.get('filename', 'students.xlsx')
+
+
+def prepare_roster(students_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Normalize a students DataFrame into the shape that is stored in Firebase.
+
+    Every column is converted once (numeric -> Python numbers, datetime -> 'YYYY-MM-DD',
+    everything else -> stripped strings) and empty cells become None.
+
+    Args:
+        students_df (pd.DataFrame): Students as loaded or edited in the app, indexed by id.
+
+    Returns:
+        pd.DataFrame: An object-dtype copy indexed by student id.
+    """
+    df = assign_student_ids(students_df)
+
+    for field, default_value in STUDENT_OPTIONAL_FIELDS.items():
+        if field not in df.columns:
+            df[field] = default_value
+
+    df['nombre'] = df['nombre'].astype(str).str.strip()
+
+    for col in df.columns:
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype(object)
+        if ROSTER_SCHEMA.get(col) == 'date':
+            df[col] = parse_dates(df[col]).dt.strftime('%Y-%m-%d')
+        elif pd.api.types.is_numeric_dtype(df[col]):
+            df[col] = df[col].astype('object').where(df[col].notna(), None)
+        elif pd.api.types.is_datetime64_any_dtype(df[col]):
+            df[col] = pd.to_datetime(df[col]).dt.strftime('%Y-%m-%d')
+        else:
+            df[col] = df[col].fillna('').astype(str).str.strip()
+
+    df = df.astype(object)
+    return df.where(df.notna() & df.ne(''), None)
+
+
+def roster_payload(students_df: pd.DataFrame) -> dict:
+    """
+    Build the full `students/{course}` node for a roster (used when replacing it).
+
+    Args:
+        students_df (pd.DataFrame): Students to store.
+
+    Returns:
+        dict: Node with filename, id-keyed data, timestamp and metadata.
+    """
+    df = prepare_roster(students_df)
+    return {
+        'filename': 'students.xlsx',
+        'data': df.to_dict('index'),
+        'timestamp': datetime.datetime.utcnow().isoformat() + 'Z',
+        'metadata': {
+            'version': '2.0',
+            'fields': list(df.columns),
+            'record_count': len(df)
+        }
+    }
+
+
+def build_roster_patch(old_df: pd.DataFrame, new_df: pd.DataFrame) -> dict:
+    """
+    Compute the multi-path update that turns the stored roster `old_df` into `new_df`.
+
+    Rows are matched by student id: edited cells become "data/<id>/<field>" paths,
+    new students become "data/<id>" and removed students are set to None.
+
+    Args:
+        old_df (pd.DataFrame): The roster as it was loaded from Firebase.
+        new_df (pd.DataFrame): The roster to store (new rows may lack an id).
+
+    Returns:
+        dict: Update payload relative to `students/{course}`, empty if nothing changed.
+    """
+    old = prepare_roster(old_df)
+    new = prepare_roster(new_df)
+
+    diff = diff_frames(old, new, key=None)
+    patch = {f"data/{path}": value for path, value in build_patch(diff, empty=None).items()}
+    if not patch:
+        return {}
+
+    patch['timestamp'] = datetime.datetime.utcnow().isoformat() + 'Z'
+    patch['metadata/record_count'] = len(new)
+    if list(new.columns) != list(old.columns):
+        patch['metadata/fields'] = list(new.columns)
+    return patch
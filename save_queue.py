@@ -0,0 +1,167 @@
+# save_queue.py
+
+import collections
+import threading
+import time
+import streamlit as st
+from config import db
+from auth_utils import token_source
+from log_utils import get_logger
+from metrics_utils import REGISTRY
+
+logger = get_logger(__name__)
+
+# Session state key of the session's SaveQueue
+SESSION_KEY = "save_queue"
+# Attempts per write, and the wait before each retry (network errors, Firebase hiccups)
+MAX_ATTEMPTS = 3
+RETRY_SECONDS = (1, 4)
+# How often the status fragment checks for finished writes while some are pending
+POLL_SECONDS = 1
+
+REGISTRY.describe('save_queue_total', 'Background writes, by result (ok/retry/error).')
+REGISTRY.describe('save_queue_seconds', 'Time from queueing a background write to its completion.')
+
+
+class SaveQueue:
+    """
+    One session's background writes. A worker thread performs them in order
+    (so two saves of the same data land in the order they were made), retries
+    failures and records the outcome; the page shows outcomes as toasts on its
+    next run instead of sleeping so a toast stays visible before st.rerun().
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._jobs = collections.deque()
+        self._outcomes = collections.deque()
+        self._notices = collections.deque()
+        self._worker = None
+
+    def submit(self, label: str, write, on_failure=None):
+        """
+        Queue a write.
+
+        Args:
+            label (str): What is saved, for the confirmation ("3 reporte(s) de asistencia").
+            write (callable): Performs the write; raises on failure. Runs on the worker thread,
+                              without the session's context: it must not use st.session_state,
+                              which a rerun of the session may be stopping at that moment.
+            on_failure (callable, optional): Called on the script thread when the write finally
+                                             fails, to drop optimistic session state.
+        """
+        with self._lock:
+            self._jobs.append((label, write, on_failure, time.perf_counter()))
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="save-queue", daemon=True)
+                self._worker.start()
+
+    def notify(self, message: str, icon: str = "✅"):
+        """Show a toast on the next run (for synchronous saves followed by st.rerun())."""
+        with self._lock:
+            self._notices.append((message, icon))
+
+    @property
+    def busy(self) -> bool:
+        """Whether writes are queued or in progress."""
+        with self._lock:
+            return bool(self._jobs) or (self._worker is not None and self._worker.is_alive())
+
+    def drain(self) -> tuple:
+        """
+        Take the outcomes not shown yet.
+
+        Returns:
+            tuple: (notices, outcomes). notices are (message, icon); outcomes are
+                   {'label', 'ok', 'error', 'on_failure'} dicts, in completion order.
+        """
+        with self._lock:
+            notices, outcomes = list(self._notices), list(self._outcomes)
+            self._notices.clear()
+            self._outcomes.clear()
+        return notices, outcomes
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._jobs:
+                    self._worker = None
+                    return
+                label, write, on_failure, queued_at = self._jobs[0]
+            error = self._attempt(label, write)
+            REGISTRY.observe('save_queue_seconds', time.perf_counter() - queued_at)
+            with self._lock:
+                self._jobs.popleft()
+                self._outcomes.append({'label': label, 'ok': error is None, 'error': error, 'on_failure': on_failure})
+
+    def _attempt(self, label: str, write):
+        """Perform one write with retries. Returns None on success, else the last error message."""
+        for attempt in range(MAX_ATTEMPTS):
+            try:
+                write()
+                REGISTRY.inc('save_queue_total', result='ok')
+                return None
+            except Exception as e:
+                error = str(e) or type(e).__name__
+                if attempt + 1 < MAX_ATTEMPTS:
+                    REGISTRY.inc('save_queue_total', result='retry')
+                    logger.warning("Save of %s failed (attempt %d), retrying: %s", label, attempt + 1, error)
+                    time.sleep(RETRY_SECONDS[min(attempt, len(RETRY_SECONDS) - 1)])
+        REGISTRY.inc('save_queue_total', result='error')
+        logger.error("Save of %s failed after %d attempts: %s", label, MAX_ATTEMPTS, error)
+        return error
+
+
+def session_save_queue() -> SaveQueue:
+    """The current session's SaveQueue, created on first use."""
+    if SESSION_KEY not in st.session_state:
+        st.session_state[SESSION_KEY] = SaveQueue()
+    return st.session_state[SESSION_KEY]
+
+
+def enqueue_update(label: str, patch: dict, on_failure=None):
+    """
+    Queue a multi-path update of the database root (paths like 'attendance/{course}/{date}').
+
+    The patch is built by the caller on the script thread; only the network
+    write happens in the background, with the token current at write time.
+    """
+    token = token_source()
+    session_save_queue().submit(label, lambda: db.update(patch, token=token()), on_failure)
+
+
+def notify(message: str, icon: str = "✅"):
+    """Show a toast on the next run of this session. See SaveQueue.notify."""
+    session_save_queue().notify(message, icon)
+
+
+@st.fragment(run_every=POLL_SECONDS)
+def _poll_save_queue():
+    # Rerun the page once the writes land: the next run shows their outcomes and reloads the saved data
+    if not st.session_state[SESSION_KEY].busy:
+        st.rerun()
+
+
+def show_save_status():
+    """
+    Show the outcomes of this session's saves: a toast per finished write (or
+    notice) and an error, kept until the next run, per write that failed after
+    its retries. Called by Home.py before each page; while writes are pending a
+    small fragment polls for them without rerunning the page.
+    """
+    queue = st.session_state.get(SESSION_KEY)
+    if queue is None:
+        return
+    notices, outcomes = queue.drain()
+    for message, icon in notices:
+        st.toast(message, icon=icon)
+    for outcome in outcomes:
+        if outcome['ok']:
+            st.toast(f"¡Guardado: {outcome['label']}!", icon="✅")
+            continue
+        st.toast(f"Error al guardar {outcome['label']}", icon="❌")
+        st.error(f"No se pudo guardar {outcome['label']} después de {MAX_ATTEMPTS} intentos: {outcome['error']}")
+        if outcome['on_failure'] is not None:
+            outcome['on_failure']()
+    if queue.busy:
+        _poll_save_queue()
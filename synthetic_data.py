@@ -0,0 +1,308 @@
+# synthetic_data.py
+
+import argparse
+import datetime
+import json
+import random
+import unicodedata
+import uuid
+
+# Course keys as they appear under 'students' ('.' is stored as ',')
+COURSE_NAMES = ['cba1', 'cba2', 'pct', 'database', 'havc']
+COURSE_DOMAIN = 'iti,edu'
+
+FIRST_NAMES = [
+    'José', 'María', 'Luis', 'Ana', 'Carlos', 'Lucía', 'Jorge', 'Sofía', 'Andrés', 'Valentina',
+    'Miguel', 'Camila', 'Héctor', 'Daniela', 'Ramón', 'Gabriela', 'Iván', 'Mariana', 'Raúl', 'Paola',
+    'Juan Carlos', 'Ana María', 'Luis Ángel', 'María José', 'Ángel', 'Inés', 'Óscar', 'Verónica'
+]
+LAST_NAMES = [
+    'García', 'Rodríguez', 'Martínez', 'Hernández', 'López', 'González', 'Pérez', 'Sánchez',
+    'Ramírez', 'Torres', 'Flores', 'Rivera', 'Gómez', 'Díaz', 'Cruz', 'Morales', 'Ortiz',
+    'Gutiérrez', 'Chávez', 'Ramos', 'Ruiz', 'Mendoza', 'Álvarez', 'Castillo', 'Jiménez', 'Muñoz',
+    'De la Cruz', 'Del Valle', 'Núñez', 'Peña'
+]
+MODULE_NAMES = [
+    'Introducción a la Computación', 'Microsoft Word', 'Microsoft Excel', 'Microsoft PowerPoint',
+    'Microsoft Access', 'Contabilidad Básica', 'Servicio al Cliente', 'Inglés Técnico',
+    'Redes Básicas', 'Seguridad Informática', 'Bases de Datos', 'Ética Profesional'
+]
+
+_PUSH_CHARS = '-0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ_abcdefghijklmnopqrstuvwxyz'
+
+
+def push_id(timestamp_ms: int, rng: random.Random) -> str:
+    """
+    Build a Firebase-style push id from a timestamp and a random generator.
+
+    Args:
+        timestamp_ms (int): Creation time in milliseconds since the epoch.
+        rng (random.Random): Source of the 12 random characters.
+
+    Returns:
+        str: A 20 character id that sorts by `timestamp_ms`.
+    """
+    time_chars = []
+    for _ in range(8):
+        time_chars.append(_PUSH_CHARS[timestamp_ms % 64])
+        timestamp_ms //= 64
+    return ''.join(reversed(time_chars)) + ''.join(rng.choice(_PUSH_CHARS) for _ in range(12))
+
+
+def _iso_utc(moment: datetime.datetime) -> str:
+    return moment.replace(tzinfo=datetime.timezone.utc).isoformat()
+
+
+def _timestamp_ms(moment: datetime.datetime) -> int:
+    return int(moment.replace(tzinfo=datetime.timezone.utc).timestamp() * 1000)
+
+
+def course_keys(courses: int) -> list:
+    """Course keys for `courses` courses: the real course codes first, then 'curso6', 'curso7'..."""
+    names = COURSE_NAMES[:courses] + [f'curso{n}' for n in range(len(COURSE_NAMES) + 1, courses + 1)]
+    return [f'{name}@{COURSE_DOMAIN}' for name in names]
+
+
+def _generate_breaks(rng, history_start, end_date):
+    """One or two break weeks inside the history window, starting on Mondays."""
+    breaks = {}
+    span = (end_date - history_start).days
+    for n in range(1 if span < 120 else 2):
+        offset = rng.randrange(14, max(15, span - 14))
+        start = history_start + datetime.timedelta(days=offset)
+        start -= datetime.timedelta(days=start.weekday())
+        created = datetime.datetime.combine(start - datetime.timedelta(days=30), datetime.time(9, 0))
+        breaks[f"break_{created:%Y%m%d%H%M%S}_{n:06d}"] = {
+            'name': 'Semana de Descanso' if n == 0 else 'Vacaciones de Verano',
+            'start_date': start.isoformat(),
+            'duration_weeks': 1 if n == 0 else 2,
+            'created_at': created.isoformat(),
+            'created_by': 'admin@iti.edu'
+        }
+    return breaks
+
+
+def _break_days(breaks):
+    days = set()
+    for break_data in breaks.values():
+        start = datetime.date.fromisoformat(break_data['start_date'])
+        for offset in range(break_data['duration_weeks'] * 7):
+            days.add(start + datetime.timedelta(days=offset))
+    return days
+
+
+def _generate_modules(rng, history_start, end_date, created):
+    """Consecutive modules from the start of the history until past end_date (so "today" has a module)."""
+    modules = {}
+    start = history_start - datetime.timedelta(days=history_start.weekday())
+    order = 0
+    while order < 6 or start <= end_date:
+        order += 1
+        weeks = rng.choice([3, 4, 5])
+        end = start + datetime.timedelta(days=weeks * 7 - 3) # Friday of the last week
+        key = push_id(_timestamp_ms(created) + order, rng)
+        name = MODULE_NAMES[(order - 1) % len(MODULE_NAMES)]
+        modules[key] = {
+            'name': name,
+            'description': f'Módulo {order}: {name}',
+            'duration_weeks': weeks,
+            'credits': order,
+            'fecha_inicio_1': start.isoformat(),
+            'fecha_fin_1': end.isoformat(),
+            'created_at': created.isoformat(),
+            'module_id': str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+            'firebase_key': key
+        }
+        start += datetime.timedelta(days=weeks * 7)
+    return modules
+
+
+def _generate_roster(rng, course_key, students, modules, created):
+    """Id-keyed roster node, in the format written by roster_utils.roster_payload."""
+    module_list = sorted(modules.items(), key=lambda item: item[1]['credits'])
+    last_key, last_module = module_list[-1]
+    used_names = set()
+    data = {}
+    base_ms = _timestamp_ms(created)
+
+    for n in range(students):
+        while True:
+            first = rng.choice(FIRST_NAMES)
+            last = f"{rng.choice(LAST_NAMES)} {rng.choice(LAST_NAMES)}"
+            nombre = f"{first} {last}"
+            if nombre not in used_names:
+                used_names.add(nombre)
+                break
+        start_key, start_module = rng.choice(module_list)
+        slug = unicodedata.normalize('NFKD', nombre.lower()).encode('ascii', 'ignore').decode().replace(' ', '.')
+        student_id = push_id(base_ms + n, rng)
+        data[student_id] = {
+            'nombre': nombre,
+            'email': f"{slug}{n}@students.iti.edu",
+            'canvas_id': str(rng.randrange(100000, 999999)),
+            'telefono': f"787{rng.randrange(1000000, 9999999)}",
+            'modulo': start_module['name'],
+            'ciclo': rng.choice(['1', '2']),
+            'fecha_inicio': start_module['fecha_inicio_1'],
+            'fecha_fin': last_module['fecha_fin_1'],
+            'modulo_id': start_key,
+            'modulo_fin_order': last_module['credits'],
+            'modulo_fin_id': last_key,
+            'modulo_fin_name': last_module['name']
+        }
+
+    fields = ['nombre', 'email', 'canvas_id', 'telefono', 'modulo', 'ciclo', 'fecha_inicio', 'fecha_fin',
+              'modulo_id', 'modulo_fin_order', 'modulo_fin_id', 'modulo_fin_name']
+    return {
+        'filename': f"{course_key.split('@')[0]}.xlsx",
+        'data': data,
+        'timestamp': _iso_utc(created).replace('+00:00', 'Z'),
+        'metadata': {'version': '2.0', 'fields': fields, 'record_count': len(data)}
+    }
+
+
+def _generate_attendance(rng, roster, class_days, legacy_days):
+    """
+    Attendance per class day. The oldest `legacy_days` days use the legacy
+    list format ({'Nombre', 'Presente'}); the rest use {student_id: status}.
+    """
+    rates = {student_id: rng.uniform(0.6, 0.98) for student_id in roster['data']}
+    attendance = {}
+    for n, day in enumerate(class_days):
+        date_key = day.isoformat()
+        if n < legacy_days:
+            attendance[date_key] = [
+                {'Nombre': student['nombre'], 'Presente': rng.random() < rates[student_id]}
+                for student_id, student in roster['data'].items()
+            ]
+        else:
+            attendance[date_key] = {
+                student_id: 'presente' if rng.random() < rate else 'ausente'
+                for student_id, rate in rates.items()
+            }
+    return attendance
+
+
+def teams_report(names: list, meeting_date: datetime.date = None) -> str:
+    """
+    Build the text of a Teams attendance report with `names` as participants.
+
+    The layout (tab separated, "2. Participants" and "3. In-Meeting Activities"
+    sections) is what report_parser.read_participants reads. Teams exports it as UTF-16.
+
+    Args:
+        names (list): Participant names.
+        meeting_date (datetime.date, optional): Date shown in the join/leave columns.
+
+    Returns:
+        str: The report text.
+    """
+    meeting_date = meeting_date or datetime.date(2025, 6, 2)
+    day = f"{meeting_date.month}/{meeting_date.day}/{meeting_date:%y}"
+    lines = [
+        "1. Summary",
+        "Meeting title\tClase",
+        f"Attended participants\t{len(names)}",
+        "",
+        "2. Participants",
+        "Name\tFirst Join\tLast Leave\tIn-Meeting Duration\tEmail\tParticipant ID (UPN)\tRole"
+    ]
+    for n, name in enumerate(names):
+        email = f"student{n}@iti.edu"
+        lines.append(f"{name}\t{day}, 6:00:{n % 60:02d} PM\t{day}, 9:00:00 PM\t3h\t{email}\t{email}\tAttendee")
+    lines += ["", "3. In-Meeting Activities", "Name\tJoin Time\tLeave Time\tDuration\tEmail\tRole"]
+    return "\n".join(lines)
+
+
+def teams_report_filename(meeting_date: datetime.date) -> str:
+    """File name with the date where the attendance pages look for it."""
+    return f"Clase - Attendance report {meeting_date:%m-%d-%y}.csv"
+
+
+def generate_dataset(courses: int = 4, students_per_course: int = 30, days: int = 60,
+                     legacy_ratio: float = 0.25, seed: int = 42, end_date: datetime.date = None) -> dict:
+    """
+    Generate a complete database tree (students, attendance, modules, breaks, metadata).
+
+    The same arguments always produce the same tree. `end_date` defaults to
+    today so that "current module" logic in the app has data to work with;
+    pass a fixed date for byte-for-byte reproducible output across days.
+
+    Args:
+        courses (int): Number of courses.
+        students_per_course (int): Students in each course roster.
+        days (int): Calendar days of attendance history, ending at `end_date`.
+                    Only weekdays outside break weeks get attendance.
+        legacy_ratio (float): Fraction of the oldest class days stored in the legacy list format.
+        seed (int): Random seed.
+        end_date (datetime.date, optional): Last day of history.
+
+    Returns:
+        dict: The tree, ready for FakeFirebase or a JSON dump.
+    """
+    rng = random.Random(seed)
+    end_date = end_date or datetime.date.today()
+    history_start = end_date - datetime.timedelta(days=days - 1)
+    created = datetime.datetime.combine(history_start - datetime.timedelta(days=7), datetime.time(8, 0))
+    last_updated = _iso_utc(datetime.datetime.combine(end_date, datetime.time(18, 0)))
+
+    breaks = _generate_breaks(rng, history_start, end_date)
+    no_class = _break_days(breaks)
+    class_days = [
+        history_start + datetime.timedelta(days=offset)
+        for offset in range(days)
+        if (history_start + datetime.timedelta(days=offset)).weekday() < 5
+        and history_start + datetime.timedelta(days=offset) not in no_class
+    ]
+    legacy_days = int(len(class_days) * legacy_ratio)
+
+    tree = {'students': {}, 'attendance': {}, 'modules': {}, 'breaks': breaks, 'metadata': {}}
+    for table in ['students', 'attendance', 'modules']:
+        tree['metadata'][table] = {'last_updated': last_updated}
+
+    for course_key in course_keys(courses):
+        modules = _generate_modules(rng, history_start, end_date, created)
+        roster = _generate_roster(rng, course_key, students_per_course, modules, created)
+        tree['modules'][course_key] = modules
+        tree['students'][course_key] = roster
+        tree['attendance'][course_key] = _generate_attendance(rng, roster, class_days, legacy_days)
+        for table in ['students', 'attendance', 'modules']:
+            tree['metadata'][table][course_key] = {'last_updated': last_updated}
+
+    return tree
+
+
+def dataset_stats(tree: dict) -> dict:
+    """
+    Count what a generated tree contains.
+
+    Returns:
+        dict: {'courses', 'students', 'attendance_days', 'attendance_records', 'modules', 'breaks', 'json_bytes'}
+    """
+    attendance = tree.get('attendance', {})
+    return {
+        'courses': len(tree.get('students', {})),
+        'students': sum(len(course.get('data', {})) for course in tree.get('students', {}).values()),
+        'attendance_days': sum(len(days) for days in attendance.values()),
+        'attendance_records': sum(len(day) for days in attendance.values() for day in days.values()),
+        'modules': sum(len(modules) for modules in tree.get('modules', {}).values()),
+        'breaks': len(tree.get('breaks', {})),
+        'json_bytes': len(json.dumps(tree, ensure_ascii=False).encode('utf-8'))
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Genera un árbol de datos sintético para pruebas y benchmarks.")
+    parser.add_argument("--courses", type=int, default=4)
+    parser.add_argument("--students", type=int, default=30, help="Estudiantes por curso")
+    parser.add_argument("--days", type=int, default=60, help="Días de historial de asistencia")
+    parser.add_argument("--legacy-ratio", type=float, default=0.25)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--end-date", type=datetime.date.fromisoformat, default=None)
+    parser.add_argument("--out", default="synthetic_data.json")
+    args = parser.parse_args()
+
+    dataset = generate_dataset(args.courses, args.students, args.days, args.legacy_ratio, args.seed, args.end_date)
+    with open(args.out, 'w', encoding='utf-8') as out:
+        json.dump(dataset, out, ensure_ascii=False)
+    print(json.dumps(dataset_stats(dataset)))
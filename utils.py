@@ -1,8 +1,14 @@
+import logging
 import streamlit as st
 import pandas as pd
 from config import db # Assuming db is your Firebase Realtime Database reference from config.py
 import datetime # Added for type hinting and date operations
-from auth_utils import require_auth
+from auth_utils import require_auth, current_token
+from roster_utils import roster_payload, build_roster_patch, load_roster_version, attendance_day_patch
+from log_utils import get_logger, log_payload
+from metrics_utils import cached
+
+logger = get_logger(__name__)
 
 @require_auth
 def get_last_updated(table_name, user_email=None):
@@ -18,13 +24,13 @@ def get_last_updated(table_name, user_email=None):
     if user_email:
         user_email = user_email.replace('.', ',')
         ref = db.child("metadata").child(table_name).child(user_email)
-        snapshot = ref.get(token=st.session_state.user_token)
+        snapshot = ref.get(token=current_token())
         if snapshot.val() is not None:
             metadata = snapshot.val()
         else:
             return None
     else:
-        metadata = db.child("metadata").child(table_name).get(token=st.session_state.user_token).val()
+        metadata = db.child("metadata").child(table_name).get(token=current_token()).val()
     if metadata and 'last_updated' in metadata:
         return metadata['last_updated']
     else:
@@ -45,73 +51,25 @@ def set_last_updated(table_name, user_email=None):
         user_email = user_email.replace('.', ',')
         db.child("metadata").child(table_name).child(user_email).update({
             'last_updated': now_iso
-        }, token=st.session_state.user_token)
+        }, token=current_token())
     else:
         db.child("metadata").child(table_name).update({
             'last_updated': now_iso
-        }, token=st.session_state.user_token)
+        }, token=current_token())
     return now_iso
     
-@st.cache_data
 def load_students(students_last_updated):
     """
     Load students data from Firebase and ensure all required fields are present.
+
+    The roster is normalized once per version (see roster_utils.load_roster_version).
     
     Returns:
         tuple: (DataFrame with student data, filename) or (None, None) if error or no data
     """
     try:
         user_email = st.session_state.email.replace('.', ',')
-        if 'call_count' not in st.session_state:
-            st.session_state.call_count = 0
-        data = db.child("students").child(user_email).get(token=st.session_state.user_token).val()
-        st.session_state.call_count += 1
-        print(f"\n{st.session_state.call_count} ---data from firebase----\n", data)
-
-        if not data or 'data' not in data:
-            return None, None
-            
-        # Create DataFrame from records
-        df = pd.DataFrame(data['data'])
-        
-        # Normalize column names
-        df.columns = df.columns.str.lower().str.strip()
-        
-        # Ensure required columns exist
-        if 'nombre' not in df.columns:
-            st.error("Error: El archivo debe contener una columna 'nombre'")
-            return None, None
-            
-        # Clean and standardize data
-        df['nombre'] = df['nombre'].astype(str).str.strip()
-        
-        # Initialize optional fields if they don't exist
-        optional_fields = {
-            'email': '',
-            'canvas_id': '',
-            'telefono': '',
-            'modulo': '',
-            'ciclo': '',
-            'fecha_inicio': None
-        }
-        
-        for field, default_value in optional_fields.items():
-            if field not in df.columns:
-                df[field] = default_value
-            else:
-                # Clean up the data
-                if field == 'fecha_inicio' and pd.api.types.is_datetime64_any_dtype(df[field]):
-                    # Convert datetime to string for consistency
-                    df[field] = pd.to_datetime(df[field]).dt.strftime('%Y-%m-%d')
-                else:
-                    df[field] = df[field].fillna(default_value if default_value is not None else '').astype(str).str.strip()
-        
-        # Reorder columns for consistency
-        column_order = ['nombre', 'email', 'canvas_id', 'telefono', 'modulo', 'fecha_inicio', 'ciclo']
-        df = df[[col for col in column_order if col in df.columns] + 
-                [col for col in df.columns if col not in column_order]]
-        
-        return df, data.get('filename', 'students.xlsx')
+        return load_roster_version(user_email, students_last_updated)
         
     except Exception as e:
         st.error(f"Error loading students: {str(e)}")
@@ -134,70 +92,16 @@ def save_students(students_df):
             
         user_email = st.session_state.email.replace('.', ',')
         
-        # Create a working copy to avoid modifying the original
-        df = students_df.copy()
-        
-        # Ensure required columns exist
-        if 'nombre' not in df.columns:
+        if 'nombre' not in students_df.columns:
             st.error("Error: Student data must contain a 'nombre' column")
             return False
-            
-        # Initialize optional fields if they don't exist
-        optional_fields = {
-            'email': '',
-            'canvas_id': '',
-            'telefono': '',
-            'modulo': '',
-            'ciclo': '',
-            'fecha_inicio': None
-        }
-        
-        for field, default_value in optional_fields.items():
-            if field not in df.columns:
-                df[field] = default_value
-        
-        # Clean and standardize data
-        df['nombre'] = df['nombre'].astype(str).str.strip()
-        
-        # Convert data types and ensure JSON serialization
-        for col in df.columns:
-            # Handle numeric types
-            if pd.api.types.is_numeric_dtype(df[col]):
-                df[col] = df[col].astype('object').where(df[col].notna(), None)
-            # Handle datetime types
-            elif pd.api.types.is_datetime64_any_dtype(df[col]):
-                df[col] = pd.to_datetime(df[col]).dt.strftime('%Y-%m-%d')
-            # Handle string types
-            else:
-                df[col] = df[col].fillna('').astype(str).str.strip()
-        
-        # Convert to records and ensure all values are JSON-serializable
-        records = []
-        for _, row in df.iterrows():
-            record = {}
-            for key, value in row.items():
-                if pd.isna(value) or value is None or value == '':
-                    record[key] = None
-                else:
-                    record[key] = str(value) if not isinstance(value, (int, float, bool, str)) else value
-            records.append(record)
-        
-        # Prepare data for Firebase
-        data = {
-            'filename': 'students.xlsx',
-            'data': records,
-            'timestamp': datetime.datetime.utcnow().isoformat() + 'Z',
-            'metadata': {
-                'version': '1.0',
-                'fields': list(df.columns),
-                'record_count': len(df)
-            }
-        }
+
+        data = roster_payload(students_df)
         
         # Save to Firebase with error handling
         try:
-            db.child("students").child(user_email).set(data, token=st.session_state.user_token)
-            st.success(f"Successfully saved {len(df)} student records.")
+            db.child("students").child(user_email).set(data, token=current_token())
+            st.success(f"Successfully saved {data['metadata']['record_count']} student records.")
             set_last_updated('students')
             return True
         except Exception as firebase_error:
@@ -206,8 +110,41 @@ def save_students(students_df):
             
     except Exception as e:
         st.error(f"Error saving students: {str(e)}")
-        if 'df' in locals():
-            st.error(f"Columns in DataFrame: {', '.join(df.columns)}")
+        if students_df is not None:
+            st.error(f"Columns in DataFrame: {', '.join(students_df.columns)}")
+        return False
+
+def patch_students(old_df, new_df):
+    """
+    Save only what changed between the loaded roster and the edited one.
+
+    Falls back to `save_students` when there is no stored roster yet.
+
+    Args:
+        old_df (DataFrame): Roster as it was loaded from Firebase
+        new_df (DataFrame): Roster to store
+
+    Returns:
+        bool: True if save was successful (or nothing changed), False otherwise
+    """
+    if old_df is None or old_df.empty:
+        return save_students(new_df)
+
+    try:
+        if 'nombre' not in new_df.columns:
+            st.error("Error: Student data must contain a 'nombre' column")
+            return False
+
+        patch = build_roster_patch(old_df, new_df)
+        if not patch:
+            return True
+
+        user_email = st.session_state.email.replace('.', ',')
+        db.child("students").child(user_email).update(patch, token=current_token())
+        set_last_updated('students')
+        return True
+    except Exception as e:
+        st.error(f"Error saving students: {str(e)}")
         return False
 
 # --- Functions moved from 2_Attendance.py ---
@@ -225,18 +162,20 @@ def save_attendance(date: datetime.date, attendance_data: dict):
         st.error(f"Error saving attendance for {date_str}: {str(e)}")
         return False
 
-@st.cache_data
-def load_attendance(date: datetime.date, attendance_last_updated: str) -> dict:
-    """Load attendance data from Firebase for a specific date."""
+@cached
+def load_attendance(user_email: str, date: datetime.date, attendance_last_updated: str) -> dict:
+    """
+    Load attendance data from Firebase for a specific date.
+
+    The course is an argument (not read from st.session_state) because the
+    cache is shared by every session: it is part of the cache key.
+    """
     try:
-        user_email = st.session_state.email.replace('.', ',')
+        user_email = user_email.replace('.', ',')
         date_str = date.strftime('%Y-%m-%d')
-        raw_data = db.child("attendance").child(user_email).child(date_str).get(token=st.session_state.user_token).val()
+        raw_data = db.child("attendance").child(user_email).child(date_str).get(token=current_token()).val()
 
-        if 'call_count' not in st.session_state:
-            st.session_state.call_count = 0
-        st.session_state.call_count += 1
-        print(f"\n{st.session_state.call_count} ---load attendance data from firebase----\n", raw_data)
+        log_payload(logger, f"load_attendance attendance/{user_email}/{date_str}", raw_data)
         
         if isinstance(raw_data, list):
             # Convert list of records to a dictionary keyed by student name
@@ -260,14 +199,13 @@ def load_attendance(date: datetime.date, attendance_last_updated: str) -> dict:
 
 # --- Module Management Functions ---
 
-@st.cache_data(ttl=3600)
+@cached(ttl=3600)
 def load_modules_from_db(user_email: str) -> pd.DataFrame:
     """Load modules data from Firebase with caching."""
-    print("\n\nload_modules_from_db")
     try:
         user_email_sanitized = user_email.replace('.', ',')
-        modules_data = db.child("modules").child(user_email_sanitized).get(token=st.session_state.user_token).val()
-        print("\n\nmodules_data", modules_data)
+        modules_data = db.child("modules").child(user_email_sanitized).get(token=current_token()).val()
+        log_payload(logger, f"load_modules_from_db modules/{user_email_sanitized}", modules_data)
         
         if not modules_data:
             return pd.DataFrame(columns=['Nombre', 'Duración (semanas)'])
@@ -300,28 +238,27 @@ def save_modules_to_db(user_email: str, modules_df: pd.DataFrame) -> bool:
     """Save modules to Firebase and update session."""
     try:
         user_email_sanitized = user_email.replace('.', ',')
-        db.child("modules").child(user_email_sanitized).set(modules_df.to_dict('records'), token=st.session_state.user_token)
+        db.child("modules").child(user_email_sanitized).set(modules_df.to_dict('records'), token=current_token())
         update_modules_in_session(modules_df)
         return True
     except Exception as e:
         st.error(f"Error saving modules: {str(e)}")
         return False
 
-@st.cache_data
+@cached
 def get_module_name_by_id(user_email: str, module_id: str) -> str:
     """Get the module name by its ID."""
-    print("calling get_module_name_by_id with module_id -", module_id)
     try:
         user_email_sanitized = user_email.replace('.', ',')
-        modules_data = db.child("modules").child(user_email_sanitized).child(module_id).get(token=st.session_state.user_token).val()
-        print("\n-----modules_data from get_module_name_by_id database ---", modules_data)
+        modules_data = db.child("modules").child(user_email_sanitized).child(module_id).get(token=current_token()).val()
+        log_payload(logger, f"get_module_name_by_id modules/{user_email_sanitized}/{module_id}", modules_data, level=logging.DEBUG)
         if modules_data:
             return modules_data.get('name')
         else:
-            print(f"Module with firebase_key '{module_id}' not found for user '{user_email}'.")
+            logger.warning("Module with firebase_key '%s' not found for user '%s'.", module_id, user_email)
             return None
     except Exception as e:
-        print(f"Error getting module name by firebase_key: {e}")
+        logger.error("Error getting module name by firebase_key: %s", e)
         return None
 
 def delete_student(student_nombre_to_delete: str) -> bool:
@@ -350,13 +287,13 @@ def delete_student(student_nombre_to_delete: str) -> bool:
             st.warning(f"Student '{student_nombre_to_delete}' not found in the list.")
             return False
 
-        # Save the modified DataFrame (which overwrites the old list)
-        if save_students(students_to_keep_df):
-            # Note: save_students already calls set_last_updated('students')
+        # Save only the rows that moved or disappeared
+        if patch_students(current_students_df, students_to_keep_df):
+            # Note: patch_students already calls set_last_updated('students')
             st.success(f"Student '{student_nombre_to_delete}' deleted successfully.")
             return True
         else:
-            # save_students would have shown an error
+            # patch_students would have shown an error
             return False
             
     except Exception as e:
@@ -370,27 +307,50 @@ def save_attendance(date: datetime.date, attendance_data: list):
         date_str = date.strftime('%Y-%m-%d')
         # Ensure student names (keys in attendance_data) are safe for Firebase paths if necessary
         # For now, assuming they are simple strings.
-        db.child("attendance").child(user_email).child(date_str).set(attendance_data, token=st.session_state.user_token)
+        db.child("attendance").child(user_email).child(date_str).set(attendance_data, token=current_token())
         set_last_updated('attendance', user_email)
         return True
     except Exception as e:
         st.error(f"Error saving attendance for {date_str}: {str(e)}")
         return False
 
-@st.cache_data
-def get_attendance_dates(attendance_last_updated: str):
+def save_attendance_changes(date_key: str, loaded: pd.Series, edited: pd.Series, rewrite: bool = False):
+    """
+    Save an edited attendance day, writing only the students whose presence changed.
+
+    Args:
+        date_key (str): Day as 'YYYY-MM-DD'.
+        loaded (pd.Series): Presence by student id when the editor opened.
+        edited (pd.Series): Presence by student id after editing.
+        rewrite (bool): Write the whole day (legacy list days and days not stored yet).
+
+    Returns:
+        dict: See roster_utils.attendance_day_patch ('changes' is empty if nothing changed),
+              or None if the write failed.
+    """
+    try:
+        result = attendance_day_patch(st.session_state.email.replace('.', ','), date_key, loaded, edited, rewrite)
+        if result['patch']:
+            db.update(result['patch'], token=current_token())
+        return result
+    except Exception as e:
+        st.error(f"Error saving attendance for {date_key}: {str(e)}")
+        return None
+
+@cached
+def get_attendance_dates(user_email: str, attendance_last_updated: str):
     """
-    Get a list of all dates with saved attendance records.
+    Get a list of all dates with saved attendance records of a course.
     Returns a sorted list of date strings in 'YYYY-MM-DD' format.
+
+    The course is an argument (not read from st.session_state) because the
+    cache is shared by every session: it is part of the cache key.
     """
     try:
-        user_email = st.session_state.email.replace('.', ',')
-        docs = db.child("attendance").child(user_email).get(token=st.session_state.user_token).val()
+        user_email = user_email.replace('.', ',')
+        docs = db.child("attendance").child(user_email).get(token=current_token()).val()
 
-        if 'call_count' not in st.session_state:
-            st.session_state.call_count = 0
-        st.session_state.call_count += 1
-        print(f"\n{st.session_state.call_count} ---get_attendance_dates-data from firebase----\n{str(docs)[:100]}...")
+        log_payload(logger, f"get_attendance_dates attendance/{user_email}", docs)
 
         if not docs:
             return []
@@ -421,7 +381,7 @@ def delete_attendance_dates(dates_to_delete=None, delete_all=False):
     Returns:
         bool: True if at least one deletion was successful, False otherwise.
     """
-    print(f"Intentando eliminar fechas: {dates_to_delete}, delete_all={delete_all} DESDE utils")
+    logger.info("Deleting attendance dates %s (delete_all=%s)", dates_to_delete, delete_all)
     success = False
 
     try:
@@ -431,29 +391,27 @@ def delete_attendance_dates(dates_to_delete=None, delete_all=False):
         if delete_all:
             # This case is for explicitly deleting ALL records for the user
             all_user_records_ref = db.child(user_base_attendance_path)
-            print(f"WARNING: Attempting to delete ALL attendance records at path: {all_user_records_ref.path}")
+            logger.warning("Deleting ALL attendance records at %s", all_user_records_ref.path)
             
             if not all_user_records_ref.path or all_user_records_ref.path == '/' or not all_user_records_ref.path.startswith('attendance/'):
                 st.error(f"CRITICAL SAFETY HALT: Unsafe path for full deletion: '{all_user_records_ref.path}'. Aborting.")
-                print(f"CRITICAL SAFETY HALT: Unsafe full deletion path: {all_user_records_ref.path}")
+                logger.error("Refusing full deletion at unsafe path %s", all_user_records_ref.path)
                 return False
 
             try:
-                all_user_records_ref.remove(token=st.session_state.user_token)
-                print(f"SUCCESS: All attendance records removed at path: {all_user_records_ref.path}")
-                print(f"SUCCESS: Attendance records last updated at: {get_last_updated('attendance')}")
+                all_user_records_ref.remove(token=current_token())
+                logger.info("All attendance records removed at %s", all_user_records_ref.path)
                 set_last_updated('attendance')
-                print(f"SUCCESS: Attendance records last updated at: {get_last_updated('attendance')}")
                 return True
             except Exception as e:
-                print(f"ERROR: Failed to remove all records: {str(e)}")
+                logger.error("Failed to remove all attendance records: %s", e)
                 st.error(f"Error al eliminar todos los registros: {str(e)}")
                 return False
 
         # If no dates provided, we don’t do anything
         if not dates_to_delete:
             st.warning("No dates provided for deletion.")
-            print("INFO: No dates provided, skipping deletion.")
+            logger.info("No dates provided, skipping deletion")
             return False
 
         # Validate and clean dates
@@ -464,36 +422,36 @@ def delete_attendance_dates(dates_to_delete=None, delete_all=False):
                 valid_dates.append(date_str.strip())
             except ValueError:
                 st.warning(f"Formato de fecha inválido: {date_str}. Se omitirá.")
-                print(f"WARNING: Invalid date format '{date_str}' ignored.")
+                logger.warning("Invalid date format %r ignored", date_str)
 
         if not valid_dates:
             st.error("No hay fechas válidas para eliminar después de la validación.")
-            print("ERROR: No valid dates to process after validation.")
+            logger.error("No valid dates to delete after validation")
             return False
 
         # Delete each valid date
         for date_str in valid_dates:
             full_path = f"{user_base_attendance_path}/{date_str}"
             ref_for_get = db.child(full_path)
-            data_snapshot = ref_for_get.get(token=st.session_state.user_token)
+            data_snapshot = ref_for_get.get(token=current_token())
 
             if data_snapshot.val() is not None:
-                print(f"INFO: Removing data at path: {full_path}")
+                logger.info("Removing attendance at %s", full_path)
                 try:
-                    db.child(full_path).remove(token=st.session_state.user_token)
+                    db.child(full_path).remove(token=current_token())
                     set_last_updated('attendance')
                     success = True
                 except Exception as e:
-                    print(f"ERROR: Failed to remove date {date_str}: {str(e)}")
+                    logger.error("Failed to remove attendance date %s: %s", date_str, e)
                     st.error(f"Error al eliminar la fecha {date_str}: {str(e)}")
             else:
-                print(f"INFO: No data found for date {date_str}, skipping.")
+                logger.info("No attendance found for %s, skipping", date_str)
 
         return success
 
     except Exception as e:
         st.error(f"Error deleting attendance records: {str(e)}")
-        print(f"EXCEPTION: {str(e)}")
+        logger.exception("Error deleting attendance records: %s", e)
         return False
 
 def format_date_for_display(date_value):
@@ -564,7 +522,7 @@ def get_student_end_date(all_students_df, student_name):
     
     student_data = matching_students.iloc[0]
     end_date = student_data.get('fecha_fin', 'No especificada')
-    print("\n\nend_date\n", end_date)
+    logger.debug("get_student_end_date %s -> %s", student_name, end_date)
     return format_date_for_display(end_date)
 
 def get_student_modulo_inicio(all_students_df, student_name):
@@ -713,7 +671,7 @@ def date_format(date_value, from_format, to_format='%m/%d/%Y'):
     except (ValueError, TypeError, AttributeError):
         return 'No especificada'
 
-@st.cache_data
+@cached
 def get_highest_module_credit(user_email: str, modules_last_updated: str) -> int:
     """
     Get the highest module credit/order number from all modules.
@@ -726,12 +684,9 @@ def get_highest_module_credit(user_email: str, modules_last_updated: str) -> int
     """
     try:
         # Create a fresh Firebase reference for this operation
-        modules_ref = db.child("modules").child(user_email).get(token=st.session_state.user_token)
+        modules_ref = db.child("modules").child(user_email).get(token=current_token())
 
-        if 'call_count' not in st.session_state:
-            st.session_state.call_count = 0
-        st.session_state.call_count += 1
-        print(f"\n{st.session_state.call_count} ---get_highest_module_credit-data from firebase----\n", modules_ref.val())
+        log_payload(logger, f"get_highest_module_credit modules/{user_email}", modules_ref.val())
         if not modules_ref.val():
             return 0
             
@@ -753,7 +708,7 @@ def get_highest_module_credit(user_email: str, modules_last_updated: str) -> int
         st.error(f"Error al obtener el crédito máximo del módulo: {str(e)}")
         return 0
 
-@st.cache_data
+@cached
 def get_module_on_date(user_email: str, target_date: datetime.date = None) -> dict:
     """
     Finds the module active on a given date for the user.
@@ -765,19 +720,15 @@ def get_module_on_date(user_email: str, target_date: datetime.date = None) -> di
     Returns:
         dict: Module information if found, None otherwise
     """
-    print("\n\ntarget_date\n", target_date)
-    print("\n\nuser_email\n", user_email)
+    logger.debug("get_module_on_date user=%s target_date=%s", user_email, target_date)
 
     if target_date is None:
         target_date = datetime.date.today()
 
     try:
-        modules_ref = db.child("modules").child(user_email).get(token=st.session_state.user_token)
+        modules_ref = db.child("modules").child(user_email).get(token=current_token())
 
-        if 'call_count' not in st.session_state:
-            st.session_state.call_count = 0
-        st.session_state.call_count += 1
-        print(f"\n{st.session_state.call_count} ---get_module_on_date-data from firebase----\n", modules_ref.val())
+        log_payload(logger, f"get_module_on_date modules/{user_email}", modules_ref.val())
 
         modules_data = modules_ref.val()
         if not modules_data:
@@ -812,7 +763,7 @@ def get_module_on_date(user_email: str, target_date: datetime.date = None) -> di
                     }
 
             except (ValueError, TypeError) as e:
-                print(f"Error processing module {module_key}: {e}")
+                logger.warning("Error processing module %s: %s", module_key, e)
                 continue
 
         return None
@@ -823,7 +774,7 @@ def get_module_on_date(user_email: str, target_date: datetime.date = None) -> di
 
 
 
-@st.cache_data
+@cached
 def get_available_modules(user_email: str, modules_last_updated: str) -> list:
     """
     Retrieve and process available modules for a user.
@@ -836,12 +787,9 @@ def get_available_modules(user_email: str, modules_last_updated: str) -> list:
     """
     try:
         # Create a fresh Firebase reference for this operation
-        modules_ref = db.child("modules").child(user_email).get(token=st.session_state.user_token)
+        modules_ref = db.child("modules").child(user_email).get(token=current_token())
 
-        if 'call_count' not in st.session_state:
-            st.session_state.call_count = 0
-        st.session_state.call_count += 1
-        print(f"\n{st.session_state.call_count} ---get_available_modules-data from firebase----\n", modules_ref.val())
+        log_payload(logger, f"get_available_modules modules/{user_email}", modules_ref.val())
         
         if not modules_ref.val():
             return []
@@ -978,7 +926,7 @@ def strip_email_and_map_course(course_email):
     }
     return course_map.get(course, course)
 
-@st.cache_data(ttl=60*60)  # Cache for 1 hour
+@cached(ttl=60*60)  # Cache for 1 hour
 def load_all_attendance(user_email, attendance_last_updated):
     """Load all attendance records for a user at once"""
     try:
@@ -987,7 +935,7 @@ def load_all_attendance(user_email, attendance_last_updated):
         # st.write(f"DEBUG: Inside load_all_attendance. user_email: {user_email}, user_key: {user_key}")
         
         # Get all attendance data for this user
-        all_attendance = db.child("attendance").child(user_key).get(token=st.session_state.user_token).val()
+        all_attendance = db.child("attendance").child(user_key).get(token=current_token()).val()
         # st.write(f"DEBUG: Raw data from Firebase (_db.child('attendance').child('{user_key}').get().val()): {all_attendance}")
         
         # Ensure it's a dictionary even if Firebase returns None
@@ -995,4 +943,121 @@ def load_all_attendance(user_email, attendance_last_updated):
     except Exception as e:
         st.error(f"Error loading attendance data: {e}")
         st.write(f"DEBUG: Error details: {e}") # Log the error details
-        return {}
\ No newline at end of file
+        return {}
+# Manual Spanish day name mapping
+SPANISH_DAY_NAMES = {
+    "Monday": "Lunes", "Tuesday": "Martes", "Wednesday": "Miércoles",
+    "Thursday": "Jueves", "Friday": "Viernes", "Saturday": "Sábado",
+    "Sunday": "Domingo"
+}
+
+SPANISH_MONTH_NAMES = {
+    1: "Enero", 2: "Febrero", 3: "Marzo", 4: "Abril",
+    5: "Mayo", 6: "Junio", 7: "Julio", 8: "Agosto",
+    9: "Septiembre", 10: "Octubre", 11: "Noviembre", 12: "Diciembre"
+}
+
+def build_attendance_summary(students_df: pd.DataFrame, attendance_records: dict,
+                             start_date: datetime.date, end_date: datetime.date) -> dict:
+    """
+    Count present and absent students for every weekday in a date range.
+
+    Args:
+        students_df (pd.DataFrame): Course roster with 'id' and 'nombre' columns.
+        attendance_records (dict): {YYYY-MM-DD: day}, where a day is either the legacy
+                                   list of {'Nombre', 'Presente'} or {student_id: status}.
+        start_date (datetime.date): First day of the range.
+        end_date (datetime.date): Last day of the range (inclusive).
+
+    Returns:
+        dict: {'daily_summary': [{'Fecha', 'Día', '# Presentes', '# Ausentes'}, ...],
+               'registered_names': set of roster names,
+               'present_names': names present at least once in the range,
+               'skipped_dates': [(date_key, type name)] for days in an unknown format}
+    """
+    registered_names = set(students_df['nombre'].astype(str).str.strip().unique())
+    total_registered_students = len(registered_names)
+    student_id_to_name = students_df.set_index('id')['nombre'].to_dict()
+
+    daily_summary = []
+    present_names = set()
+    skipped_dates = []
+
+    current_date_iter = start_date
+    while current_date_iter <= end_date:
+        if current_date_iter.weekday() >= 5:
+            current_date_iter += datetime.timedelta(days=1)
+            continue
+
+        date_key = current_date_iter.strftime('%Y-%m-%d')
+        daily_attendance = attendance_records.get(date_key, {})
+
+        present_today_count = 0
+        if daily_attendance:
+            # Legacy list format; Firebase can create 'null' entries in lists
+            if isinstance(daily_attendance, list):
+                for record in daily_attendance:
+                    if isinstance(record, dict) and record.get('Presente', False):
+                        present_today_count += 1
+                        student_name = record.get('Nombre')
+                        if student_name:
+                            present_names.add(student_name.strip())
+            # {student_id: status} format
+            elif isinstance(daily_attendance, dict):
+                for student_id, details in daily_attendance.items():
+                    status = details.get('status', 'ausente') if isinstance(details, dict) else (details or 'ausente')
+                    if status.lower() == 'presente':
+                        present_today_count += 1
+                        student_name = student_id_to_name.get(student_id)
+                        if student_name:
+                            present_names.add(student_name.strip())
+            else:
+                skipped_dates.append((date_key, type(daily_attendance).__name__))
+
+        english_day_name = current_date_iter.strftime('%A')
+        spanish_day_name = SPANISH_DAY_NAMES.get(english_day_name, english_day_name)
+        daily_summary.append({
+            'Fecha': date_format(current_date_iter, '%Y-%m-%d'),
+            'Día': spanish_day_name.capitalize(),
+            '# Presentes': present_today_count,
+            '# Ausentes': total_registered_students - present_today_count
+        })
+        current_date_iter += datetime.timedelta(days=1)
+
+    return {
+        'daily_summary': daily_summary,
+        'registered_names': registered_names,
+        'present_names': present_names,
+        'skipped_dates': skipped_dates
+    }
+
+def active_students_per_month(students: pd.DataFrame, start_column: str, end_column: str) -> pd.DataFrame:
+    """
+    Count the students active on the first day of every month they span.
+
+    A student is active on a month start if they started on or before it and
+    have no end date or end on or after it.
+
+    Args:
+        students (pd.DataFrame): One row per student with datetime start/end columns.
+        start_column (str): Name of the start date column.
+        end_column (str): Name of the end date column.
+
+    Returns:
+        pd.DataFrame: Columns 'Mes' (month start), 'Activos' and 'Etiqueta' ("Enero 2025").
+    """
+    monthly_range = pd.date_range(students[start_column].min(), students[end_column].max(), freq='MS')
+
+    active_per_month = []
+    for date in monthly_range:
+        activos = students[
+            (students[start_column] <= date) &
+            ((students[end_column].isna()) | (students[end_column] >= date))
+        ]
+        active_per_month.append({
+            'Mes': date,
+            'Activos': len(activos),
+            'Etiqueta': SPANISH_MONTH_NAMES[date.month] + ' ' + date.strftime('%Y')
+        })
+
+    return pd.DataFrame(active_per_month, columns=['Mes', 'Activos', 'Etiqueta'])
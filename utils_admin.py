@@ -3,8 +3,17 @@ import pandas as pd
 import uuid
 import numpy as np
 from config import db # Assuming db is your Firebase Realtime Database reference from config.py
+from auth_utils import current_token
 import datetime
 import time
+from diff_utils import diff_frames, build_patch
+from roster_utils import roster_payload, build_roster_patch, load_roster_version, attendance_day_patch
+from log_utils import get_logger, log_payload
+from metrics_utils import cached
+from async_client import stream_course_subtrees, stream_reads, course_ref
+from save_queue import enqueue_update, notify
+
+logger = get_logger(__name__)
 
 
 def admin_get_last_updated(table_name, course_email):
@@ -18,17 +27,17 @@ def admin_get_last_updated(table_name, course_email):
     Returns:
         str or None: The last_updated ISO timestamp, or None if not found.
     """
-    print("\n\admin_get_last_updated", course_email)
+    logger.debug("admin_get_last_updated %s %s", table_name, course_email)
     if course_email:
         course_email = course_email.replace('.', ',')
         ref = db.child("metadata").child(table_name).child(course_email)
-        snapshot = ref.get(token=st.session_state.user_token)
+        snapshot = ref.get(token=current_token())
         if snapshot.val() is not None:
             metadata = snapshot.val()
         else:
             return None
     else:
-        metadata = db.child("metadata").child(table_name).get(token=st.session_state.user_token).val()
+        metadata = db.child("metadata").child(table_name).get(token=current_token()).val()
     if metadata and 'last_updated' in metadata:
         return metadata['last_updated']
     else:
@@ -50,11 +59,11 @@ def admin_set_last_updated(table_name, course_email):
         safe_email = course_email.replace('.', ',')
         db.child("metadata").child(table_name).child(safe_email).update({
             'last_updated': now_iso
-        }, token=st.session_state.user_token)
+        }, token=current_token())
     else:
         db.child("metadata").child(table_name).update({
             'last_updated': now_iso
-        }, token=st.session_state.user_token)
+        }, token=current_token())
     return now_iso
     
 def admin_get_students_by_email(email):
@@ -62,7 +71,7 @@ def admin_get_students_by_email(email):
     Retrieves student records from the database based on the provided email.
     This function is designed for a database structure where the email
     is the primary key under 'students', and its value is an object
-    containing a 'data' array of student details.
+    containing a 'data' map of student details keyed by student id.
 
     Args:
         email (str): The email address which is also the key under the 'students' node.
@@ -81,39 +90,35 @@ def admin_get_students_by_email(email):
         # you might need to escape them or store them differently if direct
         # key access doesn't work. However, typically, Firebase handles
         # this if the key was set using a string.
-        snapshot = students_ref.child(email.replace('.', ',')).get(token=st.session_state.user_token) # Common workaround for '.' in keys
+        snapshot = students_ref.child(email.replace('.', ',')).get(token=current_token()) # Common workaround for '.' in keys
 
         # Check if any data was returned for that specific email key
         if not snapshot.val():
-            print(f"No student entry found for email key: {email}")
+            logger.debug("admin_get_students_by_email: no student entry for %s", email)
             return {}
 
         # The data under this email key is an object, and within it,
-        # you have a 'data' array.
-        student_data_array = snapshot.val().get("data")
+        # you have a 'data' map of student records keyed by student id.
+        roster = snapshot.val().get("data")
 
-        if not student_data_array:
-            print(f"No 'data' array found for email key: {email}")
+        if not roster:
+            logger.debug("admin_get_students_by_email: no 'data' for %s", email)
             return {}
 
-        # If you want to return a dictionary where keys are derived (e.g., index)
-        # or if you just want the list of student objects:
-        found_students = {}
-        for i, student_record in enumerate(student_data_array):
-            # You might want a unique key for each student record.
-            # Using a combination of email and index, or a 'canvas_id' if unique.
-            key = f"{email}_{i}" # Example key: "cba2@iti.edu_0"
-            found_students[key] = student_record
-
-        print(f"Found {len(student_data_array)} records for email key: {email}")
-        print(found_students)
+        if isinstance(roster, list):
+            # Legacy positional list (not migrated yet): the position is the id
+            roster = {str(i): record for i, record in enumerate(roster) if isinstance(record, dict)}
+
+        found_students = {f"{email}_{student_id}": record for student_id, record in roster.items()}
+
+        log_payload(logger, f"admin_get_students_by_email students/{email}", found_students)
         return found_students
 
     except Exception as e:
-        print(f"Error querying students by email key '{email}': {str(e)}")
+        logger.warning("Error querying students by email key %s: %s", email, e)
         return {}
 
-@st.cache_data(ttl=60*60*5) # 5 hours
+@cached(ttl=60*60*5) # 5 hours
 def admin_get_student_group_emails():
     """
     Retrieves the top-level email keys (representing student groups)
@@ -124,86 +129,32 @@ def admin_get_student_group_emails():
               if no student groups are found or an error occurs.
     """
     try:
-        students_ref = db.child("students")
-        students_snapshot = students_ref.get(token=st.session_state.user_token)
-        print('\n\n---------------------------------database readed-------------------------\n\n', {k: v['data'][0] if v and 'data' in v else None for k, v in students_snapshot.val().items()})
+        # Only the course keys are needed, so don't download the rosters
+        email_keys = db.child("students").shallow().get(token=current_token()).val()
 
-        if not students_snapshot.val():
-            print("No student entries found in the database")
+        if not email_keys:
+            logger.info("No student entries found in the database")
             return []
 
-        email_keys = []
-        for student_key, _ in students_snapshot.val().items():
-            email_keys.append(student_key)
-
-        print(f"Found {len(email_keys)} student group emails.")
-        print(email_keys)
+        email_keys = sorted(email_keys)
+        log_payload(logger, "admin_get_student_group_emails students (shallow)", email_keys)
         return email_keys
 
     except Exception as e:
-        print(f"Error retrieving student group emails: {str(e)}")
+        logger.error("Error retrieving student group emails: %s", e)
         return []
     
-@st.cache_data
 def admin_load_students(course_email, last_updated):
     """
     Load students data from Firebase and ensure all required fields are present.
+
+    The roster is normalized once per version (see roster_utils.load_roster_version).
     
     Returns:
         tuple: (DataFrame with student data, filename) or (None, None) if error or no data
     """
     try:
-        user_email = course_email
-        if 'call_count' not in st.session_state:
-            st.session_state.call_count = 0
-        data = db.child("students").child(user_email).get(token=st.session_state.user_token).val()
-        st.session_state.call_count += 1
-        print(f"\n{st.session_state.call_count} ---data from firebase----\n", data)
-
-        if not data or 'data' not in data:
-            return None, None
-            
-        # Create DataFrame from records
-        df = pd.DataFrame(data['data'])
-        
-        # Normalize column names
-        df.columns = df.columns.str.lower().str.strip()
-        
-        # Ensure required columns exist
-        if 'nombre' not in df.columns:
-            st.error("Error: El archivo debe contener una columna 'nombre'")
-            return None, None
-            
-        # Clean and standardize data
-        df['nombre'] = df['nombre'].astype(str).str.strip()
-        
-        # Initialize optional fields if they don't exist
-        optional_fields = {
-            'email': '',
-            'canvas_id': '',
-            'telefono': '',
-            'modulo': '',
-            'ciclo': '',
-            'fecha_inicio': None
-        }
-        
-        for field, default_value in optional_fields.items():
-            if field not in df.columns:
-                df[field] = default_value
-            else:
-                # Clean up the data
-                if field == 'fecha_inicio' and pd.api.types.is_datetime64_any_dtype(df[field]):
-                    # Convert datetime to string for consistency
-                    df[field] = pd.to_datetime(df[field]).dt.strftime('%Y-%m-%d')
-                else:
-                    df[field] = df[field].fillna(default_value if default_value is not None else '').astype(str).str.strip()
-        
-        # Reorder columns for consistency
-        column_order = ['nombre', 'email', 'canvas_id', 'telefono', 'modulo', 'fecha_inicio', 'ciclo']
-        df = df[[col for col in column_order if col in df.columns] + 
-                [col for col in df.columns if col not in column_order]]
-        
-        return df, data.get('filename', 'students.xlsx')
+        return load_roster_version(course_email, last_updated)
         
     except Exception as e:
         st.error(f"Error loading students: {str(e)}")
@@ -225,70 +176,15 @@ def admin_save_students(course_email, students_df):
             st.warning("No student data to save.")
             return False
             
-        # Create a working copy to avoid modifying the original
-        df = students_df.copy()
-        
-        # Ensure required columns exist
-        if 'nombre' not in df.columns:
+        if 'nombre' not in students_df.columns:
             st.error("Error: Student data must contain a 'nombre' column")
             return False
-            
-        # Initialize optional fields if they don't exist
-        optional_fields = {
-            'email': '',
-            'canvas_id': '',
-            'telefono': '',
-            'modulo': '',
-            'ciclo': '',
-            'fecha_inicio': None,
-            'fecha_fin': None
-        }
-        
-        for field, default_value in optional_fields.items():
-            if field not in df.columns:
-                df[field] = default_value
-        
-        # Clean and standardize data
-        df['nombre'] = df['nombre'].astype(str).str.strip()
-        
-        # Convert data types and ensure JSON serialization
-        for col in df.columns:
-            # Handle numeric types
-            if pd.api.types.is_numeric_dtype(df[col]):
-                df[col] = df[col].astype('object').where(df[col].notna(), None)
-            # Handle datetime types
-            elif pd.api.types.is_datetime64_any_dtype(df[col]):
-                df[col] = pd.to_datetime(df[col]).dt.strftime('%Y-%m-%d')
-            # Handle string types
-            else:
-                df[col] = df[col].fillna('').astype(str).str.strip()
-        
-        # Convert to records and ensure all values are JSON-serializable
-        records = []
-        for _, row in df.iterrows():
-            record = {}
-            for key, value in row.items():
-                if pd.isna(value) or value is None or value == '':
-                    record[key] = None
-                else:
-                    record[key] = str(value) if not isinstance(value, (int, float, bool, str)) else value
-            records.append(record)
-        
-        # Prepare data for Firebase
-        data = {
-            'filename': 'students.xlsx',
-            'data': records,
-            'timestamp': datetime.datetime.utcnow().isoformat() + 'Z',
-            'metadata': {
-                'version': '1.0',
-                'fields': list(df.columns),
-                'record_count': len(df)
-            }
-        }
+
+        data = roster_payload(students_df)
         
         # Save to Firebase with error handling
         try:
-            db.child("students").child(course_email).set(data, token=st.session_state.user_token)
+            db.child("students").child(course_email).set(data, token=current_token())
             # st.success(f"Successfully saved {len(df)} student records to {course_email}.")
             admin_set_last_updated('students', course_email)
             return True
@@ -298,11 +194,85 @@ def admin_save_students(course_email, students_df):
             
     except Exception as e:
         st.error(f"Error saving students: {str(e)}")
-        if 'df' in locals():
-            st.error(f"Columns in DataFrame: {', '.join(df.columns)}")
+        if students_df is not None:
+            st.error(f"Columns in DataFrame: {', '.join(students_df.columns)}")
         return False
 
-@st.cache_data(ttl=1)
+def admin_patch_students(course_email, old_df, new_df):
+    """
+    Save only what changed between the loaded roster and the edited one.
+
+    Falls back to `admin_save_students` when there is no stored roster yet.
+
+    Args:
+        course_email (str): Email of the course to save students to
+        old_df (DataFrame): Roster as it was loaded from Firebase
+        new_df (DataFrame): Roster to store
+
+    Returns:
+        bool: True if save was successful (or nothing changed), False otherwise
+    """
+    if old_df is None or old_df.empty:
+        return admin_save_students(course_email, new_df)
+
+    try:
+        if 'nombre' not in new_df.columns:
+            st.error("Error: Student data must contain a 'nombre' column")
+            return False
+
+        patch = build_roster_patch(old_df, new_df)
+        if not patch:
+            return True
+
+        db.child("students").child(course_email).update(patch, token=current_token())
+        admin_set_last_updated('students', course_email)
+        return True
+    except Exception as e:
+        st.error(f"Error saving students: {str(e)}")
+        return False
+
+def admin_queue_students_patch(course_email, old_df, new_df, label, on_failure=None):
+    """
+    Like `admin_patch_students`, but the write is left to the session's save
+    queue: the page can rerun right away and the confirmation (or the error,
+    after the retries) is shown as a toast on a later run.
+
+    Args:
+        course_email (str): Email of the course to save students to
+        old_df (DataFrame): Roster as it was loaded from Firebase
+        new_df (DataFrame): Roster to store
+        label (str): What is saved, for the confirmation ("2 estudiante(s) agregado(s)")
+        on_failure (callable, optional): Called if the write finally fails
+
+    Returns:
+        bool: True if the write was queued (or made, or nothing changed), False otherwise
+    """
+    if old_df is None or old_df.empty:
+        # The first save of a course writes the whole roster document
+        if not admin_save_students(course_email, new_df):
+            return False
+        notify(f"¡Guardado: {label}!")
+        return True
+
+    try:
+        if 'nombre' not in new_df.columns:
+            st.error("Error: Student data must contain a 'nombre' column")
+            return False
+
+        patch = build_roster_patch(old_df, new_df)
+        if not patch:
+            return True
+
+        # The roster paths and the version bump in one update of the database root
+        update = {f"students/{course_email}/{path}": value for path, value in patch.items()}
+        update[f"metadata/students/{course_email.replace('.', ',')}/last_updated"] = datetime.datetime.now(datetime.timezone.utc).isoformat()
+        enqueue_update(label, update, on_failure)
+        return True
+    except Exception as e:
+        st.error(f"Error saving students: {str(e)}")
+        return False
+
+@cached(ttl=1)
 def admin_get_available_modules(user_email: str) -> list:
     """
     Retrieve and process available modules for a user.
@@ -316,7 +286,7 @@ def admin_get_available_modules(user_email: str) -> list:
     try:
         # Create a fresh Firebase reference for this operation
         # Note: You should ensure 'db' is initialized before this function is called.
-        modules_ref = db.child("modules").child(user_email).get(token=st.session_state.user_token)
+        modules_ref = db.child("modules").child(user_email).get(token=current_token())
         # print("\n\nAvailable modules for user:", modules_ref.val())
         # if 'call_count' not in st.session_state:
         #     st.session_state.call_count = 0
@@ -364,8 +334,7 @@ def admin_get_available_modules(user_email: str) -> list:
                 
             ciclo = module_data.get('ciclo', 1)  # Default to 1 if not specified
             
-            # Debug: Print the extracted values
-            print(f"Extracted values - duration: {duration_weeks}, credits: {credits}, description: {description}")
+            logger.debug("Module %s: duration=%s credits=%s", module_id, duration_weeks, credits)
 
             start_date_dt = None
             if isinstance(start_date_str, str):
@@ -429,11 +398,11 @@ def save_modules_to_db(user_email: str, modules_data: list[dict]) -> bool:
             else:
                 # --- This is a NEW module, so we PUSH it ---
                 # .push() generates the unique ID for us
-                user_modules_ref.push(module, token=st.session_state.user_token)
+                user_modules_ref.push(module, token=current_token())
 
         # Send all updates for existing records in a single, efficient call
         if updates:
-            user_modules_ref.update(updates, token=st.session_state.user_token)
+            user_modules_ref.update(updates, token=current_token())
 
         # Note: This logic does not handle row DELETION from the database.
         # If a user can delete rows, you would need a more complex sync:
@@ -450,15 +419,26 @@ def save_modules_to_db(user_email: str, modules_data: list[dict]) -> bool:
         st.error(f"Error al guardar los módulos: {str(e)}")
         return False
 
+@cached
+def load_breaks_version(breaks_last_updated):
+    """
+    Read the 'breaks' node once per version (metadata/breaks/last_updated).
+
+    Args:
+        breaks_last_updated (str): The breaks version from metadata, used as cache key.
+
+    Returns:
+        The raw 'breaks' value, or None if there are no breaks.
+    """
+    return db.child("breaks").get(token=current_token()).val()
+
 def load_breaks():
     """
     Loads all 'breaks' data from the Firebase Realtime Database.
     Handles cases where data is empty or not in expected dictionary format.
     """
     try:
-        # Create a fresh reference to the 'breaks' child node
-        breaks_ref = db.child("breaks")
-        breaks_data = breaks_ref.get(token=st.session_state.user_token).val() or {} # Get data, default to empty dict if None
+        breaks_data = load_breaks_version(admin_get_last_updated('breaks', None)) or {} # Default to empty dict if None
         
         # Ensure the retrieved data is a dictionary
         if not isinstance(breaks_data, dict):
@@ -472,12 +452,12 @@ def load_breaks():
 def load_breaks_from_db():
     """Load breaks from Firebase and format them for date calculations."""
     try:
-        breaks_ref = db.child("breaks").get(token=st.session_state.user_token)
-        if not breaks_ref.val():
+        breaks_data_all = load_breaks_version(admin_get_last_updated('breaks', None))
+        if not breaks_data_all:
             return []
             
         breaks_list = []
-        for break_id, break_data in breaks_ref.val().items():
+        for break_id, break_data in breaks_data_all.items():
             if not break_data or not isinstance(break_data, dict):
                 continue
                 
@@ -561,9 +541,68 @@ def calculate_end_date(start_date, num_weeks, breaks):
     end_date += datetime.timedelta(days=total_break_days)
     # End date should be a sunday
     end_date -= datetime.timedelta(days=1)
-    print("\n\nend_date", end_date)
+    logger.debug("calculate_end_date %s + %s weeks -> %s", start_date, num_weeks, end_date)
     return end_date
 
+def calculate_module_dates_forward_stretch(duration_weeks, anchor_date, all_breaks):
+    """
+    Calcula las fechas de un módulo hacia adelante, "estirando" su duración
+    si se superpone con vacaciones. El módulo se "pausa" durante las vacaciones.
+    
+    Args:
+        duration_weeks (int): Duración del módulo en semanas.
+        anchor_date (pd.Timestamp): La fecha de finalización del módulo anterior.
+        all_breaks (list): Una lista de tuplas con fechas de inicio y fin de las vacaciones.
+        
+    Returns:
+        tuple: (start_date, end_date) para el módulo calculado.
+    """
+    # La fecha de inicio tentativa es el día siguiente a la fecha de anclaje.
+    start_date = anchor_date + pd.Timedelta(days=1)
+    
+    # Bucle para asegurar que la propia start_date no caiga en unas vacaciones.
+    # Si lo hace, la movemos al día después de que terminen esas vacaciones.
+    date_adjusted = True
+    while date_adjusted:
+        date_adjusted = False
+        for break_start, break_end in all_breaks:
+            if break_start <= start_date <= break_end:
+                start_date = break_end + pd.Timedelta(days=1)
+                date_adjusted = True # Re-evaluar por si cae en otro break consecutivo
+                break
+
+    # Duración del trabajo del módulo en días
+    work_duration_days = duration_weeks * 7
+    
+    # Calculamos la fecha de finalización inicial, solo con la duración del trabajo.
+    current_end_date = start_date + pd.Timedelta(days=work_duration_days - 1)
+    
+    # Bucle iterativo para ajustar la fecha de finalización hasta que se estabilice
+    while True:
+        total_overlap_days = 0
+        # Revisa si el intervalo [start_date, current_end_date] se solapa con alguna vacación
+        for break_start, break_end in all_breaks:
+            if start_date <= break_end and current_end_date >= break_start:
+                # Calcular la intersección (los días exactos de solapamiento)
+                overlap_start = max(start_date, break_start)
+                overlap_end = min(current_end_date, break_end)
+                
+                # Sumar la cantidad de días de este solapamiento
+                overlap_duration = (overlap_end - overlap_start).days + 1
+                total_overlap_days += overlap_duration
+        
+        # Calculamos la fecha de finalización requerida, añadiendo los días de vacaciones a la duración
+        required_end_date = start_date + pd.Timedelta(days=work_duration_days + total_overlap_days - 1)
+        
+        # Si la fecha de finalización ya no cambia, hemos terminado.
+        if required_end_date == current_end_date:
+            break
+        else:
+            # Si cambió, actualizamos la fecha de finalización y volvemos a iterar
+            current_end_date = required_end_date
+            
+    return start_date, current_end_date
+
 def row_to_clean_dict(row: pd.Series) -> dict:
     """
     • Converts NaN / None / pd.NA to "" (empty text)  
@@ -589,7 +628,7 @@ def save_new_module_to_db(user_email: str, module_data: dict) -> str:
     """
     try:
         user_modules_ref = db.child("modules").child(user_email)
-        result = user_modules_ref.push(module_data, token=st.session_state.user_token)
+        result = user_modules_ref.push(module_data, token=current_token())
         return result["name"]
     except Exception as e:
         st.error(f"Error al guardar el módulo: {str(e)}")
@@ -609,59 +648,59 @@ def transform_module_input(raw: dict) -> dict:
         # firebase_key will be added AFTER saving to Firebase, if needed
     }
 
-def sync_firebase_updates(df_old: pd.DataFrame, df_new: pd.DataFrame):
+# Maps the module editor's display columns to the Firebase module fields.
+MODULE_FIELD_MAP = {
+    'Nombre Módulo': 'name',
+    'Descripción': 'description',
+    'Duración': 'duration_weeks',
+    'Orden': 'credits',
+    'Fecha Inicio': 'fecha_inicio_1',
+    'Fecha Fin': 'fecha_fin_1'
+}
+
+def sync_firebase_updates(df_old: pd.DataFrame, df_new: pd.DataFrame, course_email: str, field_map: dict = None) -> dict:
     """
-    Syncs changes between old and new DataFrames to Firebase:
+    Syncs changes between old and new module DataFrames to Firebase in one write:
     - Deletes removed rows
-    - Updates modified rows
-    - Does NOT add new rows
+    - Updates only the modified fields of modified rows
+    - Does NOT add new rows (rows without firebase_key are ignored)
 
     Args:
         df_old (pd.DataFrame): Original DataFrame with firebase_key
         df_new (pd.DataFrame): Edited DataFrame with firebase_key
-    """
-    # Make sure indexes are clean
-    df_old = df_old.reset_index(drop=True)
-    df_new = df_new.reset_index(drop=True)
+        course_email (str): Course whose modules are being edited
+        field_map (dict, optional): Column -> Firebase field mapping. Defaults to MODULE_FIELD_MAP.
 
-    # Drop rows without firebase_key
-    df_old = df_old[df_old["firebase_key"] != ""]
-    df_new = df_new[df_new["firebase_key"] != ""]
-
-    # Find deleted rows
-    old_keys = set(df_old["firebase_key"])
-    new_keys = set(df_new["firebase_key"])
-    deleted_keys = old_keys - new_keys
-
-    for key in deleted_keys:
-        try:
-            db.child("modules").child(key).delete()
-        except Exception as e:
-            print(f"Error deleting {key}: {e}")
+    Returns:
+        dict: The multi-path patch that was written ({} if nothing changed), or None on error.
+    """
+    field_map = MODULE_FIELD_MAP if field_map is None else field_map
+    columns = [col for col in df_new.columns if col in field_map]
 
-    # Find modified rows
-    for key in new_keys:
-        new_row = df_new[df_new["firebase_key"] == key].iloc[0]
-        old_row = df_old[df_old["firebase_key"] == key].iloc[0]
+    diff = diff_frames(df_old, df_new, key="firebase_key", columns=columns)
+    patch = build_patch(diff, field_map=field_map, include_added=False)
+    if not patch:
+        return {}
 
-        if not new_row.equals(old_row):
-            try:
-                clean_data = row_to_clean_dict(new_row)
-                db.child("modules").child(key).update(clean_data)
-            except Exception as e:
-                print(f"Error updating {key}: {e}")
+    try:
+        db.child("modules").child(course_email).update(patch, token=current_token())
+        admin_set_last_updated('modules', course_email)
+        return patch
+    except Exception as e:
+        st.error(f"Error al sincronizar los módulos: {str(e)}")
+        return None
 
 def update_module_to_db(course_id: str, firebase_key: str, module_data: dict):
-    print("\n\n --- modules uodating to db", course_id, firebase_key, module_data)
+    log_payload(logger, f"update_module_to_db modules/{course_id}/{firebase_key}", module_data)
     try:
-        db.child("modules").child(course_id).child(firebase_key).update(module_data, token=st.session_state.user_token)
+        db.child("modules").child(course_id).child(firebase_key).update(module_data, token=current_token())
         admin_set_last_updated('modules', course_id)
     except Exception as e:
         st.error(f"Error al actualizar el módulo: {str(e)}")
 
 def delete_module_from_db(course_id: str, firebase_key: str):
     try:
-        db.child("modules").child(course_id).child(firebase_key).remove(token=st.session_state.user_token)
+        db.child("modules").child(course_id).child(firebase_key).remove(token=current_token())
         admin_set_last_updated('modules', course_id)
     except Exception as e:
         st.error(f"Error al eliminar el módulo: {str(e)}")
@@ -690,7 +729,7 @@ def find_students(search_term: str, course_email: str = None, status: str = "in_
 
         if course_email:
             # Fetch data for a specific course
-            snapshot = students_ref.child(course_email).child("data").get(token=st.session_state.user_token)
+            snapshot = students_ref.child(course_email).child("data").get(token=current_token())
             if snapshot.val() is not None:
                 # Firebase can return dict (if a single item) or list (if multiple items)
                 # Ensure we handle both cases correctly
@@ -707,27 +746,25 @@ def find_students(search_term: str, course_email: str = None, status: str = "in_
                             student_data_raw['course_email'] = course_email # Add course_email
                             raw_students_data.append(student_data_raw)
         else:
-            # Fetch data for all courses
-            all_courses_snapshot = students_ref.get(token=st.session_state.user_token)
-            if all_courses_snapshot.val() is not None:
-                for course_node in all_courses_snapshot.each():
-                    course_key = course_node.key()
-                    course_data_val = course_node.val()
-
-                    if isinstance(course_data_val, dict):
-                        data_node = course_data_val.get("data", {})
-                        if isinstance(data_node, dict):
-                            # Students are dictionaries within "data"
-                            for student_key, student_data_raw in data_node.items():
-                                if isinstance(student_data_raw, dict):
-                                    student_data_raw['course_email'] = course_key
-                                    raw_students_data.append(student_data_raw)
-                        elif isinstance(data_node, list):
-                            # Students are a list within "data"
-                            for student_data_raw in data_node:
-                                if isinstance(student_data_raw, dict):
-                                    student_data_raw['course_email'] = course_key
-                                    raw_students_data.append(student_data_raw)
+            # Fetch every course's "data" node in parallel instead of the whole 'students' tree
+            students_by_course = {}
+            for course_key, data_node in stream_course_subtrees("students", child="data"):
+                if isinstance(data_node, dict):
+                    # Students are dictionaries within "data"
+                    records = data_node.values()
+                elif isinstance(data_node, list):
+                    # Students are a list within "data"
+                    records = data_node
+                else:
+                    records = []
+                students_by_course[course_key] = []
+                for student_data_raw in records:
+                    if isinstance(student_data_raw, dict):
+                        student_data_raw['course_email'] = course_key
+                        students_by_course[course_key].append(student_data_raw)
+            # Results arrive in completion order; keep the course order stable
+            for course_key in sorted(students_by_course):
+                raw_students_data.extend(students_by_course[course_key])
 
         # Define expected columns and their default values
         expected_columns = {
@@ -750,6 +787,7 @@ def find_students(search_term: str, course_email: str = None, status: str = "in_
                     df[col] = expected_columns[col]
             # Ensure column order
             df = df[list(expected_columns.keys())]
+            df['course_email'] = df['course_email'].astype('category')
         else:
             return pd.DataFrame(columns=list(expected_columns.keys()))
 
@@ -809,11 +847,10 @@ def admin_delete_attendance_dates(dates_to_delete=None, delete_all=False, course
     Returns:
         bool: True if at least one deletion was successful, False otherwise.
     """
-    print(f"Intentando eliminar fechas: {dates_to_delete}, delete_all={delete_all} DESDE utils")
+    logger.info("Deleting attendance dates %s (delete_all=%s)", dates_to_delete, delete_all)
     success = False
 
     if dates_to_delete:
-            print(f"✅ Entrando al bloque para eliminar fechas específicas: {dates_to_delete}")
             success_count = 0
             
             # Loop through the list of date STRINGS (e.g., '06/20/2025')
@@ -825,10 +862,10 @@ def admin_delete_attendance_dates(dates_to_delete=None, delete_all=False, course
                     # 2. FORMAT that datetime object into the 'YYYY-MM-DD' string needed for the Firebase key.
                     date_key = date_obj.strftime('%Y-%m-%d')
                     
-                    print(f"  -> Intentando eliminar la llave: {date_key}") # New debug print
+                    logger.info("Removing attendance at attendance/%s/%s", course_email, date_key)
                     
                     # 3. Remove the specific date node from Firebase using the correct key.
-                    db.child("attendance").child(course_email).child(date_key).remove(token=st.session_state.user_token)
+                    db.child("attendance").child(course_email).child(date_key).remove(token=current_token())
                     success_count += 1
                 except ValueError:
                     st.warning(f"Formato de fecha inválido, omitiendo: '{date_str_mmddyyyy}'")
@@ -845,26 +882,26 @@ def admin_delete_attendance_dates(dates_to_delete=None, delete_all=False, course
         if delete_all:
             # This case is for explicitly deleting ALL records for the user
             all_user_records_ref = db.child(user_base_attendance_path)
-            print(f"WARNING: Attempting to delete ALL attendance records at path: {all_user_records_ref.path}")
+            logger.warning("Deleting ALL attendance records at %s", all_user_records_ref.path)
             
             if not all_user_records_ref.path or all_user_records_ref.path == '/' or not all_user_records_ref.path.startswith('attendance/'):
                 st.error(f"CRITICAL SAFETY HALT: Unsafe path for full deletion: '{all_user_records_ref.path}'. Aborting.")
-                print(f"CRITICAL SAFETY HALT: Unsafe full deletion path: {all_user_records_ref.path}")
+                logger.error("Refusing full deletion at unsafe path %s", all_user_records_ref.path)
                 return False
 
             try:
-                all_user_records_ref.remove(token=st.session_state.user_token)
+                all_user_records_ref.remove(token=current_token())
                 admin_set_last_updated('attendance', course_email)
                 return True
             except Exception as e:
-                print(f"ERROR: Failed to remove all records: {str(e)}")
+                logger.error("Failed to remove all attendance records: %s", e)
                 st.error(f"Error al eliminar todos los registros: {str(e)}")
                 return False
 
         # If no dates provided, we don’t do anything
         if not dates_to_delete:
             st.warning("No dates provided for deletion.")
-            print("INFO: No dates provided, skipping deletion.")
+            logger.info("No dates provided, skipping deletion")
             return False
 
         # Validate and clean dates
@@ -875,36 +912,36 @@ def admin_delete_attendance_dates(dates_to_delete=None, delete_all=False, course
                 valid_dates.append(date_str.strip())
             except ValueError:
                 st.warning(f"Formato de fecha inválido: {date_str}. Se omitirá.")
-                print(f"WARNING: Invalid date format '{date_str}' ignored.")
+                logger.warning("Invalid date format %r ignored", date_str)
 
         if not valid_dates:
             st.error("No hay fechas válidas para eliminar después de la validación.")
-            print("ERROR: No valid dates to process after validation.")
+            logger.error("No valid dates to delete after validation")
             return False
 
         # Delete each valid date
         for date_str in valid_dates:
             full_path = f"{user_base_attendance_path}/{date_str}"
             ref_for_get = db.child(full_path)
-            data_snapshot = ref_for_get.get(token=st.session_state.user_token)
+            data_snapshot = ref_for_get.get(token=current_token())
 
             if data_snapshot.val() is not None:
-                print(f"INFO: Removing data at path: {full_path}")
+                logger.info("Removing attendance at %s", full_path)
                 try:
-                    db.child(full_path).remove(token=st.session_state.user_token)
+                    db.child(full_path).remove(token=current_token())
                     admin_set_last_updated('attendance', course_email)
                     success = True
                 except Exception as e:
-                    print(f"ERROR: Failed to remove date {date_str}: {str(e)}")
+                    logger.error("Failed to remove attendance date %s: %s", date_str, e)
                     st.error(f"Error al eliminar la fecha {date_str}: {str(e)}")
             else:
-                print(f"INFO: No data found for date {date_str}, skipping.")
+                logger.info("No attendance found for %s, skipping", date_str)
 
         return success
 
     except Exception as e:
         st.error(f"Error deleting attendance records: {str(e)}")
-        print(f"EXCEPTION: {str(e)}")
+        logger.exception("Error deleting attendance records: %s", e)
         return False
 
 def admin_save_attendance(date: datetime.date, attendance_data: list, course_email: str):
@@ -914,29 +951,49 @@ def admin_save_attendance(date: datetime.date, attendance_data: list, course_ema
         date_str = date.strftime('%Y-%m-%d')
         # Ensure student names (keys in attendance_data) are safe for Firebase paths if necessary
         # For now, assuming they are simple strings.
-        db.child("attendance").child(user_email).child(date_str).set(attendance_data, token=st.session_state.user_token)
+        db.child("attendance").child(user_email).child(date_str).set(attendance_data, token=current_token())
         admin_set_last_updated('attendance', user_email)
         return True
     except Exception as e:
         st.error(f"Error saving attendance for {date_str}: {str(e)}")
         return False
 
-@st.cache_data
+def admin_save_attendance_changes(date_key: str, loaded: pd.Series, edited: pd.Series, course_email: str, rewrite: bool = False):
+    """
+    Save an edited attendance day, writing only the students whose presence changed.
+
+    Args:
+        date_key (str): Day as 'YYYY-MM-DD'.
+        loaded (pd.Series): Presence by student id when the editor opened.
+        edited (pd.Series): Presence by student id after editing.
+        course_email (str): Course whose attendance is saved.
+        rewrite (bool): Write the whole day (legacy list days and days not stored yet).
+
+    Returns:
+        dict: See roster_utils.attendance_day_patch ('changes' is empty if nothing changed),
+              or None if the write failed.
+    """
+    try:
+        result = attendance_day_patch(course_email.replace('.', ','), date_key, loaded, edited, rewrite)
+        if result['patch']:
+            db.update(result['patch'], token=current_token())
+        return result
+    except Exception as e:
+        st.error(f"Error saving attendance for {date_key}: {str(e)}")
+        return None
+
+@cached
 def admin_get_attendance_dates(email: str, attendance_last_updated: str):
     """
     Get a list of all dates with saved attendance records.
     Returns a sorted list of date strings in 'YYYY-MM-DD' format.
     """
-    print("\n\nattendance_last_updated", attendance_last_updated)
-    print("\n\nemail", email)
+    logger.debug("admin_get_attendance_dates %s version=%s", email, attendance_last_updated)
     try:
         user_email = email.replace('.', ',')
-        docs = db.child("attendance").child(user_email).get(token=st.session_state.user_token).val()
+        docs = db.child("attendance").child(user_email).get(token=current_token()).val()
 
-        if 'call_count' not in st.session_state:
-            st.session_state.call_count = 0
-        st.session_state.call_count += 1
-        print(f"\n{st.session_state.call_count} ---get_attendance_dates-data from firebase----\n{str(docs)[:100]}...")
+        log_payload(logger, f"admin_get_attendance_dates attendance/{user_email}", docs)
 
         if not docs:
             return []
@@ -956,7 +1013,7 @@ def admin_get_attendance_dates(email: str, attendance_last_updated: str):
         st.error(f"Error loading attendance dates: {str(e)}")
         return []
 
-@st.cache_data
+@cached
 def admin_get_attendance(email: str, attendance_last_updated: str):
     """
     Get a list of all dates with saved attendance records.
@@ -966,24 +1023,77 @@ def admin_get_attendance(email: str, attendance_last_updated: str):
     # print("\n\nemail", email)
     try:
         user_email = email.replace('.', ',')
-        docs = db.child("attendance").child(user_email).get(token=st.session_state.user_token).val() or {}
+        docs = db.child("attendance").child(user_email).get(token=current_token()).val() or {}
         return docs
     except Exception as e:
         st.error(f"Error loading attendance dates: {str(e)}")
         return []
 
-@st.cache_data(ttl=60*60*2) # 2 hours 
+def _count_present(day) -> int:
+    """Number of students marked present in one attendance day (legacy list or {student_id: status})."""
+    if isinstance(day, list):
+        return sum(1 for record in day if isinstance(record, dict) and record.get('Presente', False))
+    if isinstance(day, dict):
+        present = 0
+        for details in day.values():
+            status = details.get('status', 'ausente') if isinstance(details, dict) else (details or 'ausente')
+            if str(status).lower() == 'presente':
+                present += 1
+        return present
+    return 0
+
+
+def stream_course_overview(course_emails: list, days: int = 30):
+    """
+    Student count and recent attendance of every course, yielded course by course.
+
+    Each course costs two reads, issued in parallel for all courses: a shallow read
+    of its roster (student ids only) and a key-range read of its last `days` days of
+    attendance. A course is yielded as soon as both of its reads have arrived.
+
+    Args:
+        course_emails (list): Course keys (e.g. "cba2@iti,edu").
+        days (int): How far back to summarize attendance.
+
+    Yields:
+        dict: {'curso', 'estudiantes', 'dias_con_asistencia', 'asistencia_promedio'}.
+              'asistencia_promedio' is the share of present students per recorded day (0-1), or None.
+    """
+    start_key = (datetime.date.today() - datetime.timedelta(days=days)).isoformat()
+    refs = {}
+    for course_email in course_emails:
+        refs[(course_email, 'students')] = course_ref("students", course_email, "data", shallow=True)
+        refs[(course_email, 'attendance')] = course_ref("attendance", course_email, start_at=start_key)
+
+    received = {}
+    for (course_email, table), value in stream_reads(refs):
+        received.setdefault(course_email, {})[table] = value
+        if len(received[course_email]) < 2:
+            continue
+
+        student_ids = received[course_email]['students'] or []
+        attendance = received[course_email]['attendance'] or {}
+        rates = [
+            _count_present(day) / len(student_ids)
+            for day in attendance.values()
+            if student_ids and day
+        ]
+        yield {
+            'curso': course_email,
+            'estudiantes': len(student_ids),
+            'dias_con_asistencia': len(attendance),
+            'asistencia_promedio': sum(rates) / len(rates) if rates else None
+        }
+
+@cached(ttl=60*60*2) # 2 hours 
 def admin_load_attendance(course_email: str, date: datetime.date, attendance_last_updated: str) -> dict:
     """Load attendance data from Firebase for a specific date."""
     try:
         user_email = course_email.replace('.', ',')
         date_str = date.strftime('%Y-%m-%d')
-        raw_data = db.child("attendance").child(user_email).child(date_str).get(token=st.session_state.user_token).val()
+        raw_data = db.child("attendance").child(user_email).child(date_str).get(token=current_token()).val()
 
-        if 'call_count' not in st.session_state:
-            st.session_state.call_count = 0
-        st.session_state.call_count += 1
-        print(f"\n{st.session_state.call_count} ---load attendance data from firebase----\n", raw_data)
+        log_payload(logger, f"admin_load_attendance attendance/{user_email}/{date_str}", raw_data)
         
         if isinstance(raw_data, list):
             # Convert list of records to a dictionary keyed by student name
@@ -0,0 +1,160 @@
+# warmup_utils.py
+
+import collections
+import threading
+import time
+from log_utils import get_logger
+from metrics_utils import REGISTRY
+from prefetch_utils import prefetch
+from auth_utils import token_source, use_token_source
+from roster_utils import load_roster_version
+from utils import (
+    get_last_updated, get_attendance_dates, load_all_attendance,
+    get_available_modules, get_module_on_date
+)
+from utils_admin import (
+    admin_get_student_group_emails, admin_load_students, admin_get_attendance,
+    admin_get_attendance_dates, admin_get_last_updated, admin_get_available_modules,
+    load_breaks_version
+)
+
+logger = get_logger(__name__)
+
+# Courses warmed for an admin at login: the ones they opened most recently
+RECENT_COURSES_LIMIT = 3
+
+REGISTRY.describe('login_warmup_seconds', 'Wall time of the background cache warm-up started at login.')
+
+# {admin email: course keys, most recent first}. Process wide, like the caches it feeds.
+_recent_lock = threading.Lock()
+_recent_courses = {}
+
+
+def record_course_use(email: str, course_key: str):
+    """Remember that `email` opened `course_key` (called by Home.py after each admin page run)."""
+    if not email or not course_key:
+        return
+    with _recent_lock:
+        courses = _recent_courses.setdefault(email, collections.deque(maxlen=RECENT_COURSES_LIMIT))
+        if course_key in courses:
+            courses.remove(course_key)
+        courses.appendleft(course_key)
+
+
+def recent_courses(email: str) -> list:
+    """Courses `email` opened most recently, most recent first (empty if none yet)."""
+    with _recent_lock:
+        return list(_recent_courses.get(email, ()))
+
+
+def warm_course(course_email):
+    """Load a course's students, attendance and modules with their current versions."""
+    _, errors = prefetch({
+        'students': lambda: admin_load_students(course_email, admin_get_last_updated('students', course_email)),
+        'attendance_dates': lambda: admin_get_attendance_dates(course_email, admin_get_last_updated('attendance', course_email)),
+        'attendance': lambda: admin_get_attendance(course_email, admin_get_last_updated('attendance', course_email)),
+        'modules': lambda: get_available_modules(course_email, get_last_updated('modules', course_email))
+    })
+    if errors:
+        raise next(iter(errors.values()))
+
+
+def warm_admin_caches(courses: list) -> dict:
+    """
+    Warm the course list, breaks and each course's data for an admin.
+
+    Args:
+        courses (list): Course keys to warm. If empty, the first course (the one
+                        every admin page selects by default) is warmed.
+
+    Returns:
+        dict: {name: exception} for the loads that failed.
+    """
+    if not courses:
+        courses = admin_get_student_group_emails()[:1]
+    loaders = {
+        'courses': admin_get_student_group_emails,
+        'breaks': lambda: load_breaks_version(admin_get_last_updated('breaks', None))
+    }
+    for course_email in courses:
+        loaders[course_email] = lambda course_email=course_email: warm_course(course_email)
+        loaders[f"{course_email}/modules"] = lambda course_email=course_email: (
+            admin_get_available_modules(course_email), get_module_on_date(course_email)
+        )
+    _, errors = prefetch(loaders)
+    return errors
+
+
+def warm_teacher_caches(email: str) -> dict:
+    """
+    Warm what the teacher pages load first: roster, attendance, modules and breaks.
+
+    Args:
+        email (str): The teacher's email (their course).
+
+    Returns:
+        dict: {name: exception} for the loads that failed.
+    """
+    course_key = email.replace('.', ',')
+    _, errors = prefetch({
+        # The entry load_students reads for this teacher
+        'students': lambda: load_roster_version(course_key, get_last_updated('students')),
+        'attendance_dates': lambda: get_attendance_dates(email, get_last_updated('attendance', email)),
+        'attendance': lambda: load_all_attendance(email, get_last_updated('attendance', email)),
+        'modules': lambda: get_available_modules(course_key, get_last_updated('modules', course_key)),
+        'module_today': lambda: get_module_on_date(course_key),
+        'breaks': lambda: load_breaks_version(admin_get_last_updated('breaks', None))
+    })
+    return errors
+
+
+def _run_warmup(is_admin: bool, email: str, courses: list, token):
+    # No session context here: the loaders get the user token from the thread's
+    # token source, and their spinners and messages go nowhere
+    use_token_source(token)
+    started = time.perf_counter()
+    try:
+        if is_admin:
+            errors = warm_admin_caches(courses)
+        else:
+            errors = warm_teacher_caches(email)
+    except Exception as e:
+        errors = {'warmup': e}
+    elapsed = time.perf_counter() - started
+    role = 'admin' if is_admin else 'teacher'
+    REGISTRY.observe('login_warmup_seconds', elapsed, role=role)
+    if errors:
+        logger.warning("Login warm-up for %s finished with errors in %s", email, ", ".join(errors))
+    logger.info("Login warm-up for %s (%s) took %.3f s", email, role, elapsed)
+
+
+def start_login_warmup(is_admin: bool, email: str, courses: list = None):
+    """
+    Start warming the logged-in user's caches on a background thread.
+
+    Called right after authentication, so the loads overlap the rerun into the
+    first page instead of delaying the login. Everything lands in the shared,
+    versioned st.cache_data entries, so the first page visit finds them warm (a
+    page that asks for an entry still being loaded waits for that load instead
+    of repeating it).
+
+    The thread does not carry the login run's ScriptRunContext, which ends with
+    the st.rerun() that follows: it gets everything it needs as arguments and
+    the user token through auth_utils.token_source().
+
+    Args:
+        is_admin (bool): Warm the admin pages' data instead of the teacher's.
+        email (str): The user's email.
+        courses (list, optional): Admin courses to warm (see warm_admin_caches).
+
+    Returns:
+        threading.Thread: The started warm-up thread.
+    """
+    thread = threading.Thread(
+        target=_run_warmup,
+        args=(is_admin, email, list(courses or ()), token_source()),
+        name="login-warmup",
+        daemon=True
+    )
+    thread.start()
+    return thread